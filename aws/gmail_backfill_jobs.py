@@ -0,0 +1,109 @@
+import csv
+import sys
+import boto3
+from decimal import Decimal
+from pathlib import Path
+from botocore.exceptions import ClientError
+from typing import Dict, Any, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+class GmailBackfillJobManager:
+
+    def __init__(self):
+        pass
+
+    def get_aws_credentials(self, credentials_path: str) -> Dict[str, str]:
+
+        with open(credentials_path, 'r') as file:
+            csv_reader = csv.DictReader(file)
+            credentials = next(csv_reader)
+            return {
+                'aws_access_key_id': credentials['Access key ID'],
+                'aws_secret_access_key': credentials['Secret access key']
+            }
+
+    def get_job(self, email_id: str, job_name: str) -> Optional[Dict[str, Any]]:
+
+        try:
+            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
+
+            dynamodb = boto3.resource(
+                'dynamodb',
+                region_name='us-west-2',
+                aws_access_key_id=credentials['aws_access_key_id'],
+                aws_secret_access_key=credentials['aws_secret_access_key']
+            )
+
+            table = dynamodb.Table('Convoia_Gmail_Backfill_Jobs')
+
+            response = table.get_item(
+                Key={
+                    'email_id': email_id,
+                    'job_name': job_name
+                }
+            )
+
+            item = response.get('Item')
+            if not item:
+                return None
+
+            # DynamoDB hands numbers back as Decimal, the counters are plain integers
+            return {key: int(value) if isinstance(value, Decimal) else value for key, value in item.items()}
+
+        except ClientError as e:
+            print(f"Error retrieving backfill job for {email_id} ({job_name}): {str(e)}")
+            return None
+
+    def save_job(self, job: Dict[str, Any]) -> bool:
+
+        try:
+            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
+
+            dynamodb = boto3.resource(
+                'dynamodb',
+                region_name='us-west-2',
+                aws_access_key_id=credentials['aws_access_key_id'],
+                aws_secret_access_key=credentials['aws_secret_access_key']
+            )
+
+            table = dynamodb.Table('Convoia_Gmail_Backfill_Jobs')
+
+            # DynamoDB rejects None values, an absent page token means "start from the first page"
+            table.put_item(
+                Item={key: value for key, value in job.items() if value is not None}
+            )
+
+            return True
+
+        except ClientError as e:
+            print(f"Error saving backfill job for {job.get('email_id')} ({job.get('job_name')}): {str(e)}")
+            return False
+
+    def delete_job(self, email_id: str, job_name: str) -> bool:
+
+        try:
+            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
+
+            dynamodb = boto3.resource(
+                'dynamodb',
+                region_name='us-west-2',
+                aws_access_key_id=credentials['aws_access_key_id'],
+                aws_secret_access_key=credentials['aws_secret_access_key']
+            )
+
+            table = dynamodb.Table('Convoia_Gmail_Backfill_Jobs')
+
+            table.delete_item(
+                Key={
+                    'email_id': email_id,
+                    'job_name': job_name
+                }
+            )
+
+            print(f"Deleted backfill job for {email_id} ({job_name})")
+            return True
+
+        except ClientError as e:
+            print(f"Error deleting backfill job for {email_id} ({job_name}): {str(e)}")
+            return False
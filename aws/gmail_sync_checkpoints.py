@@ -0,0 +1,131 @@
+import csv
+import sys
+import boto3
+from pathlib import Path
+from botocore.exceptions import ClientError
+from typing import Dict, Any, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+class GmailSyncCheckpointManager:
+
+    def __init__(self):
+        pass
+
+    def get_aws_credentials(self, credentials_path: str) -> Dict[str, str]:
+
+        with open(credentials_path, 'r') as file:
+            csv_reader = csv.DictReader(file)
+            credentials = next(csv_reader)
+            return {
+                'aws_access_key_id': credentials['Access key ID'],
+                'aws_secret_access_key': credentials['Secret access key']
+            }
+
+    def get_checkpoint(self, email_id: str, consumer: str) -> Optional[Dict]:
+
+        try:
+            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
+
+            dynamodb = boto3.resource(
+                'dynamodb',
+                region_name='us-west-2',
+                aws_access_key_id=credentials['aws_access_key_id'],
+                aws_secret_access_key=credentials['aws_secret_access_key']
+            )
+
+            table = dynamodb.Table('Convoia_Gmail_Sync_Checkpoints')
+
+            response = table.get_item(
+                Key={
+                    'email_id': email_id,
+                    'consumer': consumer
+                }
+            )
+
+            item = response.get('Item')
+            if not item:
+                return None
+
+            # Messages a run failed on, with the number of attempts so far and the steps that already succeeded
+            retry_message_ids = {}
+            for message_id, progress in item.get('retry_message_ids', {}).items():
+                if not isinstance(progress, dict):
+                    # Checkpoints written before steps were tracked store the attempt count alone
+                    progress = {'attempts': progress}
+                retry_message_ids[message_id] = {
+                    'attempts': int(progress.get('attempts', 0)),
+                    'steps': list(progress.get('steps', []))
+                }
+
+            return {
+                'history_id': str(item['history_id']),
+                'retry_message_ids': retry_message_ids
+            }
+
+        except ClientError as e:
+            print(f"Error retrieving sync checkpoint for {email_id} ({consumer}): {str(e)}")
+            return None
+
+    def get_history_id(self, email_id: str, consumer: str) -> Optional[str]:
+
+        checkpoint = self.get_checkpoint(email_id, consumer)
+        return checkpoint['history_id'] if checkpoint else None
+
+    def set_history_id(self, email_id: str, consumer: str, history_id: str, retry_message_ids: Optional[Dict[str, Dict[str, Any]]] = None) -> bool:
+
+        try:
+            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
+
+            dynamodb = boto3.resource(
+                'dynamodb',
+                region_name='us-west-2',
+                aws_access_key_id=credentials['aws_access_key_id'],
+                aws_secret_access_key=credentials['aws_secret_access_key']
+            )
+
+            table = dynamodb.Table('Convoia_Gmail_Sync_Checkpoints')
+
+            table.put_item(
+                Item={
+                    'email_id': email_id,
+                    'consumer': consumer,
+                    'history_id': str(history_id),
+                    'retry_message_ids': retry_message_ids or {}
+                }
+            )
+
+            print(f"Saved sync checkpoint {history_id} for {email_id} ({consumer}), {len(retry_message_ids or {})} messages to retry")
+            return True
+
+        except ClientError as e:
+            print(f"Error saving sync checkpoint for {email_id} ({consumer}): {str(e)}")
+            return False
+
+    def delete_checkpoint(self, email_id: str, consumer: str) -> bool:
+
+        try:
+            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
+
+            dynamodb = boto3.resource(
+                'dynamodb',
+                region_name='us-west-2',
+                aws_access_key_id=credentials['aws_access_key_id'],
+                aws_secret_access_key=credentials['aws_secret_access_key']
+            )
+
+            table = dynamodb.Table('Convoia_Gmail_Sync_Checkpoints')
+
+            table.delete_item(
+                Key={
+                    'email_id': email_id,
+                    'consumer': consumer
+                }
+            )
+
+            print(f"Deleted sync checkpoint for {email_id} ({consumer})")
+            return True
+
+        except ClientError as e:
+            print(f"Error deleting sync checkpoint for {email_id} ({consumer}): {str(e)}")
+            return False
@@ -0,0 +1,50 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dataExtraction.gmail.discovery import get_gmail_discovery_document, build_gmail_service
+from dataExtraction.gmail.http_transport import build_authorized_http
+
+def build_per_call(credentials: Credentials) -> None:
+
+    # What every fetcher and GmailAutomation used to do
+    build('gmail', 'v1', credentials=credentials)
+
+def build_from_cached_document(credentials: Credentials) -> None:
+
+    build_gmail_service(build_authorized_http(credentials))
+
+def timed(label: str, func, credentials: Credentials, iterations: int) -> float:
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(credentials)
+    per_client = (time.perf_counter() - start) / iterations * 1000
+    print(f"{label:<32} {per_client:8.2f} ms per client")
+    return per_client
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description="Benchmark Gmail client construction")
+    parser.add_argument('--iterations', type=int, default=200, help="clients built per variant")
+    args = parser.parse_args()
+
+    # Dummy credentials, building a client never touches the network with either variant
+    credentials = Credentials(token='benchmark')
+
+    start = time.perf_counter()
+    get_gmail_discovery_document()
+    print(f"{'Startup: load discovery document':<32} {(time.perf_counter() - start) * 1000:8.2f} ms once")
+
+    before = timed("build() per client", build_per_call, credentials, args.iterations)
+    after = timed("Cached discovery document", build_from_cached_document, credentials, args.iterations)
+    print(f"Speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
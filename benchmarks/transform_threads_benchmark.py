@@ -0,0 +1,105 @@
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from typing import List, Dict
+from email.utils import formatdate, parsedate_to_datetime
+
+import pytz
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dataExtraction.gmail.data_extraction import GmailDataExtractor
+
+def build_fixture(num_messages: int, max_thread_size: int = 10, seed: int = 7) -> List[List[Dict]]:
+
+    # Extracted threads shaped like GmailDataExtractor._extract_threads output
+    rng = random.Random(seed)
+    threads = []
+    message_count = 0
+
+    while message_count < num_messages:
+        thread_id = f"thread{len(threads)}"
+        thread_size = min(rng.randint(1, max_thread_size), num_messages - message_count)
+        thread = []
+
+        for _ in range(thread_size):
+            internal_date = rng.randint(1_400_000_000_000, 1_750_000_000_000)
+            thread.append({
+                'message_id': f"msg{message_count}",
+                'thread_id': thread_id,
+                'subject': f"Subject {thread_id}",
+                'from': {'name': 'Sender', 'email': 'sender@example.com'},
+                'to': {'name': 'Receiver', 'email': 'receiver@example.com'},
+                'timestamp': formatdate(internal_date / 1000),
+                'internal_date': internal_date,
+                'body': {'plain_text': 'Body text'},
+                'label': ['INBOX']
+            })
+            message_count += 1
+
+        rng.shuffle(thread)
+        threads.append(thread)
+
+    return threads
+
+def transform_with_headers(threads: List[List[Dict]]) -> List[Dict]:
+
+    # The previous implementation: every Date header parsed once to sort and once more to format
+    transformed_threads = []
+
+    for thread in threads:
+        messages_in_thread = sorted(thread, key=lambda x: parsedate_to_datetime(x['timestamp']).timestamp())
+
+        formatted_messages = []
+        for msg in messages_in_thread:
+            dt = parsedate_to_datetime(msg['timestamp']).astimezone(pytz.UTC)
+            formatted_messages.append({
+                "message_id": msg['message_id'],
+                "datetime": dt.strftime("%Y-%m-%d %H:%M:%S UTC"),
+                "timestamp": dt.timestamp()
+            })
+
+        transformed_threads.append({"thread_id": thread[0]['thread_id'], "messages": formatted_messages})
+
+    transformed_threads.sort(key=lambda x: x['messages'][-1]['timestamp'], reverse=True)
+    return transformed_threads
+
+def transform_with_internal_dates(extractor: GmailDataExtractor, threads: List[List[Dict]]) -> List[Dict]:
+
+    transformed_threads = extractor._transform_threads(threads)
+    transformed_threads.sort(key=lambda x: x['messages'][-1]['timestamp'], reverse=True)
+    return transformed_threads
+
+def timed(label: str, func, *args) -> float:
+
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f}s")
+    return elapsed
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description="Benchmark thread transformation on a synthetic mailbox")
+    parser.add_argument('--messages', type=int, default=100_000, help="number of messages in the fixture")
+    parser.add_argument('--max-thread-size', type=int, default=10, help="largest thread in the fixture")
+    args = parser.parse_args()
+
+    threads = build_fixture(args.messages, args.max_thread_size)
+    print(f"Fixture: {args.messages} messages in {len(threads)} threads")
+
+    # Only the transformation is exercised, no Gmail client is created
+    extractor = GmailDataExtractor.__new__(GmailDataExtractor)
+
+    header_time = timed("Date header parsing", transform_with_headers, threads)
+    internal_time = timed("internalDate, vectorized", transform_with_internal_dates, extractor, threads)
+    print(f"Speedup: {header_time / internal_time:.1f}x")
+
+    for msg in (msg for thread in threads for msg in thread):
+        msg['internal_date'] = None
+    timed("Header fallback, vectorized", transform_with_internal_dates, extractor, threads)
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import asyncio
 from typing import List
 from aws.email_automation_preferences import EmailAutomationPreferences
 from aws.utils import get_all_email_ids
+from dataExtraction.gmail.message_cache import get_message_cache
 
 async def update_database(email_id: str):
 
@@ -37,14 +38,33 @@ async def automated_follow_up() -> None:
     await asyncio.gather(*tasks)
     print("Completed all follow-ups")
 
+def evict_message_cache() -> None:
+
+    message_cache = get_message_cache()
+
+    # Users who are no longer registered lose their cached mail entirely
+    registered_email_ids = get_all_email_ids()
+    if registered_email_ids:
+        for email_id in set(message_cache.get_email_ids()) - set(registered_email_ids):
+            message_cache.delete_user(email_id)
+
+    evicted = message_cache.evict()
+    print(f"Evicted {evicted} messages from the message cache")
+
+async def message_cache_maintenance() -> None:
+
+    # SQLite work is blocking, keep it off the event loop
+    await asyncio.to_thread(evict_message_cache)
+
 async def daily():
 
-    # Create tasks for both main functions
+    # Create tasks for all main functions
     database_task = asyncio.create_task(daily_database_addition())
     follow_up_task = asyncio.create_task(automated_follow_up())
+    cache_task = asyncio.create_task(message_cache_maintenance())
     
-    # Run both tasks concurrently
-    await asyncio.gather(database_task, follow_up_task)
+    # Run all tasks concurrently
+    await asyncio.gather(database_task, follow_up_task, cache_task)
     print("Daily tasks completed")
 
 # Run the daily function
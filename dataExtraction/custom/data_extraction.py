@@ -1,19 +1,70 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple, Callable, Any
 from datetime import datetime, timedelta
 import imaplib
 import email
 from email.header import decode_header
 from email.utils import parsedate_to_datetime
 import pytz
-from collections import defaultdict
 import json
-import uuid
 import re
+import base64
+import binascii
+import quopri
 from pathlib import Path
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from dataExtraction.custom.imap_sync_state import ImapSyncStateStore, DEFAULT_SYNC_STATE_PATH
+from dataExtraction.custom.imap_connection_pool import get_connection_pool
+from dataExtraction.custom.message_threading import build_threads
 
 # URGENT - Simplify the Script
 # IMPORTANT - Upgrade the Code to be Applicable to all Domains 
 
+# Messages requested per FETCH command, one round-trip each
+FETCH_CHUNK_SIZE = 500
+
+FETCH_RESPONSE_START = re.compile(rb'^(\d+) \(')
+FETCH_FLAGS = re.compile(rb'FLAGS \(([^)]*)\)')
+FETCH_UID = re.compile(rb'UID (\d+)')
+
+LIST_RESPONSE = re.compile(rb'^\((?P<attributes>[^)]*)\) (?P<delimiter>"(?:[^"\\]|\\.)*"|NIL) (?P<name>.*)$')
+
+# Headers that threading, date filtering and sender checks need, phase one of a lazy-body fetch
+HEADER_FIELDS = ('MESSAGE-ID', 'DATE', 'FROM', 'TO', 'SUBJECT', 'REFERENCES', 'IN-REPLY-TO')
+
+IMAP_ATOM = re.compile(rb'[^\s()"]+')
+
+# Tried in order when the server does not mark its Sent folder with the \Sent special-use attribute
+SENT_FOLDER_CANDIDATES = ['[Gmail]/Sent Mail', '[Gmail]/Sent', 'Sent', 'Sent Items']
+
+ALL_MAIL_FOLDER_CANDIDATES = ['[Gmail]/All Mail', '[Google Mail]/All Mail']
+
+DRAFTS_FOLDER_CANDIDATES = ['[Gmail]/Drafts', 'Drafts', 'Draft']
+
+# Gmail's IMAP extensions, advertised as X-GM-EXT-1
+GMAIL_EXTENSION_CAPABILITY = 'X-GM-EXT-1'
+GMAIL_FETCH_ITEMS = 'X-GM-MSGID X-GM-THRID X-GM-LABELS'
+FETCH_GMAIL_MSGID = re.compile(rb'X-GM-MSGID (\d+)')
+FETCH_GMAIL_THRID = re.compile(rb'X-GM-THRID (\d+)')
+
+# The All Mail scan keeps to what the Sent and INBOX passes used to fetch
+GMAIL_SCAN_CRITERIA = 'X-GM-RAW "{in:inbox in:sent}"'
+
+# System labels as the Gmail API names them, user labels are kept as they are
+GMAIL_SYSTEM_LABELS = {
+    '\\Inbox': 'INBOX',
+    '\\Sent': 'SENT',
+    '\\Important': 'IMPORTANT',
+    '\\Starred': 'STARRED',
+    '\\Draft': 'DRAFT',
+    '\\Spam': 'SPAM',
+    '\\Trash': 'TRASH'
+}
+
 def decode_header_value(header_value: str) -> str:
     """Safely decode email header value."""
     try:
@@ -29,6 +80,218 @@ def decode_header_value(header_value: str) -> str:
         print(f"Error decoding header: {str(e)}")
         return str(header_value)
 
+def build_message_sets(message_numbers: List[bytes], chunk_size: int = FETCH_CHUNK_SIZE) -> List[str]:
+    """Split message numbers into IMAP message sets of at most chunk_size messages, runs collapsed to ranges."""
+    numbers = sorted(int(num) for num in message_numbers)
+    message_sets = []
+    
+    for start in range(0, len(numbers), chunk_size):
+        chunk = numbers[start:start + chunk_size]
+        ranges = []
+        run_start = run_end = chunk[0]
+        for num in chunk[1:]:
+            if num == run_end + 1:
+                run_end = num
+                continue
+            ranges.append(f"{run_start}:{run_end}" if run_start != run_end else str(run_start))
+            run_start = run_end = num
+        ranges.append(f"{run_start}:{run_end}" if run_start != run_end else str(run_start))
+        message_sets.append(','.join(ranges))
+    
+    return message_sets
+
+def parse_fetch_flags(meta: bytes) -> List[str]:
+    """Return the FLAGS of a FETCH response's non-literal text."""
+    flags_match = FETCH_FLAGS.search(meta)
+    return flags_match.group(1).decode('utf-8', errors='replace').split() if flags_match else []
+
+def parse_fetch_uid(meta: bytes) -> Optional[int]:
+    """Return the UID of a FETCH response's non-literal text, None if it was not requested."""
+    uid_match = FETCH_UID.search(meta)
+    return int(uid_match.group(1)) if uid_match else None
+
+def iter_fetch_response(fetch_data: List) -> Iterator[Tuple[bytes, bytes, Optional[bytes]]]:
+    """
+    Walk an imaplib FETCH response and yield one (message number, attributes, literal) per message.
+    
+    imaplib returns a (prefix, literal) tuple for each message followed by a bytes item with
+    whatever came after the literal, so attributes such as FLAGS may sit in either part depending
+    on the server. Both parts are joined into the attributes text. Responses without a literal,
+    e.g. a FLAGS-only fetch, are yielded with a literal of None.
+    """
+    current = None
+    
+    for item in fetch_data:
+        if isinstance(item, tuple):
+            if current is not None:
+                yield tuple(current)
+            prefix, literal = item
+            start = FETCH_RESPONSE_START.match(prefix)
+            current = [start.group(1) if start else b'', prefix, literal]
+        elif isinstance(item, bytes):
+            start = FETCH_RESPONSE_START.match(item)
+            if start:
+                if current is not None:
+                    yield tuple(current)
+                current = [start.group(1), item, None]
+            elif current is not None:
+                current[1] += item
+    
+    if current is not None:
+        yield tuple(current)
+
+def flags_to_labels(flags: List[str], folder: str) -> List[str]:
+    """Turn IMAP flags into labels, with INBOX or SENT added based on the folder."""
+    labels = [flag.decode('utf-8', errors='replace') if isinstance(flag, bytes) else str(flag) for flag in flags]
+    
+    if folder:
+        if 'sent' in folder.lower():
+            labels.append('SENT')
+        elif 'inbox' in folder.lower():
+            labels.append('INBOX')
+    
+    return labels
+
+def parse_gmail_labels(attributes: bytes) -> List[str]:
+    """Return the X-GM-LABELS of a FETCH response, system labels spelled like the Gmail API's."""
+    start = attributes.find(b'X-GM-LABELS (')
+    if start < 0:
+        return []
+    try:
+        raw_labels, _ = parse_imap_list(attributes, start + len(b'X-GM-LABELS '))
+    except (ValueError, IndexError):
+        return []
+    
+    return [GMAIL_SYSTEM_LABELS.get(label, label) for label in raw_labels if isinstance(label, str)]
+
+def parse_gmail_ids(attributes: bytes) -> Dict[str, str]:
+    """Return the X-GM-MSGID and X-GM-THRID of a FETCH response as Gmail API style hex IDs."""
+    ids = {}
+    for field, pattern in (("gmail_message_id", FETCH_GMAIL_MSGID), ("gmail_thread_id", FETCH_GMAIL_THRID)):
+        match = pattern.search(attributes)
+        if match:
+            ids[field] = format(int(match.group(1)), 'x')
+    return ids
+
+def message_labels(attributes: bytes, folder_name: str, gmail_extensions: bool = False) -> List[str]:
+    """Labels of a fetched message: its flags plus INBOX/SENT from the folder or Gmail's own labels."""
+    labels = flags_to_labels(parse_fetch_flags(attributes), folder_name)
+    if gmail_extensions:
+        labels.extend(label for label in parse_gmail_labels(attributes) if label not in labels)
+    return labels
+
+def strip_quoted_text(body: str) -> str:
+    """Remove the quoted previous message from a reply."""
+    return re.sub(r"(?s)On\s.+?\s\w+:\s.*$", "", body).strip()
+
+def parse_imap_list(data: bytes, start: int) -> Tuple[Any, int]:
+    """
+    Parse the parenthesized list at data[start] into nested Python lists.
+    
+    Strings become str, NIL becomes None. Returns the list and the index after it. Literals are
+    not supported, imaplib has already split them out of the response text.
+    """
+    stack = []
+    current = None
+    position = start
+    
+    while position < len(data):
+        char = data[position:position + 1]
+        if char == b'(':
+            stack.append([])
+            position += 1
+        elif char == b')':
+            current = stack.pop()
+            position += 1
+            if not stack:
+                return current, position
+            stack[-1].append(current)
+        elif char == b'"':
+            end = position + 1
+            value = bytearray()
+            while data[end:end + 1] != b'"':
+                if data[end:end + 1] == b'\\':
+                    end += 1
+                value += data[end:end + 1]
+                end += 1
+                if end >= len(data):
+                    raise ValueError("Unterminated quoted string")
+            stack[-1].append(value.decode('utf-8', errors='replace'))
+            position = end + 1
+        elif char.isspace():
+            position += 1
+        else:
+            atom = IMAP_ATOM.match(data, position)
+            if atom is None or not stack:
+                raise ValueError(f"Unexpected {char!r} in list")
+            value = atom.group(0).decode('utf-8', errors='replace')
+            stack[-1].append(None if value.upper() == 'NIL' else value)
+            position = atom.end()
+    
+    raise ValueError("Unterminated list")
+
+def find_text_section(attributes: bytes) -> Optional[Tuple[str, str, str]]:
+    """
+    Locate the body section extract_email_details would read, from a FETCH BODYSTRUCTURE.
+    
+    Returns (section, transfer encoding, charset) of the first text/plain part that is not an
+    attachment, or section 1 of a single-part message. None when there is no such part or the
+    structure cannot be parsed.
+    """
+    start = attributes.find(b'BODYSTRUCTURE (')
+    if start < 0:
+        return None
+    try:
+        structure, _ = parse_imap_list(attributes, start + len(b'BODYSTRUCTURE '))
+    except (ValueError, IndexError):
+        return None
+    
+    def part_details(part):
+        params = part[2] if len(part) > 2 and isinstance(part[2], list) else []
+        charsets = [params[i + 1] for i in range(0, len(params) - 1, 2) if str(params[i]).upper() == 'CHARSET']
+        encoding = part[5] if len(part) > 5 and part[5] else '7BIT'
+        return encoding, charsets[0] if charsets else 'utf-8'
+    
+    # A single-part message is read whatever its type
+    if structure and not isinstance(structure[0], list):
+        return ('1', *part_details(structure))
+    
+    # Depth first in document order, like email.message.walk()
+    pending = [(structure, '')]
+    while pending:
+        node, section = pending.pop()
+        if node and isinstance(node[0], list):
+            children = [child for child in node if isinstance(child, list)]
+            for index in range(len(children), 0, -1):
+                pending.append((children[index - 1], f"{section}.{index}" if section else str(index)))
+            continue
+        
+        if len(node) < 2 or str(node[0]).lower() != 'text' or str(node[1]).lower() != 'plain':
+            continue
+        # Text parts carry MD5 and disposition after the line count
+        disposition = node[9] if len(node) > 9 and isinstance(node[9], list) else None
+        if disposition and str(disposition[0]).lower() == 'attachment':
+            continue
+        return (section, *part_details(node))
+    
+    return None
+
+def decode_section(data: bytes, encoding: str, charset: str) -> str:
+    """Undo a body section's transfer encoding and charset."""
+    encoding = (encoding or '7BIT').upper()
+    try:
+        if encoding == 'BASE64':
+            data = base64.b64decode(data)
+        elif encoding == 'QUOTED-PRINTABLE':
+            data = quopri.decodestring(data)
+    except (binascii.Error, ValueError):
+        pass
+    
+    try:
+        return data.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return data.decode('utf-8', errors='replace')
+
 def extract_email_details(email_message) -> Dict:
     """Extract relevant details from an email message."""
     try:
@@ -69,24 +332,10 @@ def extract_email_details(email_message) -> Dict:
             except:
                 body = email_message.get_payload(decode=False) or ""
         
-        # Remove quoted text
-        body = re.sub(r"(?s)On\s.+?\s\w+:\s.*$", "", body).strip()
-        
-        # Get labels/flags
-        labels = []
-        flags = getattr(email_message, 'flags', []) or []
-        for flag in flags:
-            if isinstance(flag, bytes):
-                flag = flag.decode('utf-8', errors='replace')
-            labels.append(str(flag))
+        body = strip_quoted_text(body)
         
-        # Add INBOX or SENT label based on folder
-        folder = getattr(email_message, 'folder', '')
-        if folder:
-            if 'sent' in folder.lower():
-                labels.append('SENT')
-            elif 'inbox' in folder.lower():
-                labels.append('INBOX')
+        # Get labels/flags, plus INBOX or SENT based on folder
+        labels = flags_to_labels(getattr(email_message, 'flags', []) or [], getattr(email_message, 'folder', ''))
         
         return {
             "message_id": email_message.get("Message-ID", ""),
@@ -104,12 +353,333 @@ def extract_email_details(email_message) -> Dict:
         print(f"Error extracting email details: {str(e)}")
         return {}
 
+def enable_condstore(mail: imaplib.IMAP4) -> bool:
+    """Enable CONDSTORE if the server advertises it and return whether MODSEQs can be used."""
+    try:
+        if 'CONDSTORE' not in mail.capabilities:
+            return False
+        if 'ENABLE' in mail.capabilities:
+            mail.enable('CONDSTORE')
+        return True
+    except Exception as e:
+        print(f"Error enabling CONDSTORE: {str(e)}")
+        return False
+
+def prepare_connection(mail: imaplib.IMAP4) -> None:
+    """Run once per pooled connection right after login."""
+    try:
+        # The greeting may list fewer capabilities than the server offers once logged in
+        status, capability_data = mail.capability()
+        if status == 'OK' and capability_data and capability_data[0]:
+            mail.capabilities = tuple(capability_data[0].decode('utf-8', errors='replace').upper().split())
+    except Exception as e:
+        print(f"Error refreshing capabilities: {str(e)}")
+    
+    # ENABLE is only allowed before the first SELECT
+    mail.condstore = enable_condstore(mail)
+
+def list_folders(mail: imaplib.IMAP4) -> List[Tuple[List[str], str]]:
+    """
+    Return (attributes, name) for every folder of the account.
+    
+    Special-use attributes such as \\Sent are requested with LIST ... RETURN (SPECIAL-USE) when the
+    server advertises SPECIAL-USE. Many servers include them in a plain LIST as well.
+    """
+    if 'SPECIAL-USE' in mail.capabilities:
+        status, list_data = mail.list('""', '* RETURN (SPECIAL-USE)')
+    else:
+        status, list_data = mail.list()
+    if status != 'OK':
+        print(f"Failed to list folders: {status}")
+        return []
+    
+    folders = []
+    for item in list_data or []:
+        # Names the server sends as a literal arrive as a (prefix, name) tuple
+        literal_name = None
+        if isinstance(item, tuple):
+            item, literal_name = item
+        if not isinstance(item, bytes):
+            continue
+        
+        match = LIST_RESPONSE.match(item.strip())
+        if not match:
+            continue
+        
+        if literal_name is not None:
+            name = literal_name.decode('utf-8', errors='replace')
+        else:
+            name = match.group('name').decode('utf-8', errors='replace').strip()
+            if name.startswith('"') and name.endswith('"'):
+                name = name[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+        
+        attributes = match.group('attributes').decode('utf-8', errors='replace').split()
+        folders.append((attributes, name))
+    
+    return folders
+
+def resolve_special_use_folder(
+    folders: List[Tuple[List[str], str]],
+    attribute: str,
+    candidates: List[str]
+) -> Optional[str]:
+    """Pick the folder carrying a special-use attribute such as \\Sent, falling back to well-known names."""
+    for attributes, name in folders:
+        if any(folder_attribute.lower() == attribute.lower() for folder_attribute in attributes):
+            return name
+    
+    names = {name for _, name in folders}
+    for candidate in candidates:
+        if candidate in names:
+            return candidate
+    return None
+
+def fetch_message_chunk(
+    mail: imaplib.IMAP4,
+    message_set: str,
+    folder_name: str,
+    use_uid: bool = False,
+    lazy_bodies: bool = False,
+    body_filter: Optional[Callable[[Dict], bool]] = None,
+    gmail_extensions: bool = False
+) -> Optional[Dict[int, Dict]]:
+    """
+    Fetch one chunk of messages, returning their details keyed by UID (use_uid) or message number.
+    
+    With lazy_bodies the chunk is fetched in two phases: flags, BODYSTRUCTURE and the headers in
+    HEADER_FIELDS first, then only the text section of the messages body_filter accepts (all of
+    them without a filter), so attachments are never transferred. Messages left out keep an empty
+    body. With gmail_extensions Gmail's message ID, thread ID and labels come in the same fetch.
+    Returns None when the server rejects the first fetch.
+    """
+    def fetch(fetch_set, items):
+        if use_uid:
+            return mail.uid('FETCH', fetch_set, items)
+        return mail.fetch(fetch_set, items)
+    
+    def response_key(num, attributes):
+        return parse_fetch_uid(attributes) if use_uid else int(num)
+    
+    if lazy_bodies:
+        items = f"UID FLAGS BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({' '.join(HEADER_FIELDS)})]"
+    else:
+        items = "UID RFC822 FLAGS" if use_uid else "RFC822 FLAGS"
+    if gmail_extensions:
+        items = f"{items} {GMAIL_FETCH_ITEMS}"
+    
+    status, msg_data = fetch(message_set, f"({items})")
+    if status != 'OK' or not msg_data:
+        print(f"Failed to fetch messages {message_set}: {status}")
+        return None
+    
+    messages = {}
+    text_sections = {}
+    
+    for num, attributes, email_body in iter_fetch_response(msg_data):
+        key = response_key(num, attributes)
+        if email_body is None or key is None:
+            continue
+        try:
+            email_message = email.message_from_bytes(email_body)
+            email_message.folder = folder_name  # Add folder info
+            email_message.flags = parse_fetch_flags(attributes)
+            
+            email_details = extract_email_details(email_message)
+            if not email_details:
+                continue
+            if gmail_extensions:
+                email_details["labels"] = message_labels(attributes, folder_name, gmail_extensions)
+                email_details.update(parse_gmail_ids(attributes))
+            messages[key] = email_details
+            
+            if lazy_bodies and (body_filter is None or body_filter(email_details)):
+                text_section = find_text_section(attributes)
+                if text_section is not None:
+                    text_sections[key] = text_section
+        except Exception as e:
+            print(f"Error processing email {key}: {str(e)}")
+            continue
+    
+    # Phase two, one FETCH per distinct section number, mostly 1 and 1.1
+    keys_by_section = {}
+    for key, (section, _, _) in text_sections.items():
+        keys_by_section.setdefault(section, []).append(key)
+    
+    for section, keys in keys_by_section.items():
+        section_set = build_message_sets(keys)[0]
+        status, section_data = fetch(section_set, f"(UID BODY.PEEK[{section}])")
+        if status != 'OK' or not section_data:
+            print(f"Failed to fetch body section {section} of {section_set}: {status}")
+            continue
+        
+        for num, attributes, section_body in iter_fetch_response(section_data):
+            key = response_key(num, attributes)
+            if section_body is None or key not in text_sections:
+                continue
+            _, encoding, charset = text_sections[key]
+            messages[key]["body"] = strip_quoted_text(decode_section(section_body, encoding, charset))
+    
+    return messages
+
+def quote_folder_name(folder_name: str) -> str:
+    """Quote a folder name for SELECT, APPEND and the like."""
+    folder_name = folder_name.strip('"')
+    if folder_name.upper() == 'INBOX' or re.fullmatch(r'[A-Za-z0-9_./-]+', folder_name):
+        return folder_name
+    return '"' + folder_name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def fetch_messages_by_uid(
+    email_address: str,
+    password: str,
+    uids: List[int],
+    imap_server: str = "imap.gmail.com",
+    folder_name: str = "INBOX",
+    lazy_bodies: bool = True
+) -> List[Dict]:
+    """
+    Fetch specific messages of a folder by UID over the account's pooled connections.
+    
+    Each message carries its "uid" and "folder", so it can be flagged or replied to later.
+    """
+    pool = get_connection_pool(imap_server, email_address, password, on_connect=prepare_connection)
+    messages = []
+    
+    with pool.connection() as mail:
+        status, _ = mail.select(quote_folder_name(folder_name), readonly=True)
+        if status != 'OK':
+            print(f"Failed to select folder {folder_name}: {status}")
+            return []
+        
+        gmail_extensions = GMAIL_EXTENSION_CAPABILITY in mail.capabilities
+        for message_set in build_message_sets(uids):
+            chunk_messages = fetch_message_chunk(
+                mail, message_set, folder_name, True, lazy_bodies, None, gmail_extensions
+            )
+            for uid, email_details in sorted((chunk_messages or {}).items()):
+                email_details["uid"] = uid
+                email_details["folder"] = folder_name
+                messages.append(email_details)
+    
+    return messages
+
+def selected_response_number(mail: imaplib.IMAP4, code: str) -> Optional[int]:
+    """Return a numeric response code such as UIDVALIDITY from the last SELECT, None if absent."""
+    _, data = mail.response(code)
+    try:
+        return int(data[0]) if data and data[0] else None
+    except ValueError:
+        return None
+
+def sync_folder_emails(
+    mail: imaplib.IMAP4,
+    email_address: str,
+    folder_name: str,
+    search_criteria: str,
+    sync_store: ImapSyncStateStore,
+    condstore: bool,
+    lazy_bodies: bool = False,
+    body_filter: Optional[Callable[[Dict], bool]] = None,
+    gmail_extensions: bool = False,
+    scope_criteria: str = 'ALL'
+) -> List[Dict]:
+    """
+    Bring the stored copy of the selected folder up to date by UID and return all of its messages.
+    
+    The first sync, and any sync after the server changed UIDVALIDITY, downloads what matches
+    search_criteria. Later syncs download only UIDs above the last one seen, pick up flag changes
+    with CHANGEDSINCE when the server supports CONDSTORE (a FLAGS-only fetch otherwise) and drop
+    messages that were expunged, or that left scope_criteria. New messages are fetched with
+    fetch_message_chunk.
+    """
+    folder_key = folder_name.strip('"')
+    
+    uidvalidity = selected_response_number(mail, 'UIDVALIDITY')
+    uidnext = selected_response_number(mail, 'UIDNEXT')
+    # Servers answer NOMODSEQ instead for mailboxes without persistent MODSEQs
+    highest_modseq = selected_response_number(mail, 'HIGHESTMODSEQ') if condstore else None
+    
+    if uidvalidity is None:
+        print(f"No UIDVALIDITY for {folder_key}, cannot sync by UID")
+        return []
+    
+    state = sync_store.get_folder_state(email_address, folder_key)
+    if state is not None and state['uidvalidity'] != uidvalidity:
+        print(f"UIDVALIDITY of {folder_key} changed, resyncing the folder")
+        sync_store.reset_folder(email_address, folder_key)
+        state = None
+    
+    last_uid = state['last_uid'] if state else 0
+    synced_modseq = state['highest_modseq'] if state else highest_modseq
+    
+    status, uid_data = mail.uid('SEARCH', None, search_criteria if state is None else scope_criteria)
+    if status != 'OK':
+        print(f"Failed to search {folder_key}: {status}")
+        return sync_store.get_messages(email_address, folder_key)
+    
+    server_uids = {int(uid) for uid in uid_data[0].split()} if uid_data and uid_data[0] else set()
+    
+    if state is not None:
+        # Expunged on the server since the last sync
+        expunged_uids = set(sync_store.get_uids(email_address, folder_key)) - server_uids
+        if expunged_uids:
+            sync_store.delete_uids(email_address, folder_key, expunged_uids)
+        
+        # Flags of messages already stored, only those changed since the last sync with CONDSTORE
+        modseq_known = highest_modseq is not None and state['highest_modseq'] is not None
+        if last_uid and not (modseq_known and highest_modseq == state['highest_modseq']):
+            fetch_items = [f'(UID FLAGS {GMAIL_FETCH_ITEMS})' if gmail_extensions else '(UID FLAGS)']
+            if modseq_known:
+                fetch_items.append(f"(CHANGEDSINCE {state['highest_modseq']})")
+            
+            status, flag_data = mail.uid('FETCH', f'1:{last_uid}', *fetch_items)
+            if status == 'OK':
+                labels_by_uid = {}
+                for _, attributes, _ in iter_fetch_response(flag_data or []):
+                    uid = parse_fetch_uid(attributes)
+                    if uid is not None:
+                        labels_by_uid[uid] = message_labels(attributes, folder_name, gmail_extensions)
+                sync_store.update_labels(email_address, folder_key, labels_by_uid)
+                synced_modseq = highest_modseq
+            else:
+                print(f"Failed to fetch flag changes for {folder_key}: {status}")
+    
+    # UID n:* always matches the newest message, so filter rather than trust the range
+    new_uids = sorted(uid for uid in server_uids if uid > last_uid)
+    fetched_all = True
+    
+    for start in range(0, len(new_uids), FETCH_CHUNK_SIZE):
+        chunk = new_uids[start:start + FETCH_CHUNK_SIZE]
+        message_set = build_message_sets(chunk)[0]
+        
+        chunk_messages = fetch_message_chunk(
+            mail, message_set, folder_name, True, lazy_bodies, body_filter, gmail_extensions
+        )
+        if chunk_messages is None:
+            # Leave last_uid before this chunk, the next sync retries from here
+            fetched_all = False
+            break
+        
+        sync_store.put_messages(email_address, folder_key, chunk_messages)
+        last_uid = chunk[-1]
+    
+    # Messages outside search_criteria are not wanted later either, start the next sync after them
+    if state is None and fetched_all and uidnext:
+        last_uid = max(last_uid, uidnext - 1)
+    
+    sync_store.save_folder_state(email_address, folder_key, uidvalidity, last_uid, synced_modseq)
+    
+    return sync_store.get_messages(email_address, folder_key)
+
 def fetch_email_threads(
     email_address: str,
     password: str,
     num_prev_days: Optional[int] = None,
     imap_server: str = "imap.gmail.com",
-    output_file: str = "email_threads.json"
+    output_file: str = "email_threads.json",
+    incremental: bool = False,
+    sync_state_path: str = DEFAULT_SYNC_STATE_PATH,
+    lazy_bodies: bool = False,
+    body_filter: Optional[Callable[[Dict], bool]] = None
 ) -> str:
     """
     Fetch email threads from an email account.
@@ -120,154 +690,109 @@ def fetch_email_threads(
         num_prev_days: Number of previous days to fetch emails from (None for all)
         imap_server: IMAP server address
         output_file: Path to save the JSON output
+        incremental: Sync by UID against the state in sync_state_path, only new messages and
+            flag changes are downloaded after the first run (num_prev_days bounds the first run)
+        sync_state_path: SQLite file holding per-folder UIDVALIDITY, last UID, MODSEQ and messages
+        lazy_bodies: Fetch headers and BODYSTRUCTURE first, then only the text/plain section,
+            attachments are never downloaded
+        body_filter: With lazy_bodies, called with each message's header details, only messages
+            it returns True for get a body (all of them when None)
     
     Returns:
         Path to the saved JSON file
     """
     try:
-        # Connect to IMAP server
-        mail = imaplib.IMAP4_SSL(imap_server)
-        mail.login(email_address, password)
+        # Authenticated connections are kept per account and reused by later runs
+        pool = get_connection_pool(imap_server, email_address, password, on_connect=prepare_connection)
         
         all_emails = []
         
-        def fetch_folder_emails(folder_name):
-            """Helper function to fetch emails from a specific folder."""
+        sync_store = ImapSyncStateStore(sync_state_path) if incremental else None
+        
+        def fetch_folder_emails(folder_name, gmail_scan=False):
+            """Helper function to fetch emails from a specific folder on its own connection."""
             try:
-                # Handle Gmail's special folder names
-                if '[Gmail]' in folder_name:
-                    # Remove any existing quotes
-                    folder_name = folder_name.replace('"', '')
-                    # Properly quote the entire folder name
-                    folder_name = f'"{folder_name}"'
-                elif ' ' in folder_name and not (folder_name.startswith('"') and folder_name.endswith('"')):
-                    folder_name = f'"{folder_name}"'
-
-                status, _ = mail.select(folder_name, readonly=True)
-                if status != 'OK':
-                    print(f"Failed to select folder {folder_name}: {status}")
-                    return []
-                
-                # Set search criteria
-                if num_prev_days is not None:
-                    date_filter = (datetime.now(pytz.UTC) - timedelta(days=num_prev_days))
-                    search_criteria = f'SINCE "{date_filter.strftime("%d-%b-%Y")}"'
-                else:
-                    search_criteria = "ALL"
-                
-                status, message_numbers = mail.search(None, search_criteria)
-                if status != 'OK':
-                    return []
-                
-                folder_emails = []
-                for num in message_numbers[0].split():
-                    try:
-                        status, msg_data = mail.fetch(num, "(RFC822)")
-                        if status != 'OK' or not msg_data or not msg_data[0]:
-                            continue
-                        
-                        email_body = msg_data[0][1]
-                        email_message = email.message_from_bytes(email_body)
-                        email_message.folder = folder_name  # Add folder info
-                        
-                        # Get flags
-                        status, flag_data = mail.fetch(num, "(FLAGS)")
-                        if status == 'OK' and flag_data and flag_data[0]:
-                            email_message.flags = re.findall(r'\(([^)]*)\)', flag_data[0].decode('utf-8'))
-                        
-                        email_details = extract_email_details(email_message)
-                        if email_details:
-                            folder_emails.append(email_details)
-                            
-                    except Exception as e:
-                        print(f"Error processing email {num}: {str(e)}")
-                        continue
-                
-                return folder_emails
+                with pool.connection() as mail:
+                    return fetch_selected_folder_emails(mail, folder_name, gmail_scan)
             except Exception as e:
                 print(f"Error accessing folder {folder_name}: {str(e)}")
                 return []
         
-        # Fetch from Sent folder
-        print("\nFetching from Sent Mail...")
-        sent_folders = ['[Gmail]/Sent Mail', '[Gmail]/Sent', 'Sent', 'Sent Items']
-        for folder in sent_folders:
-            sent_emails = fetch_folder_emails(folder)
-            if sent_emails:
-                print(f"Found {len(sent_emails)} sent emails")
-                all_emails.extend(sent_emails)
-                break
-        
-        # Fetch from Inbox
-        print("\nFetching from Inbox...")
-        inbox_emails = fetch_folder_emails('INBOX')
-        if inbox_emails:
-            print(f"Found {len(inbox_emails)} inbox emails")
-            all_emails.extend(inbox_emails)
-        
-        mail.logout()
+        def fetch_selected_folder_emails(mail, folder_name, gmail_scan):
+            """Select a folder and fetch its emails over the given connection, gmail_scan for All Mail."""
+            # Handle Gmail's special folder names and names with spaces
+            folder_name = quote_folder_name(folder_name)
+
+            status, _ = mail.select(folder_name, readonly=True)
+            if status != 'OK':
+                print(f"Failed to select folder {folder_name}: {status}")
+                return []
+            
+            # Set search criteria
+            if num_prev_days is not None:
+                date_filter = (datetime.now(pytz.UTC) - timedelta(days=num_prev_days))
+                search_criteria = f'SINCE "{date_filter.strftime("%d-%b-%Y")}"'
+            else:
+                search_criteria = "ALL"
+            
+            scope_criteria = "ALL"
+            if gmail_scan:
+                scope_criteria = GMAIL_SCAN_CRITERIA
+                search_criteria = scope_criteria if search_criteria == "ALL" else f"{search_criteria} {scope_criteria}"
+            
+            if sync_store is not None:
+                return sync_folder_emails(
+                    mail, email_address, folder_name, search_criteria, sync_store, mail.condstore,
+                    lazy_bodies, body_filter, gmail_scan, scope_criteria
+                )
+            
+            status, message_numbers = mail.search(None, search_criteria)
+            if status != 'OK':
+                return []
+            
+            folder_emails = []
+            for message_set in build_message_sets(message_numbers[0].split()):
+                # A whole chunk per round-trip, or two with lazy bodies
+                chunk_messages = fetch_message_chunk(
+                    mail, message_set, folder_name, False, lazy_bodies, body_filter, gmail_scan
+                )
+                if chunk_messages:
+                    folder_emails.extend(chunk_messages.values())
+            
+            return folder_emails
         
-        # Organize into threads
-        email_map = {e["message_id"]: e for e in all_emails if e.get("message_id")}
-        thread_map = defaultdict(list)
+        # Resolve folders once from the folder list instead of trying each candidate
+        with pool.connection() as mail:
+            folder_list = list_folders(mail)
+            gmail_extensions = GMAIL_EXTENSION_CAPABILITY in mail.capabilities
         
-        # Build thread relationships
-        for email_data in all_emails:
-            msg_id = email_data.get("message_id")
-            if msg_id:
-                if email_data.get("in_reply_to"):
-                    thread_map[email_data["in_reply_to"]].append(msg_id)
-                for ref in email_data.get("references", []):
-                    thread_map[ref].append(msg_id)
+        all_mail_folder = None
+        if gmail_extensions:
+            all_mail_folder = resolve_special_use_folder(folder_list, '\\All', ALL_MAIL_FOLDER_CANDIDATES)
         
-        def build_thread(root_id: str, visited: set = None) -> List[Dict]:
-            if visited is None:
-                visited = set()
-            if root_id in visited or root_id not in email_map:
-                return []
+        if all_mail_folder is not None:
+            # Gmail threads and labels every message, one All Mail scan replaces the Sent and INBOX passes
+            folders = [('gmail', all_mail_folder)]
+        else:
+            sent_folder = resolve_special_use_folder(folder_list, '\\Sent', SENT_FOLDER_CANDIDATES)
+            if sent_folder is None:
+                print("No Sent folder found")
             
-            visited.add(root_id)
-            thread = [email_map[root_id]]
-            for reply_id in thread_map[root_id]:
-                thread.extend(build_thread(reply_id, visited))
-            return thread
+            folders = [('sent', sent_folder), ('inbox', 'INBOX')]
+            folders = [(kind, folder) for kind, folder in folders if folder]
         
-        # Process all emails into threads
-        threads = []
-        processed = set()
+        # Each folder is fetched on its own pooled connection
+        print(f"\nFetching from {', '.join(folder for _, folder in folders)}...")
+        with ThreadPoolExecutor(max_workers=len(folders)) as executor:
+            folder_results = list(executor.map(lambda entry: fetch_folder_emails(entry[1], entry[0] == 'gmail'), folders))
         
-        for email_data in all_emails:
-            msg_id = email_data.get("message_id")
-            if not msg_id or msg_id in processed:
-                continue
-            
-            # Find thread root
-            current_id = msg_id
-            current_email = email_data
-            while current_email.get("in_reply_to") and current_email["in_reply_to"] in email_map:
-                current_id = current_email["in_reply_to"]
-                current_email = email_map[current_id]
-            
-            # Build thread from root
-            thread_messages = build_thread(current_id)
-            if thread_messages:
-                # Sort chronologically
-                thread_messages.sort(key=lambda x: x["timestamp"])
-                
-                # Create thread object
-                thread = {
-                    "thread_id": str(uuid.uuid4()),  # Generate unique thread ID
-                    "total_messages": len(thread_messages),
-                    "labels": list(set(sum([msg.get("labels", []) for msg in thread_messages], []))),
-                    "reply_to_message_id": thread_messages[-1]["message_id"] if thread_messages else None,
-                    "messages": thread_messages
-                }
-                
-                threads.append(thread)
-                processed.update(msg["message_id"] for msg in thread_messages)
+        for (kind, _), folder_emails in zip(folders, folder_results):
+            if folder_emails:
+                print(f"Found {len(folder_emails)} {kind} emails")
+                all_emails.extend(folder_emails)
         
-        # Sort threads by latest message
-        threads.sort(key=lambda x: max(msg["timestamp"] for msg in x["messages"]), reverse=True)
+        # Organize into threads, latest first
+        threads = build_threads(all_emails)
         
         # Save to JSON
         output_path = Path(output_file)
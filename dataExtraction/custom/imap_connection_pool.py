@@ -0,0 +1,201 @@
+import sys
+import time
+import imaplib
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Callable, Iterator, Optional
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Gmail allows 15 simultaneous IMAP connections per account, leave room for the user's own clients
+DEFAULT_MAX_CONNECTIONS = 4
+
+# Idle connections older than this are checked with NOOP before they are handed out again
+IDLE_CHECK_SECONDS = 60
+
+# Idle connections older than this are logged out, and a pool left empty leaves the registry
+POOL_IDLE_SECONDS = 300
+
+# How often the registry looks for idle connections
+EVICTION_INTERVAL_SECONDS = 60
+
+class ImapConnectionPool:
+    """
+    Authenticated IMAP connections to one account, each handed to one caller at a time.
+
+    Connections go back to the pool after use, so later folders and later runs skip the TLS
+    handshake and LOGIN. A connection that fails with an abort or socket error is dropped, and
+    one left idle for POOL_IDLE_SECONDS is logged out by the registry.
+    """
+
+    def __init__(
+        self,
+        imap_server: str,
+        email_address: str,
+        password: str,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        on_connect: Optional[Callable[[imaplib.IMAP4], None]] = None
+    ):
+        self.imap_server = imap_server
+        self.email_address = email_address
+        self.password = password
+        self.on_connect = on_connect
+
+        self._idle: List[Tuple[imaplib.IMAP4, float]] = []
+        self._borrowed = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _connect(self) -> imaplib.IMAP4:
+        """Open and authenticate a new connection."""
+        mail = imaplib.IMAP4_SSL(self.imap_server)
+        mail.login(self.email_address, self.password)
+
+        if self.on_connect is not None:
+            self.on_connect(mail)
+        return mail
+
+    @staticmethod
+    def _is_alive(mail: imaplib.IMAP4) -> bool:
+        """Check a connection the server may have timed out."""
+        try:
+            status, _ = mail.noop()
+            return status == 'OK'
+        except Exception:
+            return False
+
+    @staticmethod
+    def _logout(mail: imaplib.IMAP4) -> None:
+        try:
+            mail.logout()
+        except Exception:
+            pass
+
+    def _checkout(self) -> imaplib.IMAP4:
+        """Return a live idle connection, or a new one if none is left."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                mail, last_used = self._idle.pop()
+
+            if time.monotonic() - last_used < IDLE_CHECK_SECONDS or self._is_alive(mail):
+                return mail
+            self._logout(mail)
+
+        return self._connect()
+
+    @contextmanager
+    def connection(self) -> Iterator[imaplib.IMAP4]:
+        """Borrow a connection for the duration of the with block."""
+        self._slots.acquire()
+        with self._lock:
+            self._borrowed += 1
+        mail = None
+        try:
+            mail = self._checkout()
+            yield mail
+        except (imaplib.IMAP4.abort, OSError):
+            # The connection state is unknown, never hand it out again
+            if mail is not None:
+                self._logout(mail)
+                mail = None
+            raise
+        finally:
+            with self._lock:
+                self._borrowed -= 1
+                # A closed pool is out of the registry, nothing would ever evict the connection
+                if mail is not None and not self._closed:
+                    self._idle.append((mail, time.monotonic()))
+                    mail = None
+            if mail is not None:
+                self._logout(mail)
+            self._slots.release()
+
+    def evict_idle(self, max_idle_seconds: float = POOL_IDLE_SECONDS) -> bool:
+        """Log out connections idle for max_idle_seconds, return whether the pool is left unused."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [mail for mail, last_used in self._idle if now - last_used >= max_idle_seconds]
+            self._idle = [(mail, last_used) for mail, last_used in self._idle if now - last_used < max_idle_seconds]
+            unused = not self._idle and self._borrowed == 0
+
+        for mail in stale:
+            self._logout(mail)
+        return unused
+
+    def close(self) -> None:
+        """Log out every idle connection, borrowed ones are logged out when they come back."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+
+        for mail, _ in idle:
+            self._logout(mail)
+
+# Pools live for the process, keyed by account, so repeated runs reuse authenticated connections
+_connection_pools: Dict[Tuple[str, str], ImapConnectionPool] = {}
+_connection_pools_lock = threading.Lock()
+_eviction_thread: Optional[threading.Thread] = None
+
+def _run_eviction() -> None:
+    """Evict idle connections until the registry is empty."""
+    global _eviction_thread
+
+    while True:
+        time.sleep(EVICTION_INTERVAL_SECONDS)
+        evict_idle_connection_pools()
+
+        with _connection_pools_lock:
+            if not _connection_pools:
+                _eviction_thread = None
+                return
+
+def evict_idle_connection_pools(max_idle_seconds: float = POOL_IDLE_SECONDS) -> None:
+    """Log out idle connections and drop pools left unused, with the password they hold."""
+    with _connection_pools_lock:
+        pools = list(_connection_pools.items())
+
+    for key, pool in pools:
+        if not pool.evict_idle(max_idle_seconds):
+            continue
+        with _connection_pools_lock:
+            if _connection_pools.get(key) is pool:
+                del _connection_pools[key]
+        pool.close()
+
+def get_connection_pool(
+    imap_server: str,
+    email_address: str,
+    password: str,
+    on_connect: Optional[Callable[[imaplib.IMAP4], None]] = None
+) -> ImapConnectionPool:
+    """Return the account's pool, replacing it when the password changed."""
+    global _eviction_thread
+    key = (imap_server, email_address)
+
+    with _connection_pools_lock:
+        if _eviction_thread is None:
+            _eviction_thread = threading.Thread(target=_run_eviction, name='imap-pool-eviction', daemon=True)
+            _eviction_thread.start()
+
+        pool = _connection_pools.get(key)
+        if pool is not None and pool.password != password:
+            pool.close()
+            pool = None
+        if pool is None:
+            pool = ImapConnectionPool(imap_server, email_address, password, on_connect=on_connect)
+            _connection_pools[key] = pool
+        return pool
+
+def close_connection_pools() -> None:
+    """Log out of every pooled connection, e.g. on shutdown."""
+    with _connection_pools_lock:
+        pools = list(_connection_pools.values())
+        _connection_pools.clear()
+
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,431 @@
+import sys
+import re
+import ssl
+import base64
+import asyncio
+from pathlib import Path
+from typing import List, Dict, Set, Optional, Callable, Awaitable
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+IMAP_SSL_PORT = 993
+
+# RFC 2177 servers may drop an IDLE after 30 minutes, so it is re-issued well before that
+IDLE_RENEW_SECONDS = 25 * 60
+
+# Timeout for every command other than IDLE itself
+COMMAND_TIMEOUT = 60
+
+# Servers without IDLE are checked with NOOP this often instead
+NOOP_POLL_SECONDS = 60
+
+RECONNECT_MIN_SECONDS = 5
+RECONNECT_MAX_SECONDS = 300
+
+# An account the server refused to authenticate is not watched again for this long, unless its settings change
+AUTH_FAILURE_RETRY_SECONDS = 24 * 60 * 60
+
+# Gmail only accepts an OAuth access token over IMAP when the grant includes this scope, gmail.modify is not enough
+GMAIL_IMAP_SCOPE = "https://mail.google.com/"
+
+LITERAL_SUFFIX = re.compile(rb'\{(\d+)\}$')
+EXISTS_RESPONSE = re.compile(rb'^\* (\d+) EXISTS', re.IGNORECASE)
+RESPONSE_CODE_NUMBER = re.compile(rb'\[(UIDNEXT|UIDVALIDITY) (\d+)\]', re.IGNORECASE)
+CAPABILITY_RESPONSE = re.compile(rb'CAPABILITY ([^\]]*)', re.IGNORECASE)
+
+class ImapIdleError(Exception):
+    pass
+
+class ImapIdleAuthenticationError(ImapIdleError):
+    pass
+
+def quote_imap_string(value: str) -> str:
+    """Quote a string argument for an IMAP command."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class ImapIdleSession:
+    """
+    A minimal asyncio IMAP client that only authenticates, examines one folder and waits in IDLE.
+
+    It holds no thread and next to no memory, so one event loop can keep thousands open.
+    Messages are fetched elsewhere, over the extractor's pooled imaplib connections.
+    """
+
+    def __init__(self, imap_server: str, port: int = IMAP_SSL_PORT):
+        self.imap_server = imap_server
+        self.port = port
+        self.capabilities: Set[str] = set()
+        self.exists = 0
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tag_counter = 0
+        self._idling = False
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.imap_server, self.port, ssl=ssl.create_default_context()),
+            COMMAND_TIMEOUT
+        )
+        greeting = await self._read_response_line(COMMAND_TIMEOUT)
+        if not greeting.upper().startswith(b'* OK'):
+            raise ImapIdleError(f"Unexpected greeting from {self.imap_server}: {greeting!r}")
+        self._update_capabilities(greeting)
+
+    async def _read_response_line(self, timeout: Optional[float]) -> bytes:
+        """Read one response line, with any literals it announces folded in."""
+        line = await asyncio.wait_for(self._reader.readline(), timeout)
+        if not line:
+            raise ConnectionError(f"{self.imap_server} closed the connection")
+        line = line.rstrip(b'\r\n')
+
+        literal = LITERAL_SUFFIX.search(line)
+        while literal:
+            data = await asyncio.wait_for(self._reader.readexactly(int(literal.group(1))), COMMAND_TIMEOUT)
+            rest = (await asyncio.wait_for(self._reader.readline(), COMMAND_TIMEOUT)).rstrip(b'\r\n')
+            line = line + data + rest
+            literal = LITERAL_SUFFIX.search(rest)
+
+        if line.upper().startswith(b'* BYE'):
+            raise ConnectionError(f"{self.imap_server} said goodbye: {line!r}")
+        return line
+
+    async def _write(self, data: bytes) -> None:
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def _next_tag(self) -> bytes:
+        self._tag_counter += 1
+        return f"I{self._tag_counter:04d}".encode()
+
+    def _update_capabilities(self, line: bytes) -> None:
+        match = CAPABILITY_RESPONSE.search(line)
+        if match:
+            self.capabilities = set(match.group(1).decode('utf-8', errors='replace').upper().split())
+
+    async def command(self, command: str, continuation: Optional[bytes] = None) -> List[bytes]:
+        """Run a command and return its untagged responses, raising unless it completes with OK."""
+        tag = self._next_tag()
+        await self._write(tag + b' ' + command.encode('utf-8') + b'\r\n')
+
+        untagged = []
+        continued = False
+        while True:
+            line = await self._read_response_line(COMMAND_TIMEOUT)
+            if line.startswith(b'+'):
+                # The first continuation takes the payload, a second one is a SASL error to acknowledge
+                await self._write((continuation if continuation is not None and not continued else b'') + b'\r\n')
+                continued = True
+                continue
+            if line.startswith(tag + b' '):
+                if not line[len(tag) + 1:].upper().startswith(b'OK'):
+                    raise ImapIdleError(f"{command.split(' ', 1)[0]} failed: {line.decode('utf-8', errors='replace')}")
+                self._update_capabilities(line)
+                return untagged
+            self._update_capabilities(line)
+            untagged.append(line)
+
+    async def authenticate(self, email_address: str, password: Optional[str] = None, access_token: Optional[str] = None) -> None:
+        """LOGIN with a password, or AUTHENTICATE XOAUTH2 with an OAuth access token."""
+        try:
+            if access_token is not None:
+                payload = base64.b64encode(f"user={email_address}\x01auth=Bearer {access_token}\x01\x01".encode('utf-8'))
+                if 'SASL-IR' in self.capabilities:
+                    await self.command(f"AUTHENTICATE XOAUTH2 {payload.decode('ascii')}")
+                else:
+                    await self.command("AUTHENTICATE XOAUTH2", continuation=payload)
+            else:
+                await self.command(f"LOGIN {quote_imap_string(email_address)} {quote_imap_string(password or '')}")
+        except ImapIdleError as e:
+            # A tagged NO or BAD here is the server rejecting the credentials, not a dropped connection
+            raise ImapIdleAuthenticationError(str(e)) from e
+
+        # The pre-login list may be shorter, IDLE in particular
+        if 'IDLE' not in self.capabilities:
+            for line in await self.command("CAPABILITY"):
+                self._update_capabilities(line)
+
+    async def examine(self, folder: str) -> Dict[str, int]:
+        """Open a folder read-only and return its EXISTS, UIDNEXT and UIDVALIDITY."""
+        mailbox = {}
+        for line in await self.command(f"EXAMINE {quote_imap_string(folder)}"):
+            exists = EXISTS_RESPONSE.match(line)
+            if exists:
+                self.exists = int(exists.group(1))
+            for code, value in RESPONSE_CODE_NUMBER.findall(line):
+                mailbox[code.decode().upper()] = int(value)
+
+        mailbox['EXISTS'] = self.exists
+        return mailbox
+
+    async def idle(self, timeout: float) -> bool:
+        """Wait in IDLE until the folder grows or timeout passes, return whether new mail arrived."""
+        if 'IDLE' not in self.capabilities:
+            # Fallback for servers without IDLE, NOOP is where they report new mail
+            await asyncio.sleep(min(timeout, NOOP_POLL_SECONDS))
+            previous = self.exists
+            for line in await self.command("NOOP"):
+                exists = EXISTS_RESPONSE.match(line)
+                if exists:
+                    self.exists = int(exists.group(1))
+            return self.exists > previous
+
+        tag = self._next_tag()
+        await self._write(tag + b' IDLE\r\n')
+        self._idling = True
+
+        line = await self._read_response_line(COMMAND_TIMEOUT)
+        while not line.startswith(b'+'):
+            if line.startswith(tag + b' '):
+                raise ImapIdleError(f"IDLE refused: {line.decode('utf-8', errors='replace')}")
+            line = await self._read_response_line(COMMAND_TIMEOUT)
+
+        previous = self.exists
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while self.exists <= previous:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                line = await self._read_response_line(remaining)
+            except asyncio.TimeoutError:
+                break
+
+            exists = EXISTS_RESPONSE.match(line)
+            if exists:
+                self.exists = int(exists.group(1))
+            elif line.upper().endswith(b'EXPUNGE'):
+                self.exists = max(self.exists - 1, 0)
+                previous = min(previous, self.exists)
+
+        await self._write(b'DONE\r\n')
+        self._idling = False
+        line = await self._read_response_line(COMMAND_TIMEOUT)
+        while not line.startswith(tag + b' '):
+            exists = EXISTS_RESPONSE.match(line)
+            if exists:
+                self.exists = int(exists.group(1))
+            line = await self._read_response_line(COMMAND_TIMEOUT)
+
+        return self.exists > previous
+
+    async def search_new_uids(self, last_uid: int) -> List[int]:
+        """Return the UIDs above last_uid in the examined folder."""
+        uids = []
+        for line in await self.command(f"UID SEARCH UID {last_uid + 1}:*"):
+            if line.upper().startswith(b'* SEARCH'):
+                uids.extend(int(uid) for uid in line[len(b'* SEARCH'):].split())
+
+        # UID n:* always matches the newest message, even one below n
+        return sorted(uid for uid in uids if uid > last_uid)
+
+    async def close(self) -> None:
+        if self._writer is None:
+            return
+        try:
+            # Cancelled while idling, IDLE has to end before any other command
+            if self._idling:
+                self._idling = False
+                await self._write(b'DONE\r\n')
+            await self.command("LOGOUT")
+        except Exception:
+            pass
+        try:
+            self._writer.close()
+            await self._writer.wait_closed()
+        except Exception:
+            pass
+        self._writer = None
+
+class ImapIdleAccount:
+    """An account to watch, with either a password or a callable returning an OAuth access token."""
+
+    def __init__(
+        self,
+        email_address: str,
+        imap_server: str = "imap.gmail.com",
+        password: Optional[str] = None,
+        token_provider: Optional[Callable[[], str]] = None,
+        mode: str = "manual"
+    ):
+        self.email_address = email_address
+        self.imap_server = imap_server
+        self.password = password
+        self.token_provider = token_provider
+        self.mode = mode
+
+    def connection_key(self) -> tuple:
+        """Changes whenever the watcher has to reconnect to pick up new settings."""
+        return (self.imap_server, self.password, self.mode)
+
+def build_idle_account(user_details: Dict[str, str], token_provider: Optional[Callable[[], str]] = None) -> Optional[ImapIdleAccount]:
+    """
+    The account to watch for a stored user record, or None when the record cannot log in over IMAP.
+
+    OAuth records need the scopes they were granted in 'scope' (space separated, as Google returns
+    them) and a token_provider, manual records need an 'app_password' or 'password'.
+    """
+    email_id = user_details.get('email')
+
+    if user_details.get('mode') == 'oauth':
+        if GMAIL_IMAP_SCOPE not in (user_details.get('scope') or '').split():
+            print(f"Not watching {email_id}: the stored OAuth grant lacks the {GMAIL_IMAP_SCOPE} scope IMAP needs")
+            return None
+        if token_provider is None:
+            return None
+
+        return ImapIdleAccount(email_id, token_provider=token_provider, mode='oauth')
+
+    password = user_details.get('app_password') or user_details.get('password')
+    if not password:
+        print(f"Not watching {email_id}: no IMAP password stored")
+        return None
+
+    return ImapIdleAccount(
+        email_id,
+        imap_server=user_details.get('imap_server') or "imap.gmail.com",
+        password=password,
+        mode='manual'
+    )
+
+class ImapIdleMonitor:
+    """
+    Keeps one IDLE connection per account in the running event loop and reports new mail.
+
+    on_new_mail(account, uids) is awaited with the UIDs that arrived in the watched folder. Calls
+    for the same account run one after another, other accounts are not held up by them.
+    A dropped connection is re-established with backoff and picks up what arrived meanwhile.
+    An account whose credentials are rejected is dropped instead, e.g. an OAuth grant without
+    the https://mail.google.com/ scope.
+    """
+
+    def __init__(
+        self,
+        on_new_mail: Callable[[ImapIdleAccount, List[int]], Awaitable[None]],
+        folder: str = "INBOX",
+        renew_seconds: float = IDLE_RENEW_SECONDS
+    ):
+        self.on_new_mail = on_new_mail
+        self.folder = folder
+        self.renew_seconds = renew_seconds
+
+        self._accounts: Dict[str, ImapIdleAccount] = {}
+        self._watchers: Dict[str, asyncio.Task] = {}
+        self._dispatch_locks: Dict[str, asyncio.Lock] = {}
+        self._dispatches: Set[asyncio.Task] = set()
+        self._rejected: Dict[str, tuple] = {}
+
+    def watched(self) -> List[str]:
+        return list(self._watchers)
+
+    def watch(self, account: ImapIdleAccount) -> None:
+        """Start watching an account, or restart its watcher if its settings changed."""
+        current = self._accounts.get(account.email_address)
+        if current is not None and current.connection_key() == account.connection_key():
+            current.token_provider = account.token_provider
+            return
+
+        rejected = self._rejected.get(account.email_address)
+        if rejected is not None:
+            rejected_key, rejected_at = rejected
+            loop_time = asyncio.get_running_loop().time()
+            if rejected_key == account.connection_key() and loop_time - rejected_at < AUTH_FAILURE_RETRY_SECONDS:
+                return
+            del self._rejected[account.email_address]
+
+        self.unwatch(account.email_address)
+        self._accounts[account.email_address] = account
+        self._watchers[account.email_address] = asyncio.create_task(self._watch(account))
+
+    def unwatch(self, email_address: str) -> None:
+        self._accounts.pop(email_address, None)
+        watcher = self._watchers.pop(email_address, None)
+        if watcher is not None:
+            watcher.cancel()
+
+    async def stop(self) -> None:
+        """Cancel every watcher and wait for pending new-mail handlers."""
+        watchers = list(self._watchers.values())
+        for email_address in list(self._watchers):
+            self.unwatch(email_address)
+
+        await asyncio.gather(*watchers, return_exceptions=True)
+        await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+    async def _dispatch(self, account: ImapIdleAccount, uids: List[int]) -> None:
+        lock = self._dispatch_locks.setdefault(account.email_address, asyncio.Lock())
+        async with lock:
+            try:
+                await self.on_new_mail(account, uids)
+            except Exception as e:
+                print(f"Error handling new mail for {account.email_address}: {str(e)}")
+
+    def _schedule_dispatch(self, account: ImapIdleAccount, uids: List[int]) -> None:
+        # The handler runs on its own, so the connection goes straight back to IDLE
+        task = asyncio.create_task(self._dispatch(account, uids))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _watch(self, account: ImapIdleAccount) -> None:
+        backoff = RECONNECT_MIN_SECONDS
+        uidvalidity = None
+        last_uid = None
+
+        while True:
+            session = ImapIdleSession(account.imap_server)
+            try:
+                await session.connect()
+
+                access_token = None
+                if account.token_provider is not None:
+                    access_token = await asyncio.to_thread(account.token_provider)
+                await session.authenticate(account.email_address, account.password, access_token)
+
+                mailbox = await session.examine(self.folder)
+
+                if uidvalidity is not None and mailbox.get('UIDVALIDITY') == uidvalidity:
+                    # Reconnected, report what arrived while the connection was down
+                    uids = await session.search_new_uids(last_uid)
+                    if uids:
+                        last_uid = uids[-1]
+                        self._schedule_dispatch(account, uids)
+                else:
+                    uidvalidity = mailbox.get('UIDVALIDITY')
+                    last_uid = mailbox['UIDNEXT'] - 1 if 'UIDNEXT' in mailbox else None
+                    if last_uid is None:
+                        existing = await session.search_new_uids(0)
+                        last_uid = existing[-1] if existing else 0
+
+                print(f"Watching {self.folder} of {account.email_address} for new mail")
+                backoff = RECONNECT_MIN_SECONDS
+
+                while True:
+                    if not await session.idle(self.renew_seconds):
+                        continue
+
+                    uids = await session.search_new_uids(last_uid)
+                    if uids:
+                        last_uid = uids[-1]
+                        self._schedule_dispatch(account, uids)
+
+            except asyncio.CancelledError:
+                await session.close()
+                raise
+            except ImapIdleAuthenticationError as e:
+                # Retrying cannot fix rejected credentials, wait for new settings instead
+                print(f"Authentication for {account.email_address} was rejected, no longer watching it: {str(e)}")
+                await session.close()
+                self._rejected[account.email_address] = (account.connection_key(), asyncio.get_running_loop().time())
+                if self._watchers.get(account.email_address) is asyncio.current_task():
+                    del self._watchers[account.email_address]
+                    self._accounts.pop(account.email_address, None)
+                return
+            except Exception as e:
+                print(f"IDLE connection for {account.email_address} failed, retrying in {backoff}s: {str(e)}")
+
+            await session.close()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
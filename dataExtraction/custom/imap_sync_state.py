@@ -0,0 +1,147 @@
+import sys
+import json
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+DEFAULT_SYNC_STATE_PATH = 'cache/imap_sync_state.sqlite3'
+
+class ImapSyncStateStore:
+    """
+    Per-folder IMAP sync state and the messages synced so far.
+
+    A folder's state is only valid for the UIDVALIDITY it was recorded under, callers reset
+    the folder when the server reports a different one.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_SYNC_STATE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS folders (
+                    email_id TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    last_uid INTEGER NOT NULL,
+                    highest_modseq INTEGER,
+                    PRIMARY KEY (email_id, folder)
+                )
+            ''')
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    email_id TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uid INTEGER NOT NULL,
+                    labels TEXT NOT NULL,
+                    details BLOB NOT NULL,
+                    PRIMARY KEY (email_id, folder, uid)
+                )
+            ''')
+
+    def get_folder_state(self, email_id: str, folder: str) -> Optional[Dict[str, Any]]:
+        """Return uidvalidity, last_uid and highest_modseq for a folder, or None if it was never synced."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT uidvalidity, last_uid, highest_modseq FROM folders WHERE email_id = ? AND folder = ?',
+                (email_id, folder)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {'uidvalidity': row[0], 'last_uid': row[1], 'highest_modseq': row[2]}
+
+    def save_folder_state(
+        self,
+        email_id: str,
+        folder: str,
+        uidvalidity: int,
+        last_uid: int,
+        highest_modseq: Optional[int]
+    ) -> None:
+        """Record how far a folder has been synced."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?)',
+                (email_id, folder, uidvalidity, last_uid, highest_modseq)
+            )
+
+    def reset_folder(self, email_id: str, folder: str) -> None:
+        """Forget a folder's state and messages, the next sync starts from scratch."""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM folders WHERE email_id = ? AND folder = ?', (email_id, folder))
+            self._connection.execute('DELETE FROM messages WHERE email_id = ? AND folder = ?', (email_id, folder))
+
+    def get_uids(self, email_id: str, folder: str) -> List[int]:
+        """Return the UIDs stored for a folder."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT uid FROM messages WHERE email_id = ? AND folder = ?',
+                (email_id, folder)
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def get_messages(self, email_id: str, folder: str) -> List[Dict]:
+        """Return the stored message details of a folder with their current labels."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT labels, details FROM messages WHERE email_id = ? AND folder = ? ORDER BY uid',
+                (email_id, folder)
+            ).fetchall()
+
+        messages = []
+        for labels, details in rows:
+            message = json.loads(zlib.decompress(details).decode('utf-8'))
+            message['labels'] = json.loads(labels)
+            messages.append(message)
+
+        return messages
+
+    def put_messages(self, email_id: str, folder: str, messages: Dict[int, Dict]) -> None:
+        """Store message details keyed by UID."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)',
+                [
+                    (
+                        email_id,
+                        folder,
+                        uid,
+                        json.dumps(details.get('labels', [])),
+                        zlib.compress(json.dumps(details, ensure_ascii=False).encode('utf-8'))
+                    )
+                    for uid, details in messages.items()
+                ]
+            )
+
+    def update_labels(self, email_id: str, folder: str, labels_by_uid: Dict[int, List[str]]) -> None:
+        """Replace the labels of stored messages, UIDs that are not stored are ignored."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'UPDATE messages SET labels = ? WHERE email_id = ? AND folder = ? AND uid = ?',
+                [(json.dumps(labels), email_id, folder, uid) for uid, labels in labels_by_uid.items()]
+            )
+
+    def delete_uids(self, email_id: str, folder: str, uids: Iterable[int]) -> None:
+        """Drop messages that were expunged on the server."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'DELETE FROM messages WHERE email_id = ? AND folder = ? AND uid = ?',
+                [(email_id, folder, uid) for uid in uids]
+            )
@@ -0,0 +1,170 @@
+import sys
+import re
+import uuid
+import hashlib
+from pathlib import Path
+from typing import List, Dict
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+MESSAGE_ID_PATTERN = re.compile(r'<[^<>\s]+>')
+
+# Reply and forward prefixes, including localised ones and counters such as "Re[2]:"
+SUBJECT_PREFIX_PATTERN = re.compile(r'^\s*((re|fwd?|aw|sv|vs|antw)(\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+
+class UnionFind:
+    """Disjoint sets over message IDs, with path halving and union by size."""
+
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+        self.size: Dict[str, int] = {}
+
+    def add(self, key: str) -> None:
+        if key not in self.parent:
+            self.parent[key] = key
+            self.size[key] = 1
+
+    def find(self, key: str) -> str:
+        parent = self.parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, first: str, second: str) -> None:
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.size[first] += self.size[second]
+
+def extract_message_ids(value) -> List[str]:
+    """Pull <message-id> tokens out of a header value or a list of them."""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(str(item) for item in value)
+
+    message_ids = MESSAGE_ID_PATTERN.findall(value)
+    # Some clients drop the angle brackets, keep the bare value rather than lose the link
+    return message_ids or value.split()
+
+def normalize_subject(subject: str) -> str:
+    """Subject without reply/forward prefixes, case or repeated whitespace."""
+    return ' '.join(SUBJECT_PREFIX_PATTERN.sub('', subject or '').split()).lower()
+
+def is_reply_subject(subject: str) -> bool:
+    """Whether the subject carries a reply or forward prefix."""
+    return bool(SUBJECT_PREFIX_PATTERN.match(subject or ''))
+
+def message_key(message: Dict) -> str:
+    """The message's Message-ID, or a stable stand-in for messages that lack one."""
+    message_ids = extract_message_ids(message.get("message_id", ""))
+    if message_ids:
+        return message_ids[0]
+
+    fingerprint = '\x00'.join(
+        str(message.get(field, "")) for field in ("sender", "receiver", "subject", "timestamp")
+    )
+    return f"<no-id-{hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()}>"
+
+def thread_root_id(first_message: Dict, key: str) -> str:
+    """
+    The ID a thread is named after: the first References entry of its earliest message.
+
+    References starts with the thread's original message, so the root stays the same when older
+    messages fall outside the fetched window or new replies arrive.
+    """
+    references = extract_message_ids(first_message.get("references", []))
+    if references:
+        return references[0]
+    in_reply_to = extract_message_ids(first_message.get("in_reply_to", ""))
+    return in_reply_to[0] if in_reply_to else key
+
+def build_threads(messages: List[Dict]) -> List[Dict]:
+    """
+    Group messages into threads, JWZ style, in near-linear time.
+
+    Messages are linked through References and In-Reply-To, also via IDs of messages that were
+    not fetched, so siblings of a missing parent still end up together. A reply with no such
+    headers joins the thread of an earlier message with the same normalized subject. The same
+    message seen in several folders is kept once with the union of its labels. Messages that
+    carry a gmail_thread_id are grouped by it alone and their thread takes that ID.
+
+    Returns threads sorted by their latest message, each with a deterministic thread_id.
+    """
+    union_find = UnionFind()
+    messages_by_key: Dict[str, Dict] = {}
+    labels_by_key: Dict[str, set] = {}
+
+    for message in messages:
+        key = message_key(message)
+        if key in messages_by_key:
+            labels_by_key[key].update(message.get("labels", []))
+            continue
+
+        messages_by_key[key] = message
+        labels_by_key[key] = set(message.get("labels", []))
+        union_find.add(key)
+
+        # Gmail already threaded the message, its thread ID is the only link needed
+        gmail_thread_id = message.get("gmail_thread_id")
+        if gmail_thread_id:
+            union_find.add(f"gmail-thread:{gmail_thread_id}")
+            union_find.union(key, f"gmail-thread:{gmail_thread_id}")
+            continue
+
+        for related_id in extract_message_ids(message.get("references", [])) + extract_message_ids(message.get("in_reply_to", "")):
+            union_find.add(related_id)
+            union_find.union(key, related_id)
+
+    # Header-less replies join the earliest message carrying the same subject
+    subject_anchors: Dict[str, str] = {}
+    ordered_keys = sorted(messages_by_key, key=lambda key: (messages_by_key[key].get("timestamp", 0), key))
+
+    for key in ordered_keys:
+        message = messages_by_key[key]
+        subject = normalize_subject(message.get("subject", ""))
+        if not subject or message.get("gmail_thread_id"):
+            continue
+
+        anchor = subject_anchors.setdefault(subject, key)
+        has_thread_headers = message.get("references") or message.get("in_reply_to")
+        if anchor != key and not has_thread_headers and is_reply_subject(message.get("subject", "")):
+            union_find.union(anchor, key)
+
+    # Collect each component in chronological order
+    components: Dict[str, List[str]] = {}
+    for key in ordered_keys:
+        components.setdefault(union_find.find(key), []).append(key)
+
+    threads = []
+    for keys in components.values():
+        thread_messages = []
+        thread_labels = set()
+        for key in keys:
+            message = messages_by_key[key]
+            message["labels"] = sorted(labels_by_key[key])
+            thread_messages.append(message)
+            thread_labels.update(labels_by_key[key])
+
+        thread_id = thread_messages[0].get("gmail_thread_id")
+        if not thread_id:
+            root_id = thread_root_id(thread_messages[0], keys[0])
+            thread_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"message-thread:{root_id}"))
+
+        threads.append({
+            "thread_id": thread_id,
+            "total_messages": len(thread_messages),
+            "labels": sorted(thread_labels),
+            "reply_to_message_id": thread_messages[-1]["message_id"],
+            "messages": thread_messages
+        })
+
+    # Latest message first, ties broken by ID so the output order is stable as well
+    threads.sort(key=lambda thread: (thread["messages"][-1].get("timestamp", 0), thread["thread_id"]), reverse=True)
+
+    return threads
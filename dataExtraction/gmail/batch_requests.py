@@ -0,0 +1,140 @@
+import sys
+import time
+import random
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Tuple
+
+# Google API imports
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Custom imports
+from dataExtraction.gmail.quota_accounting import charge_request
+
+# Status codes worth retrying for a single sub-request
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_403_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+class GmailBatchRequester:
+
+    # Gmail rejects batches with more than 100 sub-requests
+    MAX_BATCH_SIZE = 100
+
+    def __init__(self, service, batch_size: int = 50, max_retries: int = 5, base_delay: float = 1.0):
+
+        if not 0 < batch_size <= self.MAX_BATCH_SIZE:
+            raise ValueError(f"Batch size must be between 1 and {self.MAX_BATCH_SIZE}")
+
+        self._service = service
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+
+        if not isinstance(error, HttpError):
+            # Transport level failures (timeouts, dropped connections) are transient
+            return True
+
+        status = error.resp.status
+        if status in RETRYABLE_STATUS_CODES:
+            return True
+
+        if status == 403:
+            reasons = {detail.get('reason') for detail in (error.error_details or []) if isinstance(detail, dict)}
+            return bool(reasons & RETRYABLE_403_REASONS) or 'rateLimitExceeded' in str(error)
+
+        return False
+
+    def _execute_chunk(
+        self,
+        item_ids: List[str],
+        build_request: Callable[[str], HttpRequest]
+    ) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+
+        results = {}
+        errors = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                results[request_id] = response
+
+        batch = self._service.new_batch_http_request(callback=callback)
+        for item_id in item_ids:
+            request = build_request(item_id)
+
+            # Batched calls cost the same quota as single ones, so each one is charged up front
+            charge_request(request)
+            batch.add(request, request_id=item_id)
+
+        try:
+            batch.execute()
+        except Exception as e:
+            # The whole batch failed, so every item without a result is marked as failed
+            print(f"Gmail batch request failed: {e}")
+            for item_id in item_ids:
+                if item_id not in results:
+                    errors[item_id] = e
+
+        return results, errors
+
+    def execute(
+        self,
+        item_ids: Iterable[str],
+        build_request: Callable[[str], HttpRequest]
+    ) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+
+        # Drop duplicates while keeping the caller's order
+        pending = list(dict.fromkeys(item_ids))
+
+        results = {}
+        errors = {}
+        attempt = 0
+
+        while pending:
+            retry_ids = []
+
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                chunk_results, chunk_errors = self._execute_chunk(chunk, build_request)
+                results.update(chunk_results)
+
+                for item_id, error in chunk_errors.items():
+                    if self._is_retryable(error) and attempt < self.max_retries:
+                        retry_ids.append(item_id)
+                    else:
+                        errors[item_id] = error
+
+            if not retry_ids:
+                break
+
+            # Only the failed items are sent again, after an exponential backoff
+            attempt += 1
+            delay = self.base_delay * (2 ** (attempt - 1)) + random.uniform(0, self.base_delay)
+            print(f"Retrying {len(retry_ids)} failed Gmail sub-requests in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+            pending = retry_ids
+
+        return results, errors
+
+    def get_messages(self, message_ids: Iterable[str], **params) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+
+        messages = self._service.users().messages()
+        return self.execute(
+            message_ids,
+            lambda message_id: messages.get(userId='me', id=message_id, **params)
+        )
+
+    def get_threads(self, thread_ids: Iterable[str], **params) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+
+        threads = self._service.users().threads()
+        return self.execute(
+            thread_ids,
+            lambda thread_id: threads.get(userId='me', id=thread_id, **params)
+        )
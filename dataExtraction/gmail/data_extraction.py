@@ -2,9 +2,9 @@ import sys
 import json
 import uuid
 from pathlib import Path
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional, Set, Iterator
 from datetime import datetime
-import pytz
+import numpy as np
 
 import json
 from datetime import datetime
@@ -16,49 +16,93 @@ from dataExtraction.gmail.thread_id import GmailThreadFetcher
 from dataExtraction.gmail.message_ids import GmailMessageFetcher
 from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher
 from dataExtraction.gmail.message_labels import GmailMessageLabelsFetcher
+from dataExtraction.gmail.thread_hydration import GmailThreadHydrator
+from dataExtraction.gmail.message_cache import get_message_cache
+from dataExtraction.gmail.parallel_extraction import GmailParallelThreadFetcher
+from dataExtraction.gmail.extraction_filters import GmailExtractionFilter
 
 class GmailDataExtractor:
 
-    def __init__(self, email):
+    def __init__(self, email, parallel_workers: Optional[int] = None, filters: Optional[GmailExtractionFilter] = None):
         self.email = email
-        self.thread_fetcher = GmailThreadFetcher(email)
-        self.message_fetcher = GmailMessageFetcher(email)
-        self.detail_fetcher = GmailMessageDetailsFetcher(email)
-        self.label_fetcher = GmailMessageLabelsFetcher(email)
+        self.thread_fetcher = GmailThreadFetcher(email, filters)
 
-    def transform_threads(self, file_path: str) -> None:
-    
-        # Read the input file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            threads_data = json.load(f)
+        # One hydrator shared by the fetchers, so each thread is downloaded once and unchanged threads never again
+        self.hydrator = GmailThreadHydrator(email, get_message_cache(), body_parts=('plain_text',))
+        self.message_fetcher = GmailMessageFetcher(email, self.hydrator)
+        self.detail_fetcher = GmailMessageDetailsFetcher(email, self.hydrator)
+        self.label_fetcher = GmailMessageLabelsFetcher(email, self.hydrator)
+
+        # Optional worker pool for thread fetching, the batched serial path is the default
+        self.parallel_fetcher = GmailParallelThreadFetcher(email, self.hydrator, parallel_workers) if parallel_workers else None
+
+    @staticmethod
+    def _header_timestamp_ms(date_header: str) -> Optional[int]:
+
+        # Fallback for messages without internalDate, a missing or malformed header gives no timestamp instead of failing the run
+        try:
+            return int(parsedate_to_datetime(date_header).timestamp() * 1000)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            print(f"Unparseable Date header: {date_header!r}")
+            return None
+
+    def _transform_threads(self, threads: List[List[Dict]]) -> List[Dict]:
+
+        threads = [thread for thread in threads if thread]  # Skip empty threads
+        if not threads:
+            return []
+
+        messages = [msg for thread in threads for msg in thread]
+
+        # Gmail's internalDate (epoch ms) is the canonical timestamp, the Date header is only a fallback
+        message_timestamps_ms = [
+            int(msg['internal_date']) if msg.get('internal_date') is not None else self._header_timestamp_ms(msg.get('timestamp'))
+            for msg in messages
+        ]
+        known = np.array([timestamp_ms is not None for timestamp_ms in message_timestamps_ms], dtype=bool)
+
+        # Messages without a usable timestamp sort first within their thread
+        timestamps_ms = np.fromiter(
+            (timestamp_ms if timestamp_ms is not None else 0 for timestamp_ms in message_timestamps_ms),
+            dtype=np.int64,
+            count=len(messages)
+        )
+        thread_index = np.repeat(np.arange(len(threads)), [len(thread) for thread in threads])
+
+        # Sort messages within each thread by timestamp, one stable sort for the whole mailbox
+        order = np.lexsort((timestamps_ms, thread_index))
+        thread_starts = np.searchsorted(thread_index[order], np.arange(len(threads)))
+        thread_ends = np.append(thread_starts[1:], len(order))
+
+        # Format every timestamp at once, then drop to plain Python values for the per-message dicts
+        datetimes = np.char.add(
+            np.char.replace(np.datetime_as_string(timestamps_ms.astype('datetime64[ms]'), unit='s'), 'T', ' '),
+            ' UTC'
+        ).tolist()
+        timestamps = (timestamps_ms / 1000.0).tolist()
+        order = order.tolist()
+
+        # Those keep their raw Date header, rather than being indexed as sent at the epoch
+        for i in np.flatnonzero(~known).tolist():
+            datetimes[i] = messages[i].get('timestamp') or ''
+            timestamps[i] = None
 
         transformed_threads = []
-        
-        for thread in threads_data:
-            if not thread:  # Skip empty threads
-                continue
-                
-            # Sort messages within thread by timestamp
-            messages_in_thread = sorted(
-                thread,
-                key=lambda x: parsedate_to_datetime(x['timestamp']).timestamp()
-            )
-            
+
+        for start, end in zip(thread_starts.tolist(), thread_ends.tolist()):
+            messages_in_thread = [messages[i] for i in order[start:end]]
+
             # Collect all unique labels from messages
             all_labels = set()
             for msg in messages_in_thread:
                 all_labels.update(msg.get('label', []))
-            
+
             formatted_messages = []
-            for msg in messages_in_thread:
-                # Parse the email's timestamp
-                dt = parsedate_to_datetime(msg['timestamp'])
-                dt = dt.astimezone(pytz.UTC)  # Convert to UTC
-                
+            for i, msg in zip(order[start:end], messages_in_thread):
                 formatted_msg = {
                     "message_id": msg['message_id'],
-                    "datetime": dt.strftime("%Y-%m-%d %H:%M:%S UTC"),
-                    "timestamp": dt.timestamp(),
+                    "datetime": datetimes[i],
+                    "timestamp": timestamps[i],
                     "sender": msg['from']['email'],
                     "receiver": msg['to']['email'],
                     "subject": msg['subject'],
@@ -68,77 +112,109 @@ class GmailDataExtractor:
                     "labels": msg.get('label', [])
                 }
                 formatted_messages.append(formatted_msg)
-            
-            thread_data = {
+
+            transformed_threads.append({
                 "thread_id": messages_in_thread[0]['thread_id'],  # Use first message's thread ID
                 "total_messages": len(messages_in_thread),
                 "labels": list(all_labels),
                 "reply_to_message_id": messages_in_thread[-1]['message_id'],  # Last message ID
-                "messages": formatted_messages,
-                "sort_timestamp": formatted_messages[-1]['timestamp']  # For sorting
-            }
-            
-            transformed_threads.append(thread_data)
+                "messages": formatted_messages
+            })
+
+        return transformed_threads
+
+    def _transform_thread(self, thread: List[Dict]) -> Optional[Dict]:
+
+        transformed_threads = self._transform_threads([thread])
+        return transformed_threads[0] if transformed_threads else None
+
+    def transform_threads(self, file_path: str) -> None:
+    
+        # Read the input file
+        with open(file_path, 'r', encoding='utf-8') as f:
+            threads_data = json.load(f)
+
+        transformed_threads = self._transform_threads(threads_data)
         
         # Sort threads by the timestamp of their last message (newest first)
-        transformed_threads.sort(
-            key=lambda x: x['sort_timestamp'],
-            reverse=True
-        )
-        
-        # Remove the temporary sort_timestamp field
-        for thread in transformed_threads:
-            del thread['sort_timestamp']
+        last_timestamps = np.array([thread['messages'][-1]['timestamp'] or 0 for thread in transformed_threads])
+        transformed_threads = [transformed_threads[i] for i in np.argsort(-last_timestamps, kind='stable')]
         
         # Save the transformed data back to the same file - now just as an array
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(transformed_threads, f, indent=2, ensure_ascii=False)
 
-    def fetch_email_threads_complete(self):
-        
-        email = self.email
-        gmail_thread_id_fetcher = self.thread_fetcher
-        gmail_message_id_fetcher = self.message_fetcher
-        gmail_message_detail_fetcher = self.detail_fetcher
-        gmail_message_label_fetcher = self.label_fetcher
+    def _extract_threads(self, thread_ids: List[str]) -> List[List[Dict]]:
 
-        thread_ids = gmail_thread_id_fetcher.fetch_all_thread_ids()
-        # thread_ids = thread_ids[:3] # For Development Environment
+        # Threads listed with the same history ID as their cached copy are served from disk
+        listed_history_ids = self.thread_fetcher.thread_history_ids
+        cached_threads = self.hydrator.hydrate_from_cache({
+            thread_id: listed_history_ids[thread_id] for thread_id in thread_ids if thread_id in listed_history_ids
+        })
+        print(f"Served {cached_threads} of {len(thread_ids)} threads from the message cache")
 
-        print(f"thread_ids: {thread_ids}")
+        # Hydrate every thread with a single threads.get(format='full') each, in batched calls or from the worker pool
+        thread_source = self.parallel_fetcher or self.message_fetcher
+        thread_message_ids = thread_source.fetch_message_ids_from_threads(thread_ids)
+        message_ids = [message_id for ids in thread_message_ids.values() for message_id in ids]
+
+        # Details and labels are views over the hydrated threads
+        message_details = self.detail_fetcher.fetch_message_details_batch(message_ids)
+        message_labels = self.label_fetcher.fetch_labels_from_messageids(message_ids)
 
         threads = []
 
         for thread_id in thread_ids:
 
-            try:
-                message_ids = gmail_message_id_fetcher.fetch_message_ids_from_thread(thread_id)
-                thread = []
-                
-                for message_id in message_ids:
-                    
-                    try:
-                        message = gmail_message_detail_fetcher.fetch_message_details(message_id)
+            if thread_id not in thread_message_ids:
+                continue
 
-                        _, label = gmail_message_label_fetcher.fetch_labels_from_messageid(message_id)
-                        message['label'] = label
+            thread = []
 
-                        if 'html_text' in message['body']:
-                            message['body'].pop('html_text')
+            for message_id in thread_message_ids[thread_id]:
 
-                        thread.append(message)
+                if message_id not in message_details or message_id not in message_labels:
+                    print(f"Skipping message ID {message_id}: details or labels unavailable")
+                    continue
 
-                    except Exception as e:
-                        
-                        print(f"Error processing message ID {message_id}: {e}")
-                        continue
-                
-                threads.append(thread)
+                message = message_details[message_id]
 
-            except Exception as e:
+                _, label = message_labels[message_id]
+                message['label'] = label
 
-                print(f"Error processing thread ID {thread_id}: {e}")
-                continue
+                if 'html_text' in message['body']:
+                    message['body'].pop('html_text')
+
+                thread.append(message)
+
+            threads.append(thread)
+
+        # The extracted threads now own the data, release the hydrated copies
+        self.hydrator.clear()
+
+        return threads
+
+    def fetch_transformed_threads(self, thread_ids: List[str]) -> List[Dict]:
+
+        return self._transform_threads(self._extract_threads(thread_ids))
+
+    def iter_email_threads(self, num_prev_days: Optional[int] = None) -> Iterator[Dict]:
+
+        # Stream transformed threads one listing page at a time, nothing is written to disk
+        for thread_ids in self.thread_fetcher.iter_thread_id_pages(num_prev_days):
+            yield from self.fetch_transformed_threads(thread_ids)
+
+    def fetch_email_threads_complete(self):
+        
+        email = self.email
+        gmail_thread_id_fetcher = self.thread_fetcher
+
+        thread_ids = gmail_thread_id_fetcher.fetch_all_thread_ids()
+        # thread_ids = thread_ids[:3] # For Development Environment
+
+        print(f"thread_ids: {thread_ids}")
+
+        threads = self._extract_threads(thread_ids)
 
         thread_file_path = f'{email}.json'
         
@@ -153,46 +229,12 @@ class GmailDataExtractor:
         
         email = self.email
         gmail_thread_id_fetcher = self.thread_fetcher
-        gmail_message_id_fetcher = self.message_fetcher
-        gmail_message_detail_fetcher = self.detail_fetcher
-        gmail_message_label_fetcher = self.label_fetcher
 
         thread_ids = gmail_thread_id_fetcher.fetch_thread_ids_by_prev_days(num_prev_days)
 
         print(f"thread_ids: {thread_ids}")
 
-        threads = []
-
-        for thread_id in thread_ids:
-
-            try:
-                message_ids = gmail_message_id_fetcher.fetch_message_ids_from_thread(thread_id)
-                thread = []
-                
-                for message_id in message_ids:
-                    
-                    try:
-                        message = gmail_message_detail_fetcher.fetch_message_details(message_id)
-
-                        _, label = gmail_message_label_fetcher.fetch_labels_from_messageid(message_id)
-                        message['label'] = label
-
-                        if 'html_text' in message['body']:
-                            message['body'].pop('html_text')
-
-                        thread.append(message)
-
-                    except Exception as e:
-                        
-                        print(f"Error processing message ID {message_id}: {e}")
-                        continue
-                
-                threads.append(thread)
-
-            except Exception as e:
-
-                print(f"Error processing thread ID {thread_id}: {e}")
-                continue
+        threads = self._extract_threads(thread_ids)
 
         thread_file_path = f'{email}.json'
         
@@ -0,0 +1,51 @@
+import sys
+import json
+import httplib2
+import threading
+from pathlib import Path
+from typing import Dict, Any, Callable, Optional
+
+# Google API imports
+from googleapiclient.discovery import build_from_document, fix_method_name
+from googleapiclient.discovery_cache import get_static_doc
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+GMAIL_API_NAME = 'gmail'
+GMAIL_API_VERSION = 'v1'
+
+_discovery_document: Optional[Dict[str, Any]] = None
+_discovery_lock = threading.Lock()
+
+def get_gmail_discovery_document() -> Dict[str, Any]:
+
+    global _discovery_document
+
+    # Read and parse the copy bundled with googleapiclient once, never over the network
+    with _discovery_lock:
+        if _discovery_document is None:
+            content = get_static_doc(GMAIL_API_NAME, GMAIL_API_VERSION)
+            if content is None:
+                raise RuntimeError(f"No bundled discovery document for {GMAIL_API_NAME} {GMAIL_API_VERSION}")
+            document = json.loads(content)
+
+            # Building a client fixes up the method descriptions in place, resource by resource as
+            # they are first used. Do all of it once here, so the dict is stable before it is shared
+            _instantiate_resources(build_from_document(document, http=httplib2.Http()), document)
+            _discovery_document = document
+        return _discovery_document
+
+def _instantiate_resources(resource, description: Dict[str, Any]) -> None:
+
+    for name, nested_description in description.get('resources', {}).items():
+        _instantiate_resources(getattr(resource, fix_method_name(name))(), nested_description)
+
+def build_gmail_service(http, request_builder: Optional[Callable[..., Any]] = None):
+
+    # build_from_document takes the parsed dict as is, so a new client skips the JSON parse
+    params = {'http': http}
+    if request_builder is not None:
+        params['requestBuilder'] = request_builder
+
+    return build_from_document(get_gmail_discovery_document(), **params)
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+from typing import List, Dict, Any
+from pydantic import BaseModel, Field
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Inbox tabs Gmail knows as category:<name>
+GMAIL_CATEGORIES = {'primary', 'social', 'promotions', 'updates', 'forums'}
+
+class GmailExtractionFilter(BaseModel):
+
+    # Label IDs a thread must carry, all of them (Gmail's labelIds semantics)
+    include_label_ids: List[str] = Field(default_factory=list)
+
+    # Label names whose threads are skipped, user labels and system labels alike
+    exclude_labels: List[str] = Field(default_factory=list)
+
+    # Inbox categories whose threads are skipped
+    exclude_categories: List[str] = Field(default_factory=list)
+
+    # Gmail leaves SPAM and TRASH out of listings unless asked to include them
+    include_spam_trash: bool = Field(default=False)
+
+    @staticmethod
+    def _label_term(label_name: str) -> str:
+
+        # Gmail search spells label names in lower case with dashes for spaces and slashes
+        return label_name.strip().lower().replace(' ', '-').replace('/', '-')
+
+    def to_query(self) -> str:
+
+        terms = [f"-label:{self._label_term(label)}" for label in self.exclude_labels]
+        terms.extend(
+            f"-category:{category.lower()}"
+            for category in self.exclude_categories
+            if category.lower() in GMAIL_CATEGORIES
+        )
+        return ' '.join(terms)
+
+    def to_list_params(self) -> Dict[str, Any]:
+
+        # Extra threads().list / messages().list parameters, so the filtering happens server side
+        params: Dict[str, Any] = {'includeSpamTrash': self.include_spam_trash}
+        if self.include_label_ids:
+            params['labelIds'] = list(self.include_label_ids)
+        return params
+
+# Onboarding and daily sync skip bulk mail unless told otherwise
+DEFAULT_EXTRACTION_FILTER = GmailExtractionFilter(exclude_categories=['promotions', 'social'])
+
+# Everything Gmail lists, the behaviour before filters existed and the fetchers' default
+UNFILTERED_EXTRACTION = GmailExtractionFilter()
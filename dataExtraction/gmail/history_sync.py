@@ -0,0 +1,216 @@
+import sys
+import asyncio
+import threading
+from pathlib import Path
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Set, Tuple, Any, Optional, AsyncIterator
+
+# Google API imports
+from googleapiclient.errors import HttpError
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Custom imports
+from aws.gmail_sync_checkpoints import GmailSyncCheckpointManager
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+
+# Messages we create ourselves (drafts, sent replies) must not feed back into the pipelines
+IGNORED_LABEL_IDS = {'DRAFT', 'SENT'}
+
+# A message that keeps failing is given up after this many runs
+MAX_MESSAGE_ATTEMPTS = 3
+
+# One lock per user and consumer, shared by the scheduler and the realtime monitor
+_consumer_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_consumer_locks_lock = threading.Lock()
+
+def _release_if_acquired(acquire: asyncio.Future, lock: threading.Lock) -> None:
+
+    if not acquire.cancelled() and acquire.exception() is None and acquire.result():
+        lock.release()
+
+@asynccontextmanager
+async def history_sync_lock(email: str, consumer: str) -> AsyncIterator[None]:
+
+    # A run holds it from reading the checkpoint to committing it, so two runs never process the same deltas.
+    # The callers live on different threads and event loops, hence a thread lock, acquired on a worker thread
+    with _consumer_locks_lock:
+        lock = _consumer_locks.setdefault((email, consumer), threading.Lock())
+
+    acquire = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # The worker thread still gets the lock eventually, hand it straight back
+        acquire.add_done_callback(lambda future: _release_if_acquired(future, lock))
+        raise
+
+    try:
+        yield
+    finally:
+        lock.release()
+
+class GmailHistorySync:
+
+    def __init__(self, email: str, consumer: str, fallback_mins: int = 180, max_fallback_messages: int = 100):
+
+        if not isinstance(fallback_mins, int) or fallback_mins <= 0:
+            raise ValueError("Fallback window in minutes must be a positive integer")
+
+        self.email = email
+        self.consumer = consumer
+        self.fallback_mins = fallback_mins
+        self.max_fallback_messages = max_fallback_messages
+        self.checkpoint_manager = GmailSyncCheckpointManager()
+        self._service = None
+        self._pending_history_id: Optional[str] = None
+        self._retry_progress: Dict[str, Dict[str, Any]] = {}
+        self._completed_steps: Dict[str, Set[str]] = {}
+        self._failed_message_ids: Set[str] = set()
+
+    def _authenticate(self) -> None:
+
+        # Shared, refresh-aware client from the process-wide session broker
+        self._service = get_gmail_session_broker().get_service(self.email)
+
+    def _current_history_id(self) -> str:
+
+        profile = self._service.users().getProfile(userId='me').execute()
+        return str(profile['historyId'])
+
+    def _relist_recent_message_ids(self) -> List[str]:
+
+        # Bounded full re-list, used when there is no usable checkpoint
+        cutoff_timestamp = int((datetime.now() - timedelta(minutes=self.fallback_mins)).timestamp())
+
+        message_ids = []
+        page_token = None
+
+        while len(message_ids) < self.max_fallback_messages:
+            results = self._service.users().messages().list(
+                userId='me',
+                pageToken=page_token,
+                q=f'after:{cutoff_timestamp} -in:drafts -in:sent',
+                maxResults=min(500, self.max_fallback_messages - len(message_ids))
+            ).execute()
+
+            message_ids.extend(message['id'] for message in results.get('messages', []))
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        return message_ids
+
+    def _list_history_message_ids(self, start_history_id: str) -> List[str]:
+
+        message_ids = {}
+        page_token = None
+
+        while True:
+            results = self._service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                pageToken=page_token
+            ).execute()
+
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added.get('message', {})
+                    if not message.get('id') or IGNORED_LABEL_IDS & set(message.get('labelIds', [])):
+                        continue
+                    message_ids[message['id']] = True
+
+            # The last page carries the history ID the mailbox is at now
+            self._pending_history_id = str(results.get('historyId', self._pending_history_id or start_history_id))
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        return list(message_ids)
+
+    def fetch_new_message_ids(self) -> List[str]:
+
+        try:
+            # Ensure authentication
+            if not self._service:
+                self._authenticate()
+
+            checkpoint = self.checkpoint_manager.get_checkpoint(self.email, self.consumer) or {}
+            start_history_id = checkpoint.get('history_id')
+
+            # Messages an earlier run failed on come first, ahead of the new ones
+            self._retry_progress = checkpoint.get('retry_message_ids', {})
+            self._completed_steps = {message_id: set(progress['steps']) for message_id, progress in self._retry_progress.items()}
+            retry_message_ids = list(self._retry_progress)
+
+            if start_history_id:
+                try:
+                    message_ids = self._list_history_message_ids(start_history_id)
+                    print(f"History sync for {self.email} ({self.consumer}): {len(message_ids)} new messages since {start_history_id}, {len(retry_message_ids)} to retry")
+                    return list(dict.fromkeys(retry_message_ids + message_ids))
+                except HttpError as e:
+                    # Gmail answers 404 once the start history ID is too old to be served
+                    if e.resp.status != 404:
+                        raise
+                    print(f"History checkpoint {start_history_id} expired for {self.email}, re-listing recent messages")
+            else:
+                # First run for this consumer: start from now, mail from before it was enabled is left alone
+                self._pending_history_id = self._current_history_id()
+                print(f"History sync for {self.email} ({self.consumer}): no checkpoint yet, starting at {self._pending_history_id}")
+                return []
+
+            # Take the new checkpoint before listing, so nothing that arrives meanwhile is skipped
+            self._pending_history_id = self._current_history_id()
+            message_ids = self._relist_recent_message_ids()
+            print(f"Re-list for {self.email} ({self.consumer}): {len(message_ids)} messages from the last {self.fallback_mins} minutes")
+            return list(dict.fromkeys(retry_message_ids + message_ids))
+
+        except HttpError as e:
+            error_details = {
+                'status_code': e.resp.status,
+                'reason': e.resp.reason,
+                'error_message': str(e)
+            }
+            print(f"Gmail API Error: {error_details}")
+            raise
+        except Exception as e:
+            print(f"Unexpected error during history sync: {e}")
+            raise
+
+    def completed_steps(self, message_id: str) -> Set[str]:
+
+        # Steps an earlier attempt already carried out for a retried message, e.g. a label or a draft
+        return set(self._completed_steps.get(message_id, set()))
+
+    def mark_step(self, message_id: str, step: str) -> None:
+
+        self._completed_steps.setdefault(message_id, set()).add(step)
+
+    def mark_failed(self, message_id: str) -> None:
+
+        # The checkpoint still advances, the message is carried over to the next run instead
+        self._failed_message_ids.add(message_id)
+
+    def commit(self) -> bool:
+
+        # Persist the checkpoint only once the caller has processed the returned messages
+        if not self._pending_history_id:
+            return False
+
+        retry_message_ids = {}
+        for message_id in self._failed_message_ids:
+            attempts = self._retry_progress.get(message_id, {}).get('attempts', 0) + 1
+            if attempts >= MAX_MESSAGE_ATTEMPTS:
+                print(f"Giving up on message {message_id} for {self.email} ({self.consumer}) after {attempts} attempts")
+                continue
+            retry_message_ids[message_id] = {
+                'attempts': attempts,
+                'steps': sorted(self._completed_steps.get(message_id, set()))
+            }
+
+        return self.checkpoint_manager.set_history_id(self.email, self.consumer, self._pending_history_id, retry_message_ids)
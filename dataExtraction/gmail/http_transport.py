@@ -0,0 +1,142 @@
+import sys
+import socket
+import threading
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from google_auth_httplib2 import AuthorizedHttp
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+class PooledHttp:
+
+    # Drop-in for httplib2.Http over a requests session: pooled keep-alive connections, safe to share across threads
+
+    def __init__(self, pool_maxsize: int = 32, timeout: float = 60):
+
+        self.timeout = timeout
+        self.follow_redirects = True
+        # Same set googleapiclient leaves on httplib2, 308 means "resume incomplete" to resumable uploads
+        self.redirect_codes = frozenset({300, 301, 302, 303, 307})
+
+        # google_auth_httplib2 reads this, there are no per-host connection objects to expose
+        self.connections: Dict[str, Any] = {}
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        # Gmail only compresses when asked, requests inflates the body transparently
+        self._session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def request(
+        self,
+        uri: str,
+        method: str = 'GET',
+        body: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        redirections: int = 5,
+        connection_type: Optional[Any] = None
+    ) -> Tuple[httplib2.Response, bytes]:
+
+        headers = dict(headers or {})
+
+        # Redirects are followed here rather than by requests, so only redirect_codes are and the rest reach the caller
+        while True:
+            response = self._send(uri, method, body, headers)
+            location = response.headers.get('location')
+
+            if not (self.follow_redirects and response.status_code in self.redirect_codes and location):
+                break
+
+            if redirections <= 0:
+                http_response, content = self._to_httplib2(response)
+                raise httplib2.RedirectLimit("Redirected more times than redirection_limit allows.", http_response, content)
+            redirections -= 1
+
+            location = urljoin(uri, location)
+
+            # The bearer token is only sent back to the host it was issued for
+            if urlsplit(location).netloc != urlsplit(uri).netloc:
+                headers = {key: value for key, value in headers.items() if key.lower() != 'authorization'}
+
+            # Same method rewriting as httplib2: a 303 is always fetched with GET, 307 keeps the request as is
+            if response.status_code == 303 or (response.status_code in (301, 302) and method == 'POST'):
+                method = 'GET'
+                body = None
+
+            uri = location
+
+        return self._to_httplib2(response)
+
+    def _send(self, uri: str, method: str, body: Optional[Any], headers: Dict[str, str]) -> requests.Response:
+
+        try:
+            return self._session.request(
+                method,
+                uri,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=False
+            )
+        # Raise what googleapiclient's retry loop expects from httplib2
+        except requests.exceptions.Timeout as e:
+            raise socket.timeout(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+
+    @staticmethod
+    def _to_httplib2(response: requests.Response) -> Tuple[httplib2.Response, bytes]:
+
+        content = response.content
+
+        # The body is already inflated, so the headers must describe it as such
+        info = {key.lower(): value for key, value in response.headers.items() if key.lower() != 'content-encoding'}
+        info['content-length'] = str(len(content))
+        info['status'] = str(response.status_code)
+
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+        return http_response, content
+
+    def add_certificate(self, key, cert, domain, password=None) -> None:
+
+        self._session.cert = (cert, key)
+
+    def close(self) -> None:
+
+        self._session.close()
+
+# The transport every Gmail client is built on, swappable for tests or another HTTP stack
+_transport_factory: Callable[[], Any] = PooledHttp
+_shared_transport = None
+_transport_lock = threading.Lock()
+
+def set_transport_factory(factory: Callable[[], Any]) -> None:
+
+    global _transport_factory, _shared_transport
+
+    with _transport_lock:
+        _transport_factory = factory
+        _shared_transport = None
+
+def get_shared_transport() -> Any:
+
+    global _shared_transport
+
+    # One pool for the process, the per-user AuthorizedHttp only adds the bearer token
+    with _transport_lock:
+        if _shared_transport is None:
+            _shared_transport = _transport_factory()
+        return _shared_transport
+
+def build_authorized_http(credentials) -> AuthorizedHttp:
+
+    return AuthorizedHttp(credentials, http=get_shared_transport())
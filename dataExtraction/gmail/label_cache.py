@@ -0,0 +1,72 @@
+import sys
+import time
+import threading
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+# Google API imports
+from googleapiclient.errors import HttpError
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+class GmailLabelCache:
+
+    def __init__(self, ttl_seconds: float = 3600, min_reload_interval: float = 60):
+
+        self.ttl_seconds = ttl_seconds
+        self.min_reload_interval = min_reload_interval
+
+        # Email -> (loaded at, label ID -> label name)
+        self._entries: Dict[str, Tuple[float, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, email: str, service) -> Dict[str, str]:
+
+        try:
+            results = service.users().labels().list(userId='me').execute()
+        except HttpError as e:
+            print(f"Gmail API error loading labels for {email}: {e}")
+            raise
+
+        label_names = {label['id']: label.get('name', 'Unknown') for label in results.get('labels', [])}
+
+        with self._lock:
+            self._entries[email] = (time.monotonic(), label_names)
+
+        return label_names
+
+    def get_label_names(self, email: str, service) -> Dict[str, str]:
+
+        with self._lock:
+            entry = self._entries.get(email)
+
+        if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+            return entry[1]
+
+        return self._load(email, service)
+
+    def resolve(self, email: str, service, label_ids: List[str]) -> List[str]:
+
+        label_names = self.get_label_names(email, service)
+
+        # A label created outside this process shows up as an unknown ID, reload once (rate limited)
+        if any(label_id not in label_names for label_id in label_ids):
+            with self._lock:
+                loaded_at = self._entries.get(email, (0, {}))[0]
+            if time.monotonic() - loaded_at >= self.min_reload_interval:
+                label_names = self._load(email, service)
+
+        return [label_names.get(label_id, 'Unknown') for label_id in label_ids]
+
+    def invalidate(self, email: str) -> None:
+
+        with self._lock:
+            self._entries.pop(email, None)
+
+# Process-wide cache shared by every fetcher and GmailAutomation
+_label_cache = GmailLabelCache()
+
+def get_label_cache() -> GmailLabelCache:
+
+    return _label_cache
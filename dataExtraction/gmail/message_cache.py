@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+DEFAULT_CACHE_PATH = os.getenv('GMAIL_MESSAGE_CACHE_PATH', 'cache/gmail_message_cache.sqlite3')
+
+# Eviction limits, applied by the daily maintenance run
+CACHE_MAX_AGE_DAYS = int(os.getenv('GMAIL_MESSAGE_CACHE_MAX_AGE_DAYS', '30'))
+CACHE_MAX_MESSAGES = int(os.getenv('GMAIL_MESSAGE_CACHE_MAX_MESSAGES', '200000'))
+
+MESSAGE_COLUMNS = 'email_id, message_id, thread_id, history_id, internal_date, label_ids, details, cached_at, body_parts'
+
+class GmailMessageCache:
+
+    # Holds decoded mail bodies unencrypted, so the file is readable by the service's own user only.
+    # SQLite creates the WAL and shared-memory files with the same permissions as the database
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH):
+
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        os.close(os.open(db_path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(db_path, 0o600)
+
+        # One connection shared by the fetcher threads, every access goes through the lock
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+
+        with self._lock, self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    email_id TEXT NOT NULL,
+                    message_id TEXT NOT NULL,
+                    thread_id TEXT NOT NULL,
+                    history_id TEXT,
+                    internal_date INTEGER,
+                    label_ids TEXT NOT NULL,
+                    details BLOB NOT NULL,
+                    cached_at INTEGER NOT NULL DEFAULT 0,
+                    body_parts TEXT NOT NULL DEFAULT '[]',
+                    PRIMARY KEY (email_id, message_id)
+                )
+            ''')
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS threads (
+                    email_id TEXT NOT NULL,
+                    thread_id TEXT NOT NULL,
+                    history_id TEXT NOT NULL,
+                    message_ids TEXT NOT NULL,
+                    cached_at INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (email_id, thread_id)
+                )
+            ''')
+
+            # Files created before eviction existed lack the column, their rows count as oldest
+            for table in ('messages', 'threads'):
+                columns = [row[1] for row in self._connection.execute(f'PRAGMA table_info({table})')]
+                if 'cached_at' not in columns:
+                    self._connection.execute(f'ALTER TABLE {table} ADD COLUMN cached_at INTEGER NOT NULL DEFAULT 0')
+
+            # Nor do they record which body parts were decoded, such rows serve no body
+            columns = [row[1] for row in self._connection.execute('PRAGMA table_info(messages)')]
+            if 'body_parts' not in columns:
+                self._connection.execute("ALTER TABLE messages ADD COLUMN body_parts TEXT NOT NULL DEFAULT '[]'")
+
+            self._connection.execute('CREATE INDEX IF NOT EXISTS messages_cached_at ON messages (cached_at)')
+
+    @staticmethod
+    def _pack(details: Dict[str, Any]) -> bytes:
+
+        # Bodies dominate the row size and compress well
+        return zlib.compress(json.dumps(details, ensure_ascii=False).encode('utf-8'))
+
+    @staticmethod
+    def _unpack(blob: bytes) -> Dict[str, Any]:
+
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+    @staticmethod
+    def _message_row(email_id: str, message: Dict[str, Any]) -> tuple:
+
+        internal_date = message.get('internal_date')
+        return (
+            email_id,
+            message['details']['message_id'],
+            message['details']['thread_id'],
+            message.get('history_id'),
+            int(internal_date) if internal_date is not None else None,
+            json.dumps(message.get('label_ids', [])),
+            GmailMessageCache._pack(message['details']),
+            int(time.time()),
+            json.dumps(sorted(message.get('body_parts', [])))
+        )
+
+    def get_messages(self, email_id: str, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+
+        if not message_ids:
+            return {}
+
+        cached_messages = {}
+
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                rows = self._connection.execute(
+                    f'''SELECT message_id, history_id, internal_date, label_ids, details, body_parts FROM messages
+                        WHERE email_id = ? AND message_id IN ({','.join('?' * len(chunk))})''',
+                    [email_id, *chunk]
+                ).fetchall()
+
+                for message_id, history_id, internal_date, label_ids, details, body_parts in rows:
+                    cached_messages[message_id] = {
+                        'details': self._unpack(details),
+                        'label_ids': json.loads(label_ids),
+                        'history_id': history_id,
+                        'internal_date': internal_date,
+                        'body_parts': json.loads(body_parts)
+                    }
+
+        return cached_messages
+
+    def get_message(self, email_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+
+        return self.get_messages(email_id, [message_id]).get(message_id)
+
+    def get_thread(self, email_id: str, thread_id: str, history_id: str) -> Optional[List[str]]:
+
+        # A thread is only reusable while Gmail still reports the history ID it was cached at
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT history_id, message_ids FROM threads WHERE email_id = ? AND thread_id = ?',
+                (email_id, thread_id)
+            ).fetchone()
+
+        if row is None or row[0] != str(history_id):
+            return None
+
+        return json.loads(row[1])
+
+    def put_message(self, email_id: str, message: Dict[str, Any]) -> None:
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                f'INSERT OR REPLACE INTO messages ({MESSAGE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                self._message_row(email_id, message)
+            )
+
+    def put_thread(self, email_id: str, thread_id: str, history_id: str, messages: List[Dict[str, Any]]) -> None:
+
+        message_ids = [message['details']['message_id'] for message in messages]
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f'INSERT OR REPLACE INTO messages ({MESSAGE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._message_row(email_id, message) for message in messages]
+            )
+            self._connection.execute(
+                'INSERT OR REPLACE INTO threads VALUES (?, ?, ?, ?, ?)',
+                (email_id, thread_id, str(history_id), json.dumps(message_ids), int(time.time()))
+            )
+
+    def delete_user(self, email_id: str) -> None:
+
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM messages WHERE email_id = ?', (email_id,))
+            self._connection.execute('DELETE FROM threads WHERE email_id = ?', (email_id,))
+
+    def get_email_ids(self) -> List[str]:
+
+        with self._lock:
+            return [row[0] for row in self._connection.execute('SELECT DISTINCT email_id FROM messages')]
+
+    def evict(self, max_age_days: int = CACHE_MAX_AGE_DAYS, max_messages: int = CACHE_MAX_MESSAGES) -> int:
+
+        # Drop entries not written for max_age_days, then the oldest ones beyond max_messages
+        cutoff = int(time.time()) - max_age_days * 24 * 60 * 60
+
+        with self._lock:
+            with self._connection:
+                evicted = self._connection.execute('DELETE FROM messages WHERE cached_at < ?', (cutoff,)).rowcount
+
+                excess = self._connection.execute('SELECT COUNT(*) FROM messages').fetchone()[0] - max_messages
+                if excess > 0:
+                    evicted += self._connection.execute(
+                        'DELETE FROM messages WHERE rowid IN (SELECT rowid FROM messages ORDER BY cached_at LIMIT ?)',
+                        (excess,)
+                    ).rowcount
+
+                # A thread missing any of its messages is refetched anyway, so its entry can go too
+                self._connection.execute(
+                    'DELETE FROM threads WHERE cached_at < MAX(?, (SELECT COALESCE(MIN(cached_at), 0) FROM messages))',
+                    (cutoff,)
+                )
+
+            # Hand the freed pages back to the file system
+            if evicted:
+                self._connection.execute('VACUUM')
+
+        return evicted
+
+# One cache file shared by every extractor running in this process
+_message_cache = None
+_message_cache_lock = threading.Lock()
+
+def get_message_cache() -> GmailMessageCache:
+
+    global _message_cache
+
+    with _message_cache_lock:
+        if _message_cache is None:
+            _message_cache = GmailMessageCache()
+        return _message_cache
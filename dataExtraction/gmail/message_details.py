@@ -1,112 +1,49 @@
 import json
 import sys
-import email
-import base64
 from pathlib import Path
-from typing import Dict, Any, Union
+from typing import List, Dict, Any, Union, Optional
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 # Custom imports
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from aws.utils import fetch_tokens
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+from dataExtraction.gmail.batch_requests import GmailBatchRequester
+from dataExtraction.gmail.thread_hydration import GmailThreadHydrator
+from dataExtraction.gmail.message_cache import get_message_cache
+
+# Partial-response masks, so Gmail only sends the fields the callers read
+MIME_PART_FIELDS = 'mimeType,filename,headers,body(data,size,attachmentId)'
+BODY_FIELDS = f'payload({MIME_PART_FIELDS},parts({MIME_PART_FIELDS},parts({MIME_PART_FIELDS},parts({MIME_PART_FIELDS}))))'
+ESSENTIALS_FIELDS = f'id,threadId,labelIds,historyId,internalDate,{BODY_FIELDS}'
+
+# Messages the response pipelines never act on
+SKIPPED_LABEL_IDS = {'SPAM', 'TRASH', 'DRAFT', 'SENT'}
 
 class GmailMessageDetailsFetcher:
     
-    def __init__(self, email: str):
+    def __init__(self, email: str, hydrator: Optional[GmailThreadHydrator] = None):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
+        self.hydrator = hydrator or GmailThreadHydrator(email, get_message_cache())
         self._service = None
-    
-    def _load_credentials(self) -> Dict[str, Any]:
-
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
+        self._batch_requester = None
     
     def _authenticate(self) -> None:
- 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
-        
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
-        
-        try:
-            # Load credentials
-            credentials_data = self._load_credentials()
-            
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
-            
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
-        except (ValueError, HttpError) as e:
-            print(f"Authentication error: {e}")
-            raise
-    
-    def _decode_body(self, payload: Dict[str, Any]) -> Dict[str, str]:
 
-        body_content = {
-            'plain_text': '',
-            'html_text': ''
-        }
-        
-        try:
-            # Handle multipart messages
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    if part['mimeType'] == 'text/plain':
-                        if 'data' in part['body']:
-                            body_content['plain_text'] = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                    elif part['mimeType'] == 'text/html':
-                        if 'data' in part['body']:
-                            body_content['html_text'] = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-            
-            # Handle single part messages
-            elif payload['mimeType'] in ['text/plain', 'text/html']:
-                if 'data' in payload['body']:
-                    decoded_data = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
-                    if payload['mimeType'] == 'text/plain':
-                        body_content['plain_text'] = decoded_data
-                    else:
-                        body_content['html_text'] = decoded_data
-            
-            return body_content
-        except Exception as e:
-            print(f"Error decoding message body: {e}")
-            return body_content
+        # Shared, refresh-aware client from the process-wide session broker
+        self._service = get_gmail_session_broker().get_service(self.email)
     
-    def _parse_email_header(self, header_value: str) -> Dict[str, str]:
+    def _get_batch_requester(self) -> GmailBatchRequester:
 
-        try:
-            name, email_addr = email.utils.parseaddr(header_value)
-            return {
-                'name': name or email_addr,
-                'email': email_addr
-            }
-        except Exception:
-            return {
-                'name': header_value,
-                'email': header_value
-            }
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
+
+        if not self._batch_requester:
+            self._batch_requester = GmailBatchRequester(self._service)
+        return self._batch_requester
     
     def fetch_message_details(self, message_id: str) -> Dict[str, Any]:
 
@@ -114,6 +51,11 @@ class GmailMessageDetailsFetcher:
         if not message_id or not isinstance(message_id, str):
             raise ValueError("Invalid message ID. Must be a non-empty string.")
         
+        # Serve the message from a hydrated thread when available
+        message_details = self.hydrator.get_message_details(message_id)
+        if message_details is not None:
+            return message_details
+        
         try:
             # Ensure authentication
             if not self._service:
@@ -126,24 +68,7 @@ class GmailMessageDetailsFetcher:
                 format='full'
             ).execute()
             
-            # Extract headers
-            headers = {header['name']: header['value'] for header in message.get('payload', {}).get('headers', [])}
-            
-            # Decode body
-            body_content = self._decode_body(message['payload'])
-            
-            # Prepare message details
-            message_details = {
-                'message_id': message_id,
-                'thread_id': message.get('threadId', ''),
-                'subject': headers.get('Subject', ''),
-                'from': self._parse_email_header(headers.get('From', '')),
-                'to': self._parse_email_header(headers.get('To', '')),
-                'timestamp': headers.get('Date', ''),
-                'body': body_content
-            }
-            
-            return message_details
+            return self.hydrator.cache_message(message)
         
         except HttpError as e:
             error_details = {
@@ -157,37 +82,73 @@ class GmailMessageDetailsFetcher:
             print(f"Unexpected error fetching message details: {e}")
             raise
 
+    def fetch_message_details_batch(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+
+        message_details = {}
+        missing_message_ids = []
+
+        # Serve hydrated messages directly, only the rest go to the network
+        for message_id in message_ids:
+            hydrated_details = self.hydrator.get_message_details(message_id)
+            if hydrated_details is not None:
+                message_details[message_id] = hydrated_details
+            else:
+                missing_message_ids.append(message_id)
+
+        if not missing_message_ids:
+            return message_details
+
+        # Fetch the remaining messages in batched calls, failed items are reported and left out
+        messages, errors = self._get_batch_requester().get_messages(missing_message_ids, format='full')
+
+        for message_id, error in errors.items():
+            print(f"Error fetching message ID {message_id}: {error}")
+
+        for message_id, message in messages.items():
+            try:
+                message_details[message_id] = self.hydrator.cache_message(message)
+            except Exception as e:
+                print(f"Error processing message ID {message_id}: {e}")
+
+        return message_details
+
     def fetch_message_details_condensed(self, message_id: str) -> Dict[str, Union[str, Dict[str, str]]]:
 
         # Validate input
         if not message_id or not isinstance(message_id, str):
             raise ValueError("Invalid message ID. Must be a non-empty string.")
         
+        # Serve the message from a hydrated thread when available
+        message_details = self.hydrator.get_message_details(message_id)
+        label_ids = self.hydrator.get_label_ids(message_id)
+        if message_details is not None and label_ids is not None:
+            return {
+                'subject': message_details['subject'],
+                'body': message_details['body'],
+                'label_ids': label_ids
+            }
+        
         try:
             # Ensure authentication
             if not self._service:
                 self._authenticate()
             
-            # Fetch the specific message
+            # Fetch the specific message, masked to the headers, labels and text parts
             message = self._service.users().messages().get(
                 userId='me', 
                 id=message_id, 
-                format='full'
+                format='full',
+                fields=ESSENTIALS_FIELDS
             ).execute()
             
-            # Extract headers
-            headers = {
-                header['name']: header['value'] 
-                for header in message.get('payload', {}).get('headers', [])
-            }
-            
-            # Decode body
-            body_content = self._decode_body(message['payload'])
+            # Parse headers and body, keeping the message on disk for later runs
+            message_details = self.hydrator.cache_message(message)
             
             # Return condensed message details
             return {
-                'subject': headers.get('Subject', ''),
-                'body': body_content
+                'subject': message_details['subject'],
+                'body': message_details['body'],
+                'label_ids': message.get('labelIds', [])
             }
         
         except HttpError as e:
@@ -208,35 +169,39 @@ class GmailMessageDetailsFetcher:
         if not message_id or not isinstance(message_id, str):
             raise ValueError("Invalid message ID. Must be a non-empty string.")
         
+        # Serve the message from a hydrated thread when available
+        message_details = self.hydrator.get_message_details(message_id)
+        label_ids = self.hydrator.get_label_ids(message_id)
+        if message_details is not None and label_ids is not None:
+            return {
+                'subject': message_details['subject'],
+                'body': message_details['body'],
+                'sender_email': message_details['from']['email'],
+                'label_ids': label_ids
+            }
+        
         try:
             # Ensure authentication
             if not self._service:
                 self._authenticate()
             
-            # Fetch the specific message
+            # Fetch the specific message, masked to the headers, labels and text parts
             message = self._service.users().messages().get(
                 userId='me', 
                 id=message_id, 
-                format='full'
+                format='full',
+                fields=ESSENTIALS_FIELDS
             ).execute()
             
-            # Extract headers
-            headers = {
-                header['name']: header['value'] 
-                for header in message.get('payload', {}).get('headers', [])
-            }
-            
-            # Parse sender's email
-            sender_info = self._parse_email_header(headers.get('From', ''))
-            
-            # Decode body
-            body_content = self._decode_body(message['payload'])
+            # Parse headers and body, keeping the message on disk for later runs
+            message_details = self.hydrator.cache_message(message)
             
             # Return essential message details
             return {
-                'subject': headers.get('Subject', ''),
-                'body': body_content,
-                'sender_email': sender_info['email']
+                'subject': message_details['subject'],
+                'body': message_details['body'],
+                'sender_email': message_details['from']['email'],
+                'label_ids': message.get('labelIds', [])
             }
         
         except HttpError as e:
@@ -1,12 +1,10 @@
 import json
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Optional
 from datetime import datetime, timedelta
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 import base64
@@ -15,55 +13,24 @@ from email.mime.multipart import MIMEMultipart
 
 # Custom imports
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from aws.utils import fetch_tokens
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+from dataExtraction.gmail.batch_requests import GmailBatchRequester
+from dataExtraction.gmail.thread_hydration import GmailThreadHydrator
+from dataExtraction.gmail.message_cache import get_message_cache
 
 class GmailMessageFetcher:
     
-    def __init__(self, email: str):
+    def __init__(self, email: str, hydrator: Optional[GmailThreadHydrator] = None):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
+        self.hydrator = hydrator or GmailThreadHydrator(email, get_message_cache())
         self._service = None
-    
-    def _load_credentials(self) -> Dict[str, Any]:
-
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
+        self._batch_requester = None
     
     def _authenticate(self) -> None:
 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
-        
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
-        
-        try:
-            # Load credentials
-            credentials_data = self._load_credentials()
-            
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
-            
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
-        except (ValueError, HttpError) as e:
-            print(f"Authentication error: {e}")
-            raise
+        # Shared, refresh-aware client from the process-wide session broker
+        self._service = get_gmail_session_broker().get_service(self.email)
     
     def fetch_message_ids_from_thread(self, thread_id: str) -> List[str]:
 
@@ -71,24 +38,20 @@ class GmailMessageFetcher:
         if not thread_id or not isinstance(thread_id, str):
             raise ValueError("Invalid thread ID. Must be a non-empty string.")
         
+        # Serve the thread from the hydrator when it was already fetched
+        message_ids = self.hydrator.get_message_ids(thread_id)
+        if message_ids is not None:
+            return message_ids
+        
         try:
             # Ensure authentication
             if not self._service:
                 self._authenticate()
             
-            # Fetch the specific thread
-            thread = self._service.users().threads().get(userId='me', id=thread_id).execute()
-            
-            # Process thread details
-            message_ids = []
-            
-            # Iterate through messages in the thread
-            for message in thread.get('messages', []):
-                message_id = message.get('id')
-                if message_id:
-                    message_ids.append(message_id)
+            # Fetch the full thread once, the hydrator keeps bodies, headers and labels for the other fetchers
+            thread = self._service.users().threads().get(userId='me', id=thread_id, format='full').execute()
             
-            return message_ids
+            return self.hydrator.hydrate(thread)
         
         except HttpError as e:
             error_details = {
@@ -102,6 +65,38 @@ class GmailMessageFetcher:
             print(f"Unexpected error fetching thread messages: {e}")
             raise
 
+    def _get_batch_requester(self) -> GmailBatchRequester:
+
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
+
+        if not self._batch_requester:
+            self._batch_requester = GmailBatchRequester(self._service)
+        return self._batch_requester
+
+    def fetch_message_ids_from_threads(self, thread_ids: List[str]) -> Dict[str, List[str]]:
+
+        # Only fetch the threads the hydrator does not know yet
+        missing_thread_ids = [thread_id for thread_id in thread_ids if self.hydrator.get_message_ids(thread_id) is None]
+
+        if missing_thread_ids:
+            threads, errors = self._get_batch_requester().get_threads(missing_thread_ids, format='full')
+
+            for thread_id, error in errors.items():
+                print(f"Error fetching thread ID {thread_id}: {error}")
+
+            for thread in threads.values():
+                self.hydrator.hydrate(thread)
+
+        thread_message_ids = {}
+        for thread_id in thread_ids:
+            message_ids = self.hydrator.get_message_ids(thread_id)
+            if message_ids is not None:
+                thread_message_ids[thread_id] = message_ids
+
+        return thread_message_ids
+
     def fetch_message_ids_by_prev_mins(self, num_prev_mins: int = 3) -> List[str]:
 
         # Validate input
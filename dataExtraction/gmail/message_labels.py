@@ -1,64 +1,32 @@
 import json
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Tuple, Optional
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 # Custom imports
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from aws.utils import fetch_tokens
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+from dataExtraction.gmail.batch_requests import GmailBatchRequester
+from dataExtraction.gmail.thread_hydration import GmailThreadHydrator
+from dataExtraction.gmail.message_cache import get_message_cache
+from dataExtraction.gmail.label_cache import get_label_cache
 
 class GmailMessageLabelsFetcher:
     
-    def __init__(self, email: str):
+    def __init__(self, email: str, hydrator: Optional[GmailThreadHydrator] = None):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
+        self.hydrator = hydrator or GmailThreadHydrator(email, get_message_cache())
         self._service = None
-    
-    def _load_credentials(self) -> Dict[str, Any]:
-
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
+        self._batch_requester = None
     
     def _authenticate(self) -> None:
 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
-        
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
-        
-        try:
-            # Load credentials
-            credentials_data = self._load_credentials()
-            
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
-            
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
-        except (ValueError, HttpError) as e:
-            print(f"Authentication error: {e}")
-            raise
+        # Shared, refresh-aware client from the process-wide session broker
+        self._service = get_gmail_session_broker().get_service(self.email)
     
     def fetch_labels_from_messageid(self, message_id: str) -> List[str]:
 
@@ -71,20 +39,15 @@ class GmailMessageLabelsFetcher:
             if not self._service:
                 self._authenticate()
 
-            # Fetch the specific message with full details
-            message = self._service.users().messages().get(userId='me', id=message_id, format='full').execute()
+            # Use the labels of a hydrated thread, otherwise fetch them ('minimal' carries labelIds)
+            labels_list = self.hydrator.get_label_ids(message_id)
+            if labels_list is None:
+                message = self._service.users().messages().get(userId='me', id=message_id, format='minimal').execute()
+                labels_list = message.get('labelIds', [])
             
-            # Extract and return all available labels
-            labels_list = message.get('labelIds', [])
-            
-            label_ids = []
-            label_names = []
-
-            for label_id in labels_list:
-                label_info = self._service.users().labels().get(userId='me', id=label_id).execute()
-
-                label_ids.append(label_id)
-                label_names.append(label_info.get('name', 'Unknown'))
+            # Label names come from the per-user label dictionary, not one labels.get per ID
+            label_ids = list(labels_list)
+            label_names = get_label_cache().resolve(self.email, self._service, label_ids)
             
             return label_ids, label_names
         
@@ -99,3 +62,47 @@ class GmailMessageLabelsFetcher:
         except Exception as e:
             print(f"Unexpected error fetching thread messages: {e}")
             raise
+
+    def _get_batch_requester(self) -> GmailBatchRequester:
+
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
+
+        if not self._batch_requester:
+            self._batch_requester = GmailBatchRequester(self._service)
+        return self._batch_requester
+
+    def fetch_labels_from_messageids(self, message_ids: List[str]) -> Dict[str, Tuple[List[str], List[str]]]:
+
+        batch_requester = self._get_batch_requester()
+
+        # Label IDs of hydrated threads are already known
+        message_label_ids = {}
+        missing_message_ids = []
+        for message_id in message_ids:
+            label_ids = self.hydrator.get_label_ids(message_id)
+            if label_ids is not None:
+                message_label_ids[message_id] = label_ids
+            else:
+                missing_message_ids.append(message_id)
+
+        if missing_message_ids:
+            # labelIds are part of the 'minimal' format, no need to download the payload
+            messages, errors = batch_requester.get_messages(missing_message_ids, format='minimal')
+
+            for message_id, error in errors.items():
+                print(f"Error fetching labels for message ID {message_id}: {error}")
+
+            for message_id, message in messages.items():
+                message_label_ids[message_id] = message.get('labelIds', [])
+
+        # Resolve names from the per-user label dictionary
+        label_cache = get_label_cache()
+
+        labels = {}
+        for message_id, label_ids in message_label_ids.items():
+            label_names = label_cache.resolve(self.email, self._service, label_ids)
+            labels[message_id] = (label_ids, label_names)
+
+        return labels
@@ -0,0 +1,116 @@
+import re
+import sys
+import html
+import base64
+from pathlib import Path
+from typing import Dict, Any, Iterator, Iterable, Optional
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Body keys handed out by the decoder, mapped to the MIME type they come from
+BODY_PART_TYPES = {
+    'plain_text': 'text/plain',
+    'html_text': 'text/html'
+}
+
+# Text parts above this size are attachments in all but name, they are never decoded
+MAX_TEXT_PART_BYTES = 512 * 1024
+
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_LINE_BREAK_RE = re.compile(r'<\s*(?:br|/p|/div|/tr|/li|/h[1-6])\b[^>]*>', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACES_RE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+
+def iter_mime_parts(payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+
+    # Depth-first over the MIME tree with an explicit stack, leaf parts come out in document order
+    stack = [payload]
+
+    while stack:
+        part = stack.pop()
+        children = part.get('parts')
+
+        if children:
+            stack.extend(reversed(children))
+        else:
+            yield part
+
+def _is_attachment(part: Dict[str, Any], max_part_bytes: int) -> bool:
+
+    if part.get('filename'):
+        return True
+
+    body = part.get('body', {})
+    if 'attachmentId' in body:
+        return True
+
+    return body.get('size', 0) > max_part_bytes
+
+def _part_charset(part: Dict[str, Any]) -> str:
+
+    for header in part.get('headers', []):
+        if header.get('name', '').lower() == 'content-type':
+            match = re.search(r'charset="?([\w.:-]+)"?', header.get('value', ''), re.IGNORECASE)
+            if match:
+                return match.group(1)
+
+    return 'utf-8'
+
+def decode_part_data(part: Dict[str, Any]) -> str:
+
+    data = part.get('body', {}).get('data')
+    if not data:
+        return ''
+
+    # Gmail sends unpadded base64url at times
+    raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+    try:
+        return raw.decode(_part_charset(part), errors='replace')
+    except LookupError:
+        return raw.decode('utf-8', errors='replace')
+
+def html_to_text(html_text: str) -> str:
+
+    # Regex pass instead of a full parser, good enough for indexing and keyword checks
+    text = _SCRIPT_STYLE_RE.sub('', html_text)
+    text = _LINE_BREAK_RE.sub('\n', text)
+    text = _TAG_RE.sub('', text)
+    text = html.unescape(text)
+    text = _SPACES_RE.sub(' ', text)
+    text = _BLANK_LINES_RE.sub('\n\n', text)
+
+    return text.strip()
+
+def decode_body(
+    payload: Dict[str, Any],
+    body_parts: Iterable[str] = ('plain_text', 'html_text'),
+    max_part_bytes: int = MAX_TEXT_PART_BYTES
+) -> Dict[str, str]:
+
+    body_content = {key: '' for key in BODY_PART_TYPES}
+    requested = set(body_parts)
+
+    # First non-attachment part of each type, nothing is decoded while walking
+    found: Dict[str, Optional[Dict[str, Any]]] = {key: None for key in BODY_PART_TYPES}
+
+    for part in iter_mime_parts(payload):
+        for key, mime_type in BODY_PART_TYPES.items():
+            if found[key] is None and part.get('mimeType') == mime_type and not _is_attachment(part, max_part_bytes):
+                found[key] = part
+
+        if all(found[key] is not None for key in requested):
+            break
+
+    for key in requested:
+        if found.get(key) is not None:
+            body_content[key] = decode_part_data(found[key])
+
+    # HTML-only messages still get a plain text body
+    if 'plain_text' in requested and not body_content['plain_text'] and found['html_text'] is not None:
+        html_content = body_content['html_text'] or decode_part_data(found['html_text'])
+        body_content['plain_text'] = html_to_text(html_content)
+
+    return body_content
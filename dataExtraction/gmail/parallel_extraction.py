@@ -0,0 +1,116 @@
+import sys
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# Google API imports
+from googleapiclient.errors import HttpError
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Custom imports
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+from dataExtraction.gmail.thread_hydration import GmailThreadHydrator
+from dataExtraction.gmail.message_cache import get_message_cache
+from dataExtraction.gmail.rate_limiter import is_rate_limit_error
+from rate_limiting import AdaptiveConcurrencyLimiter
+
+class GmailParallelThreadFetcher:
+
+    def __init__(
+        self,
+        email: str,
+        hydrator: Optional[GmailThreadHydrator] = None,
+        max_workers: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 1.0
+    ):
+
+        if not isinstance(max_workers, int) or max_workers <= 0:
+            raise ValueError("Number of workers must be a positive integer")
+
+        self.email = email
+        self.hydrator = hydrator or GmailThreadHydrator(email, get_message_cache())
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(max_workers)
+
+        self._session = None
+        self._hydrator_lock = threading.Lock()
+
+    def _authenticate(self) -> None:
+
+        # Shared, refresh-aware credentials from the process-wide session broker
+        self._session = get_gmail_session_broker().get_session(self.email)
+
+    def _fetch_thread(self, thread_id: str) -> Dict[str, Any]:
+
+        attempt = 0
+
+        while True:
+            self.concurrency_limiter.acquire()
+            try:
+                # The request charges the user's quota budget before it is sent
+                thread = self._session.service.users().threads().get(
+                    userId='me',
+                    id=thread_id,
+                    format='full'
+                ).execute()
+                self.concurrency_limiter.on_success()
+                return thread
+
+            except HttpError as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self.concurrency_limiter.on_rate_limited()
+
+            finally:
+                self.concurrency_limiter.release()
+
+            # Back off outside the worker slot, the shrunken limit keeps the others waiting
+            attempt += 1
+            delay = self.base_delay * (2 ** (attempt - 1)) + random.uniform(0, self.base_delay)
+            print(f"Rate limited fetching thread ID {thread_id}, retrying in {delay:.1f}s (limit {self.concurrency_limiter.limit} workers)")
+            time.sleep(delay)
+
+    def _hydrate_thread(self, thread_id: str) -> None:
+
+        try:
+            thread = self._fetch_thread(thread_id)
+        except Exception as e:
+            print(f"Error fetching thread ID {thread_id}: {e}")
+            return
+
+        with self._hydrator_lock:
+            self.hydrator.hydrate(thread)
+
+    def fetch_message_ids_from_threads(self, thread_ids: List[str]) -> Dict[str, List[str]]:
+
+        # Ensure authentication
+        if not self._session:
+            self._authenticate()
+
+        # Only fetch the threads the hydrator does not know yet
+        missing_thread_ids = [thread_id for thread_id in dict.fromkeys(thread_ids) if self.hydrator.get_message_ids(thread_id) is None]
+
+        # Workers run in a copy of the caller's context, so their calls are booked to the caller's quota job
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self._hydrate_thread, thread_id) for thread_id in missing_thread_ids]
+            for future in futures:
+                future.result()
+
+        # Same shape and order as the serial path
+        thread_message_ids = {}
+        for thread_id in thread_ids:
+            message_ids = self.hydrator.get_message_ids(thread_id)
+            if message_ids is not None:
+                thread_message_ids[thread_id] = message_ids
+
+        return thread_message_ids
@@ -0,0 +1,143 @@
+import sys
+import asyncio
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import Dict, Any, Callable, Iterator, Optional
+
+# Google API imports
+from googleapiclient.http import HttpRequest
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Custom imports
+from dataExtraction.gmail.rate_limiter import GMAIL_QUOTA_UNITS, get_user_token_bucket
+
+# Charged for a method missing from the cost table, the common cost of a Gmail read
+DEFAULT_QUOTA_UNITS = 5
+
+UNATTRIBUTED_JOB = 'unattributed'
+
+# Job the current call is made for, set per task or thread with quota_job()
+_current_job = contextvars.ContextVar('gmail_quota_job', default=UNATTRIBUTED_JOB)
+
+@contextmanager
+def quota_job(job_name: str) -> Iterator[None]:
+
+    token = _current_job.set(job_name)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+def current_quota_job() -> str:
+
+    return _current_job.get()
+
+class GmailQuotaLedger:
+
+    def __init__(self):
+
+        # (email, job) -> method ID -> [calls, units]
+        self._usage = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        self._lock = threading.Lock()
+
+    def record(self, email: str, job_name: str, method_id: str, units: int) -> None:
+
+        with self._lock:
+            counters = self._usage[(email, job_name)][method_id]
+            counters[0] += 1
+            counters[1] += units
+
+    @staticmethod
+    def _report(usage: Dict, email: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+
+        # email -> job -> totals and per-method breakdown
+        report = {}
+
+        for (user_email, job_name), methods in usage.items():
+            if email is not None and user_email != email:
+                continue
+
+            report.setdefault(user_email, {})[job_name] = {
+                'calls': sum(calls for calls, _ in methods.values()),
+                'units': sum(units for _, units in methods.values()),
+                'methods': {method_id: {'calls': calls, 'units': units} for method_id, (calls, units) in methods.items()}
+            }
+
+        return report
+
+    def usage(self, email: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+
+        with self._lock:
+            return self._report(self._usage, email)
+
+    def reset(self) -> None:
+
+        with self._lock:
+            self._usage.clear()
+
+    def drain(self) -> Dict[str, Dict[str, Any]]:
+
+        # Usage since the previous drain, read and cleared under one lock so no call falls between the two
+        with self._lock:
+            report = self._report(self._usage)
+            self._usage.clear()
+
+        return report
+
+# One ledger for the process, every broker-built client reports into it
+_quota_ledger = GmailQuotaLedger()
+
+def get_quota_ledger() -> GmailQuotaLedger:
+
+    return _quota_ledger
+
+def charge(email: str, method_id: Optional[str]) -> int:
+
+    # Wait for the user's budget, then book the units against the user and the current job
+    method_id = method_id or 'unknown'
+    units = GMAIL_QUOTA_UNITS.get(method_id, DEFAULT_QUOTA_UNITS)
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        get_user_token_bucket(email).acquire(units)
+    else:
+        # Sleeping here would stall every coroutine on the loop, the units are owed instead and the user's worker threads wait them off
+        get_user_token_bucket(email).debit(units)
+
+    _quota_ledger.record(email, current_quota_job(), method_id, units)
+
+    return units
+
+class QuotaAccountedHttpRequest(HttpRequest):
+
+    # Set by the request builder, None for requests that are not tied to a user
+    quota_email: Optional[str] = None
+
+    def execute(self, http=None, num_retries=0):
+
+        if self.quota_email:
+            charge(self.quota_email, self.methodId)
+
+        return super().execute(http=http, num_retries=num_retries)
+
+def charge_request(request: HttpRequest) -> None:
+
+    # For calls that bypass execute(), e.g. requests sent inside a batch
+    if isinstance(request, QuotaAccountedHttpRequest) and request.quota_email:
+        charge(request.quota_email, request.methodId)
+
+def build_quota_request_builder(email: str) -> Callable[..., QuotaAccountedHttpRequest]:
+
+    # Passed to googleapiclient's build() as requestBuilder, so every request knows its user
+    def request_builder(*args, **kwargs) -> QuotaAccountedHttpRequest:
+        request = QuotaAccountedHttpRequest(*args, **kwargs)
+        request.quota_email = email
+        return request
+
+    return request_builder
@@ -0,0 +1,52 @@
+import sys
+import threading
+from pathlib import Path
+
+# Google API imports
+from googleapiclient.errors import HttpError
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Custom imports
+from rate_limiting import TokenBucket
+
+# Gmail per-user rate limit, in quota units per second
+GMAIL_USER_QUOTA_UNITS_PER_SECOND = 250
+
+# Quota units charged by Gmail for each method we call
+GMAIL_QUOTA_UNITS = {
+    'gmail.users.getProfile': 1,
+    'gmail.users.drafts.create': 10,
+    'gmail.users.history.list': 2,
+    'gmail.users.labels.create': 5,
+    'gmail.users.labels.get': 1,
+    'gmail.users.labels.list': 1,
+    'gmail.users.messages.get': 5,
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.modify': 5,
+    'gmail.users.messages.send': 100,
+    'gmail.users.threads.get': 10,
+    'gmail.users.threads.list': 10,
+}
+
+def is_rate_limit_error(error: Exception) -> bool:
+
+    if not isinstance(error, HttpError):
+        return False
+
+    if error.resp.status == 429:
+        return True
+
+    return error.resp.status == 403 and 'ateLimitExceeded' in str(error)
+
+# One bucket per user, shared by every extractor running in this process
+_user_buckets = {}
+_user_buckets_lock = threading.Lock()
+
+def get_user_token_bucket(email: str) -> TokenBucket:
+
+    with _user_buckets_lock:
+        if email not in _user_buckets:
+            _user_buckets[email] = TokenBucket(GMAIL_USER_QUOTA_UNITS_PER_SECOND)
+        return _user_buckets[email]
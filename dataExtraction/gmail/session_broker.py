@@ -0,0 +1,187 @@
+import json
+import sys
+import time
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+# Google API imports
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials as OAuthCredentials
+from googleapiclient.errors import HttpError
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from aws.utils import fetch_tokens
+from dataExtraction.gmail.quota_accounting import build_quota_request_builder
+from dataExtraction.gmail.http_transport import build_authorized_http
+from dataExtraction.gmail.discovery import build_gmail_service
+
+class GmailSession:
+
+    def __init__(self, email: str, credentials: OAuthCredentials, service):
+
+        self.email = email
+        self.credentials = credentials
+        self.service = service
+        self.last_used = time.monotonic()
+
+class GmailSessionBroker:
+
+    def __init__(self, max_sessions: int = 100, idle_timeout: float = 1800):
+
+        if max_sessions <= 0:
+            raise ValueError("Maximum number of sessions must be a positive integer")
+
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+
+        self._client_config = None
+        self._sessions: "OrderedDict[str, GmailSession]" = OrderedDict()
+        self._lock = threading.RLock()
+
+        # Building a session reads DynamoDB and may refresh a token, so it only holds its user's lock
+        self._email_locks: Dict[str, threading.Lock] = {}
+
+    def _load_client_config(self) -> Dict[str, Any]:
+
+        # The OAuth client configuration is the same for every user, read it once
+        if self._client_config is None:
+            try:
+                credentials_path = Path("credentials/credential_gcp.json")
+                with credentials_path.open() as f:
+                    self._client_config = json.load(f)['web']
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
+            except json.JSONDecodeError:
+                raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
+
+        return self._client_config
+
+    def _create_session(self, email: str, tokens: Optional[Dict[str, Any]]) -> GmailSession:
+
+        # Fetch tokens from DynamoDB unless the caller already has them
+        if not tokens:
+            tokens = fetch_tokens(email)
+
+        if not tokens:
+            raise ValueError(f"No authentication tokens found for {email}")
+
+        try:
+            client_config = self._load_client_config()
+
+            credentials = OAuthCredentials(
+                token=tokens['access_token'],
+                refresh_token=tokens['refresh_token'],
+                client_id=client_config['client_id'],
+                client_secret=client_config['client_secret'],
+                token_uri=client_config['token_uri']
+            )
+
+            # Thread-safe pooled transport, and every request is charged against the user's quota budget
+            service = build_gmail_service(
+                build_authorized_http(credentials),
+                build_quota_request_builder(email)
+            )
+
+        except (ValueError, HttpError) as e:
+            print(f"Authentication error: {e}")
+            raise
+
+        return GmailSession(email, credentials, service)
+
+    def _ensure_fresh(self, session: GmailSession) -> None:
+
+        # Refresh ahead of the request when the access token is known to be expired
+        credentials = session.credentials
+        if credentials.valid or not credentials.refresh_token:
+            return
+
+        credentials.refresh(Request())
+
+    def _evict_idle_sessions(self) -> None:
+
+        now = time.monotonic()
+        idle_emails = [
+            email for email, session in self._sessions.items()
+            if now - session.last_used > self.idle_timeout
+        ]
+
+        for email in idle_emails:
+            del self._sessions[email]
+
+        # Locks of users without a session go too, unless a build is holding one right now
+        for email in [email for email, lock in self._email_locks.items() if email not in self._sessions and not lock.locked()]:
+            del self._email_locks[email]
+
+    def _email_lock(self, email: str) -> threading.Lock:
+
+        with self._lock:
+            return self._email_locks.setdefault(email, threading.Lock())
+
+    def _store(self, email: str, session: GmailSession) -> None:
+
+        # Enforce the cap by dropping the least recently used sessions
+        if email not in self._sessions:
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        self._sessions[email] = session
+        self._sessions.move_to_end(email)
+        session.last_used = time.monotonic()
+
+    def get_session(self, email: str, tokens: Optional[Dict[str, Any]] = None) -> GmailSession:
+
+        with self._email_lock(email):
+            with self._lock:
+                self._evict_idle_sessions()
+
+                session = self._sessions.get(email)
+
+                # Tokens handed in by the caller replace a session built from a different refresh token
+                if session and tokens and tokens.get('refresh_token') != session.credentials.refresh_token:
+                    session = None
+
+            # Other users' lookups carry on while this one is built
+            if session is None:
+                session = self._create_session(email, tokens)
+
+            with self._lock:
+                self._store(email, session)
+
+            try:
+                self._ensure_fresh(session)
+            except RefreshError as e:
+                # The tokens may have been rotated since, rebuild the session once from DynamoDB
+                print(f"Token refresh failed for {email}, reloading tokens: {e}")
+                session = self._create_session(email, None)
+                with self._lock:
+                    self._store(email, session)
+                self._ensure_fresh(session)
+
+        return session
+
+    def get_service(self, email: str, tokens: Optional[Dict[str, Any]] = None):
+
+        return self.get_session(email, tokens).service
+
+    def evict(self, email: str) -> None:
+
+        with self._lock:
+            self._sessions.pop(email, None)
+
+    def active_sessions(self) -> int:
+
+        with self._lock:
+            self._evict_idle_sessions()
+            return len(self._sessions)
+
+# Process-wide broker shared by the fetchers and GmailAutomation
+_session_broker = GmailSessionBroker()
+
+def get_gmail_session_broker() -> GmailSessionBroker:
+
+    return _session_broker
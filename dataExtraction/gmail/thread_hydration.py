@@ -0,0 +1,211 @@
+import sys
+import email
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+
+# Add the root directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+# Custom imports
+from dataExtraction.gmail.mime_decoding import decode_body as decode_mime_body
+from dataExtraction.gmail.message_cache import GmailMessageCache
+
+class GmailThreadHydrator:
+
+    def __init__(self, email: Optional[str] = None, cache: Optional[GmailMessageCache] = None, body_parts: Iterable[str] = ('plain_text', 'html_text')):
+
+        # Thread ID -> ordered message IDs, message ID -> hydrated message
+        self._threads: Dict[str, List[str]] = {}
+        self._messages: Dict[str, Dict[str, Any]] = {}
+
+        # The on-disk cache is keyed per user, so it is only used when the user is known
+        self.email = email
+        self._cache = cache if email else None
+
+        # Body parts worth decoding for this consumer, bulk extraction never reads the HTML
+        self.body_parts = tuple(body_parts)
+
+    @staticmethod
+    def decode_body(payload: Dict[str, Any], body_parts: Iterable[str] = ('plain_text', 'html_text')) -> Dict[str, str]:
+
+        try:
+            # Walks nested multiparts and decodes only the requested parts
+            return decode_mime_body(payload, body_parts)
+        except Exception as e:
+            print(f"Error decoding message body: {e}")
+            return {
+                'plain_text': '',
+                'html_text': ''
+            }
+
+    @staticmethod
+    def parse_email_header(header_value: str) -> Dict[str, str]:
+
+        try:
+            name, email_addr = email.utils.parseaddr(header_value)
+            return {
+                'name': name or email_addr,
+                'email': email_addr
+            }
+        except Exception:
+            return {
+                'name': header_value,
+                'email': header_value
+            }
+
+    @classmethod
+    def build_message_details(cls, message: Dict[str, Any], body_parts: Iterable[str] = ('plain_text', 'html_text')) -> Dict[str, Any]:
+
+        # Extract headers
+        headers = {header['name']: header['value'] for header in message.get('payload', {}).get('headers', [])}
+
+        # Decode body
+        body_content = cls.decode_body(message['payload'], body_parts)
+
+        # Prepare message details
+        return {
+            'message_id': message['id'],
+            'thread_id': message.get('threadId', ''),
+            'subject': headers.get('Subject', ''),
+            'from': cls.parse_email_header(headers.get('From', '')),
+            'to': cls.parse_email_header(headers.get('To', '')),
+            'timestamp': headers.get('Date', ''),
+            'internal_date': int(message['internalDate']) if message.get('internalDate') else None,
+            'body': body_content
+        }
+
+    def hydrate(self, thread: Dict[str, Any]) -> List[str]:
+
+        # Build every message of a threads().get(format='full') response, keeping only the parsed fields
+        message_ids = []
+        cache_entries = []
+
+        for message in thread.get('messages', []):
+            message_id = message.get('id')
+            if not message_id:
+                continue
+
+            try:
+                hydrated_message = self.build_message_details(message, self.body_parts)
+            except Exception as e:
+                print(f"Error hydrating message ID {message_id}: {e}")
+                continue
+
+            cache_entries.append(self._cache_entry(message, hydrated_message))
+
+            hydrated_message['label_ids'] = message.get('labelIds', [])
+            self._messages[message_id] = hydrated_message
+            message_ids.append(message_id)
+
+        self._threads[thread['id']] = message_ids
+
+        # Only complete threads are cached, the history ID is what later runs validate against
+        if self._cache and thread.get('historyId') and len(cache_entries) == len(thread.get('messages', [])):
+            try:
+                self._cache.put_thread(self.email, thread['id'], thread['historyId'], cache_entries)
+            except Exception as e:
+                print(f"Error caching thread ID {thread['id']}: {e}")
+
+        return message_ids
+
+    def _cache_entry(self, message: Dict[str, Any], message_details: Dict[str, Any]) -> Dict[str, Any]:
+
+        return {
+            'details': dict(message_details),
+            'label_ids': message.get('labelIds', []),
+            'history_id': message.get('historyId'),
+            'internal_date': message.get('internalDate'),
+            'body_parts': list(self.body_parts)
+        }
+
+    def _covers_body_parts(self, cached_message: Dict[str, Any]) -> bool:
+
+        # An entry written by a consumer that skipped a part this one reads holds it empty, not missing
+        return set(self.body_parts) <= set(cached_message.get('body_parts', []))
+
+    def hydrate_from_cache(self, thread_history_ids: Dict[str, str]) -> int:
+
+        # Hydrate the threads whose history ID still matches the cached copy, no API call needed
+        if not self._cache:
+            return 0
+
+        hydrated_threads = 0
+
+        for thread_id, history_id in thread_history_ids.items():
+            if thread_id in self._threads:
+                continue
+
+            try:
+                message_ids = self._cache.get_thread(self.email, thread_id, history_id)
+                if message_ids is None:
+                    continue
+                cached_messages = self._cache.get_messages(self.email, message_ids)
+            except Exception as e:
+                print(f"Error reading cached thread ID {thread_id}: {e}")
+                continue
+
+            # A thread with a missing or insufficiently decoded message is refetched rather than served partially
+            if len(cached_messages) != len(message_ids) or not all(self._covers_body_parts(cached_message) for cached_message in cached_messages.values()):
+                continue
+
+            for message_id in message_ids:
+                hydrated_message = cached_messages[message_id]['details']
+                hydrated_message.setdefault('internal_date', cached_messages[message_id]['internal_date'])
+                hydrated_message['label_ids'] = cached_messages[message_id]['label_ids']
+                self._messages[message_id] = hydrated_message
+
+            self._threads[thread_id] = message_ids
+            hydrated_threads += 1
+
+        return hydrated_threads
+
+    def cache_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+
+        # Parse a single messages().get(format='full') response and keep it on disk for later runs
+        message_details = self.build_message_details(message, self.body_parts)
+
+        if self._cache:
+            try:
+                self._cache.put_message(self.email, self._cache_entry(message, message_details))
+            except Exception as e:
+                print(f"Error caching message ID {message['id']}: {e}")
+
+        return message_details
+
+    def get_message_ids(self, thread_id: str) -> Optional[List[str]]:
+
+        message_ids = self._threads.get(thread_id)
+        return list(message_ids) if message_ids is not None else None
+
+    def get_message_details(self, message_id: str) -> Optional[Dict[str, Any]]:
+
+        hydrated_message = self._messages.get(message_id)
+
+        # Message content never changes, so a cached copy is valid whatever its labels are now
+        if hydrated_message is None and self._cache:
+            try:
+                cached_message = self._cache.get_message(self.email, message_id)
+            except Exception as e:
+                print(f"Error reading cached message ID {message_id}: {e}")
+                cached_message = None
+            if cached_message is not None and self._covers_body_parts(cached_message):
+                hydrated_message = cached_message['details']
+                hydrated_message.setdefault('internal_date', cached_message['internal_date'])
+
+        if hydrated_message is None:
+            return None
+
+        # Hand out a copy so callers can trim the body without touching the hydrated thread
+        message_details = {key: value for key, value in hydrated_message.items() if key != 'label_ids'}
+        message_details['body'] = dict(hydrated_message['body'])
+        return message_details
+
+    def get_label_ids(self, message_id: str) -> Optional[List[str]]:
+
+        hydrated_message = self._messages.get(message_id)
+        return list(hydrated_message['label_ids']) if hydrated_message is not None else None
+
+    def clear(self) -> None:
+
+        self._threads.clear()
+        self._messages.clear()
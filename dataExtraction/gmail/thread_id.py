@@ -2,95 +2,93 @@ import json
 import sys
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 # Add the root directory to the Python path
 root_dir = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(root_dir))
 
-# Now import aws module
-from aws.utils import fetch_tokens
+# Custom imports
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+from dataExtraction.gmail.extraction_filters import GmailExtractionFilter, UNFILTERED_EXTRACTION
 
 class GmailThreadFetcher:
     
-    def __init__(self, email: str):
+    def __init__(self, email: str, filters: Optional[GmailExtractionFilter] = None):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
+        # Unfiltered unless the caller asks, summaries and follow-ups see every thread
+        self.filters = filters or UNFILTERED_EXTRACTION
         self._service = None
-    
-    def _load_credentials(self) -> Dict[str, Any]:
 
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file")
+        # Thread ID -> history ID as last listed, lets the message cache tell unchanged threads apart
+        self.thread_history_ids: Dict[str, str] = {}
+
+        # Token of the page after the one last handed out, None once the listing is exhausted
+        self.next_page_token: Optional[str] = None
     
     def _authenticate(self) -> None:
 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
+        # Shared, refresh-aware client from the process-wide session broker
+        self._service = get_gmail_session_broker().get_service(self.email)
+    
+    def iter_thread_id_pages(self, num_prev_days: Optional[int] = None, page_token: Optional[str] = None, query: Optional[str] = None) -> Iterator[List[str]]:
+
+        # Validate input
+        if num_prev_days is not None and (not isinstance(num_prev_days, int) or num_prev_days <= 0):
+            raise ValueError("Number of previous days must be a positive integer")
         
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
         
-        try:
-            # Load credentials
-            credentials_data = self._load_credentials()
+        search_terms = []
+        if num_prev_days is not None:
+            # Calculate the cutoff date in the format Gmail API expects (YYYY/MM/DD)
+            cutoff_date = (datetime.now() - timedelta(days=num_prev_days)).strftime('%Y/%m/%d')
+            search_terms.append(f'after:{cutoff_date}')  # This filters threads newer than the cutoff date
+        if query:
+            search_terms.append(query)
+        
+        # Label and category filters go into the listing itself, filtered threads are never fetched
+        filter_query = self.filters.to_query()
+        if filter_query:
+            search_terms.append(filter_query)
+        
+        params = self.filters.to_list_params()
+        if search_terms:
+            params['q'] = ' '.join(search_terms)
+        
+        # A saved page token resumes the listing where an earlier run stopped
+        while True:
+            # Retrieve threads with pagination
+            results = self._service.users().threads().list(
+                userId='me', 
+                pageToken=page_token,
+                **params
+            ).execute()
             
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
+            threads = results.get('threads', [])
+            self.thread_history_ids.update((thread['id'], thread['historyId']) for thread in threads if 'historyId' in thread)
             
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
-        except (ValueError, HttpError) as e:
-            print(f"Authentication error: {e}")
-            raise
+            # Get the next page token
+            page_token = results.get('nextPageToken')
+            self.next_page_token = page_token
+            
+            # Hand out the thread IDs of the current page
+            yield [thread['id'] for thread in threads]
+            
+            # Break the loop if no more pages
+            if not page_token:
+                break
     
     def fetch_all_thread_ids(self) -> List[str]:
 
         try:
-            # Ensure authentication
-            if not self._service:
-                self._authenticate()
-            
-            thread_ids = []
-            page_token = None
-            
-            while True:
-                # Retrieve threads with pagination
-                results = self._service.users().threads().list(
-                    userId='me', 
-                    pageToken=page_token
-                ).execute()
-                
-                # Extract thread IDs from current page
-                current_thread_ids = [thread['id'] for thread in results.get('threads', [])]
-                thread_ids.extend(current_thread_ids)
-                
-                # Get the next page token
-                page_token = results.get('nextPageToken')
-                
-                # Break the loop if no more pages
-                if not page_token:
-                    break
+            thread_ids = [thread_id for page in self.iter_thread_id_pages() for thread_id in page]
             
             print(f"Total number of thread IDs: {len(thread_ids)}")
             return thread_ids
@@ -109,34 +107,7 @@ class GmailThreadFetcher:
             raise ValueError("Number of previous days must be a positive integer")
         
         try:
-            # Ensure authentication
-            if not self._service:
-                self._authenticate()
-            
-            # Calculate the cutoff date in the format Gmail API expects (YYYY/MM/DD)
-            cutoff_date = (datetime.now() - timedelta(days=num_prev_days)).strftime('%Y/%m/%d')
-            
-            thread_ids = []
-            page_token = None
-            
-            while True:
-                # Use the 'after:' query to filter threads by date
-                results = self._service.users().threads().list(
-                    userId='me', 
-                    pageToken=page_token,
-                    q=f'after:{cutoff_date}'  # This filters threads newer than the cutoff date
-                ).execute()
-                
-                # Extract thread IDs from current page
-                current_thread_ids = [thread['id'] for thread in results.get('threads', [])]
-                thread_ids.extend(current_thread_ids)
-                
-                # Get the next page token
-                page_token = results.get('nextPageToken')
-                
-                # Break the loop if no more pages
-                if not page_token:
-                    break
+            thread_ids = [thread_id for page in self.iter_thread_id_pages(num_prev_days) for thread_id in page]
             
             print(f"Total number of thread IDs in the last {num_prev_days} days: {len(thread_ids)}")
             return thread_ids
@@ -2,11 +2,13 @@ import json
 import base64
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from datetime import datetime, timedelta
 
+# Custom imports
+from dataExtraction.gmail.label_cache import get_label_cache
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+
 class GmailAutomation:
     
     def __init__(self, email_id, refresh_token, access_token):
@@ -14,32 +16,16 @@ class GmailAutomation:
         self.email_id = email_id
         self.refresh_token = refresh_token
         self.access_token = access_token
-        self.gcp_creds = self._load_gcp_credentials()
         self.service = self._create_gmail_service()
 
-    def _load_gcp_credentials(self):
-
-        try:
-            with open('credentials/credential_gcp.json', 'r') as f:
-                creds_data = json.load(f)
-            return creds_data['web']
-        except FileNotFoundError:
-            raise FileNotFoundError("GCP credentials file not found at 'credentials/credential_gcp.json'")
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON in GCP credentials file")
-
     def _create_gmail_service(self):
 
         try:
-            creds = Credentials(
-                token=self.access_token,
-                refresh_token=self.refresh_token,
-                token_uri=self.gcp_creds['token_uri'],
-                client_id=self.gcp_creds['client_id'],
-                client_secret=self.gcp_creds['client_secret'],
-                scopes=['https://www.googleapis.com/auth/gmail.modify']
+            # Reuse the user's client from the process-wide session broker
+            return get_gmail_session_broker().get_service(
+                self.email_id,
+                tokens={'access_token': self.access_token, 'refresh_token': self.refresh_token}
             )
-            return build('gmail', 'v1', credentials=creds)
         except Exception as e:
             raise Exception(f"Failed to create Gmail service: {str(e)}")
 
@@ -169,6 +155,9 @@ class GmailAutomation:
                 body=label_object
             ).execute()
 
+            # The cached label dictionary no longer matches the mailbox
+            get_label_cache().invalidate(self.email_id)
+
             return {
                 'status': 'success',
                 'label_id': created_label['id'],
@@ -0,0 +1,130 @@
+import re
+import time
+import imaplib
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.utils import formatdate, make_msgid, parseaddr
+
+# Custom imports
+from dataExtraction.custom.imap_connection_pool import get_connection_pool
+from dataExtraction.custom.data_extraction import (
+    prepare_connection,
+    list_folders,
+    resolve_special_use_folder,
+    quote_folder_name,
+    DRAFTS_FOLDER_CANDIDATES,
+    GMAIL_EXTENSION_CAPABILITY
+)
+
+class ImapAutomation:
+
+    # Counterpart of GmailAutomation for manual-mode accounts, messages are the dicts the IMAP extractor returns
+
+    def __init__(self, email_id, password, imap_server="imap.gmail.com"):
+
+        self.email_id = email_id
+        self.imap_server = imap_server
+        self.pool = get_connection_pool(imap_server, email_id, password, on_connect=prepare_connection)
+        self._drafts_folder = None
+
+    def _get_drafts_folder(self, mail):
+
+        if self._drafts_folder is None:
+            self._drafts_folder = resolve_special_use_folder(list_folders(mail), '\\Drafts', DRAFTS_FOLDER_CANDIDATES)
+        return self._drafts_folder
+
+    def draft_reply(self, original, reply_body):
+
+        try:
+            # Thread the reply under the original through its Message-ID
+            message = MIMEMultipart()
+            original_id = original.get('message_id', '')
+            if original_id:
+                message['In-Reply-To'] = original_id
+                message['References'] = ' '.join(original.get('references', []) + [original_id])
+            message['from'] = self.email_id
+            message['to'] = original.get('sender', '')
+
+            subject = original.get('subject', '')
+            message['subject'] = subject if subject.lower().startswith('re:') else f"Re: {subject}"
+            message['Date'] = formatdate(localtime=True)
+            message['Message-ID'] = make_msgid(domain=self.email_id.split('@')[-1])
+
+            # Add reply body
+            message.attach(MIMEText(reply_body))
+
+            with self.pool.connection() as mail:
+                drafts_folder = self._get_drafts_folder(mail)
+                if drafts_folder is None:
+                    return {
+                        'status': 'error',
+                        'message': 'No Drafts folder found'
+                    }
+
+                status, data = mail.append(
+                    quote_folder_name(drafts_folder),
+                    '(\\Draft \\Seen)',
+                    imaplib.Time2Internaldate(time.time()),
+                    message.as_bytes()
+                )
+
+            if status != 'OK':
+                return {
+                    'status': 'error',
+                    'message': f'APPEND failed: {data}'
+                }
+
+            return {
+                'status': 'success',
+                'draft_id': message['Message-ID'],
+                'message': 'Reply draft created successfully'
+            }
+
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'An error occurred: {str(e)}'
+            }
+
+    def add_label_to_message(self, original, label_name):
+
+        try:
+            with self.pool.connection() as mail:
+                status, _ = mail.select(quote_folder_name(original['folder']))
+                if status != 'OK':
+                    return {
+                        'status': 'error',
+                        'message': f'Could not open {original["folder"]}'
+                    }
+
+                uid = str(original['uid'])
+                if GMAIL_EXTENSION_CAPABILITY in mail.capabilities:
+                    # Gmail creates the label if it does not exist yet
+                    status, data = mail.uid('STORE', uid, '+X-GM-LABELS', f'({quote_folder_name(label_name)})')
+                else:
+                    # Elsewhere the label becomes a keyword, next to \Flagged for clients without keyword support
+                    keyword = '$' + re.sub(r'[^A-Za-z0-9_]', '', label_name)
+                    status, data = mail.uid('STORE', uid, '+FLAGS', f'(\\Flagged {keyword})')
+
+            if status != 'OK':
+                return {
+                    'status': 'error',
+                    'message': f'STORE failed: {data}'
+                }
+
+            return {
+                'status': 'success',
+                'message_id': original.get('message_id', ''),
+                'message': f'Label "{label_name}" added successfully'
+            }
+
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'An error occurred: {str(e)}'
+            }
+
+    @staticmethod
+    def sender_address(original):
+
+        return parseaddr(original.get('sender', ''))[1]
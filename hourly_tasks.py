@@ -3,13 +3,18 @@ from typing import List
 from aws.email_automation_preferences import EmailAutomationPreferences
 from services.automated_response import AutomatedResponseMonitor
 from services.priority_response import EmailImportanceAnalyzer
+from dataExtraction.gmail.quota_accounting import quota_job, get_quota_ledger
+from dataExtraction.gmail.history_sync import history_sync_lock
 
 async def execute_automated_response(email_id: str):
 
     print(f"\n\nSTARTING TO EXECUTE AUTOMATED RESPONSES FOR: {email_id}\n\n")
 
     automated_response_monitor = AutomatedResponseMonitor()
-    await automated_response_monitor.automated_emails_responses(email_id)
+    # The realtime monitor runs the same consumer, one run at a time per user
+    async with history_sync_lock(email_id, "automated_response"):
+        with quota_job("automated_response"):
+            await automated_response_monitor.automated_emails_responses(email_id)
 
     print(f"Executed automated response for email: {email_id}")
 
@@ -17,7 +22,10 @@ async def execute_priority_response(email_id: str):
     print(f"\n\nexecute_priority_response: {email_id}\n\n")
     
     email_importance_analyzer = EmailImportanceAnalyzer()
-    result = await email_importance_analyzer.automated_priority_response_emails(email_id)
+    # The realtime monitor runs the same consumer, one run at a time per user
+    async with history_sync_lock(email_id, "priority_response"):
+        with quota_job("priority_response"):
+            result = await email_importance_analyzer.automated_priority_response_emails(email_id)
     
     if result:
         print(f"Successfully executed priority response for email: {email_id}")
@@ -58,6 +66,11 @@ async def hourly():
     await asyncio.gather(automated_task, priority_task)
     print("Hourly tasks completed")
 
+    # Gmail quota units spent per user and job since the previous hourly run
+    for email_id, jobs in get_quota_ledger().drain().items():
+        for job_name, totals in jobs.items():
+            print(f"Gmail quota for {email_id} ({job_name}): {totals['units']} units in {totals['calls']} calls")
+
 # Run the hourly function
 if __name__ == "__main__":
     asyncio.run(hourly())
@@ -9,7 +9,11 @@ from generator import UserInitializationManager
 from fastapi.middleware.cors import CORSMiddleware
 from scheduler_manager_daywise import DaywiseSchedulerManager
 from scheduler_manager_hourwise import HourwiseSchedulerManager
+from realtime_tasks import RealtimeMonitorManager
 from aws.utils import get_all_email_ids
+from dataExtraction.gmail.quota_accounting import quota_job, get_quota_ledger
+from dataExtraction.gmail.discovery import get_gmail_discovery_document
+from userManagement.gmail_backfill import shutdown_backfills
 
 from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Response
 from fastapi.middleware.cors import CORSMiddleware
@@ -58,6 +62,9 @@ from handlers import (
 # Minute Scheduler
 MINUTE_SCHEDULER = 180
 
+# Parse the bundled Gmail discovery document once, before the first client is built
+get_gmail_discovery_document()
+
 # Initialize FastAPI
 
 app = FastAPI()
@@ -67,6 +74,9 @@ init_manager = UserInitializationManager()
 hourwise_scheduler = HourwiseSchedulerManager()
 daywise_scheduler = DaywiseSchedulerManager()
 
+# IMAP IDLE watchers feed new mail to the automations within seconds
+realtime_monitor = RealtimeMonitorManager()
+
 # Add CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -93,6 +103,8 @@ def signal_handler(sig, frame):
     print("Shutting down schedulers...")
     hourwise_scheduler.shutdown()
     daywise_scheduler.shutdown()
+    realtime_monitor.shutdown()
+    shutdown_backfills()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -135,6 +147,40 @@ async def initialize_user(user_data: UserInit):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/api/convoia-onboarding-status")
+async def onboarding_status(email_id: EmailStr):
+    
+    print(f"\nReceived API Call At convoia-onboarding-status\n")
+
+    try:
+
+        tiers = init_manager.user_data_extractor.get_onboarding_status(email_id)
+
+        return {
+            "status": "success",
+            "email": email_id,
+            "ready": tiers[0]["status"] == "completed",
+            "tiers": tiers
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+@app.get("/api/convoia-quota-usage")
+async def quota_usage(email_id: EmailStr):
+
+    try:
+
+        # Counted since the last hourly report, which drains the ledger
+        return {
+            "status": "success",
+            "email": email_id,
+            "jobs": get_quota_ledger().usage(email_id).get(email_id, {})
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
 @app.post("/api/")
 async def process_user_input(request: UserInput):
     
@@ -173,10 +219,11 @@ async def process_user_input(request: UserInput):
         
         print(f"Calling handler function: {handler_function.__name__}")
         
-        result = await handler_function(
-            text=request.user_input,
-            email=request.user_email
-        )
+        with quota_job(feature):
+            result = await handler_function(
+                text=request.user_input,
+                email=request.user_email
+            )
 
         print(f"\nHandler result: {result}")
         
@@ -275,3 +322,4 @@ async def text_to_speech(request: TextToSpeechRequest):
 # Set up the Schedules
 hourwise_scheduler.schedule_task(interval_minutes=MINUTE_SCHEDULER)  
 daywise_scheduler.schedule_task(hour=0, minute=0)
+realtime_monitor.start()
@@ -0,0 +1,91 @@
+import time
+import threading
+
+# Limiters shared by the Gmail extraction and the embedding uploads, neither knows what it is limiting
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float = None):
+
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, units: float = 1) -> None:
+
+        # A request larger than the bucket would never fit, clamp it to a full bucket
+        units = min(units, self.capacity)
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= units:
+                    self._tokens -= units
+                    return
+                wait = (units - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def debit(self, units: float = 1) -> None:
+
+        # Take the units without waiting, the bucket may go negative and later acquire() calls wait the debt off
+        with self._lock:
+            self._refill()
+            self._tokens -= min(units, self.capacity)
+
+class AdaptiveConcurrencyLimiter:
+
+    def __init__(self, max_workers: int, min_workers: int = 1, increase_after: int = 20):
+
+        if max_workers < min_workers or min_workers <= 0:
+            raise ValueError("Worker limits must satisfy 0 < min_workers <= max_workers")
+
+        self.max_workers = max_workers
+        self.min_workers = min_workers
+        self.increase_after = increase_after
+        self.limit = max_workers
+
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self) -> None:
+
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+
+        # Additive increase once the quota has been quiet for a while
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.limit < self.max_workers:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_rate_limited(self) -> None:
+
+        # Multiplicative decrease as soon as Gmail pushes back
+        with self._condition:
+            self.limit = max(self.min_workers, self.limit // 2)
+            self._successes = 0
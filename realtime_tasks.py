@@ -0,0 +1,171 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Set, Coroutine
+from aws.utils import fetch_tokens
+from aws.email_automation_preferences import EmailAutomationPreferences
+from dataExtraction.custom.imap_idle import ImapIdleMonitor, ImapIdleAccount, build_idle_account
+from dataExtraction.custom.data_extraction import fetch_messages_by_uid
+from dataExtraction.custom.imap_connection_pool import close_connection_pools
+from dataExtraction.gmail.session_broker import get_gmail_session_broker
+from email_operations.imap import ImapAutomation
+from services.automated_response import AutomatedResponseMonitor
+from services.priority_response import EmailImportanceAnalyzer
+from hourly_tasks import execute_automated_response, execute_priority_response
+
+# How often the watched accounts are reconciled with the automation preferences
+ACCOUNT_REFRESH_SECONDS = 300
+
+# Pipelines running at once, each on a worker thread
+PIPELINE_WORKERS = 8
+
+# Off unless asked for: the stored OAuth grants need the full Gmail scope and manual accounts an IMAP password to log in
+REALTIME_MONITOR_ENABLED = os.getenv('REALTIME_MONITOR_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+# How long shutdown waits for the watchers to log out
+SHUTDOWN_TIMEOUT_SECONDS = 30
+
+class RealtimeAutomation:
+
+    def __init__(self):
+
+        self.monitor = ImapIdleMonitor(self.handle_new_mail)
+        self.automated_response_ids: Set[str] = set()
+        self.priority_response_ids: Set[str] = set()
+        self.pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix='realtime-pipeline')
+
+    async def run_pipeline(self, pipeline: Coroutine) -> None:
+
+        # The pipelines make blocking Gmail, OpenAI and IMAP calls, so they get a worker thread and
+        # an event loop of their own, the same way the scheduler runs them, and every IDLE session
+        # on this loop keeps being served
+        await asyncio.get_running_loop().run_in_executor(self.pipeline_executor, asyncio.run, pipeline)
+
+    @staticmethod
+    def build_account(email_id: str) -> Optional[ImapIdleAccount]:
+
+        user_details = fetch_tokens(email_id)
+        if not user_details:
+            print(f"Error: Could not fetch user details for {email_id}")
+            return None
+
+        # Gmail accepts the API access token over IMAP (XOAUTH2), the broker keeps it fresh
+        return build_idle_account(
+            user_details,
+            token_provider=lambda: get_gmail_session_broker().get_session(email_id).credentials.token
+        )
+
+    async def refresh_accounts(self) -> None:
+
+        preferences = EmailAutomationPreferences()
+        self.automated_response_ids = set(await asyncio.to_thread(preferences.get_email_ids_with_active_automated_response))
+        self.priority_response_ids = set(await asyncio.to_thread(preferences.get_email_ids_with_active_important_flag))
+
+        wanted = self.automated_response_ids | self.priority_response_ids
+
+        for email_id in set(self.monitor.watched()) - wanted:
+            self.monitor.unwatch(email_id)
+
+        for email_id in wanted:
+            account = await asyncio.to_thread(self.build_account, email_id)
+            if account is not None:
+                self.monitor.watch(account)
+
+        print(f"Watching {len(self.monitor.watched())} accounts for new mail")
+
+    async def handle_new_mail(self, account: ImapIdleAccount, uids: List[int]) -> None:
+
+        email_id = account.email_address
+        print(f"\n\nNEW MAIL FOR {email_id}: {len(uids)} messages\n\n")
+
+        if account.mode == 'oauth':
+            # The Gmail API pipelines pick the new messages up from their history checkpoints
+            tasks = []
+            if email_id in self.automated_response_ids:
+                tasks.append(self.run_pipeline(execute_automated_response(email_id)))
+            if email_id in self.priority_response_ids:
+                tasks.append(self.run_pipeline(execute_priority_response(email_id)))
+            await asyncio.gather(*tasks)
+            return
+
+        messages = await asyncio.to_thread(
+            fetch_messages_by_uid, email_id, account.password, uids, account.imap_server, self.monitor.folder
+        )
+        if not messages:
+            return
+
+        imap_automation = ImapAutomation(email_id, account.password, account.imap_server)
+        tasks = []
+        if email_id in self.automated_response_ids:
+            tasks.append(self.run_pipeline(AutomatedResponseMonitor().automated_responses_imap_messages(email_id, messages, imap_automation)))
+        if email_id in self.priority_response_ids:
+            tasks.append(self.run_pipeline(EmailImportanceAnalyzer().priority_response_imap_messages(email_id, messages, imap_automation)))
+        await asyncio.gather(*tasks)
+
+    async def run(self) -> None:
+
+        try:
+            while True:
+                try:
+                    await self.refresh_accounts()
+                except Exception as e:
+                    print(f"Error refreshing watched accounts: {str(e)}")
+                await asyncio.sleep(ACCOUNT_REFRESH_SECONDS)
+        finally:
+            await self.monitor.stop()
+            self.pipeline_executor.shutdown(wait=False, cancel_futures=True)
+            close_connection_pools()
+
+async def realtime():
+
+    await RealtimeAutomation().run()
+
+class RealtimeMonitorManager:
+
+    # Runs the IDLE monitor on its own event loop next to the schedulers
+
+    def __init__(self):
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='realtime-monitor', daemon=True)
+        self.task = None
+
+    def start(self):
+
+        if not REALTIME_MONITOR_ENABLED:
+            print("Realtime monitor disabled, set REALTIME_MONITOR_ENABLED to start it")
+            return
+
+        self.thread.start()
+        self.task = asyncio.run_coroutine_threadsafe(realtime(), self.loop)
+        print("Realtime monitor started")
+
+    @staticmethod
+    async def _cancel_tasks():
+
+        # Cancelling the returned future would not wait, so the loop's own tasks are cancelled and awaited here
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def shutdown(self):
+
+        if self.task is None:
+            return
+
+        # Let the watchers log out and the pools close before the loop goes away
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop).result(timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            print("Realtime monitor did not stop in time")
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        self.task = None
+        print("Realtime monitor shut down")
+
+# Run the realtime monitor on its own
+if __name__ == "__main__":
+    asyncio.run(realtime())
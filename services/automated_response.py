@@ -2,7 +2,7 @@ import asyncio
 import os
 import sys
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 
 # Pydantic imports
 from pydantic import BaseModel, Field
@@ -22,8 +22,10 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))
 from aws.automated_response import AutomatedResponseManager
 from aws.utils import fetch_tokens
 from email_operations.gmail import GmailAutomation
-from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher
+from email_operations.imap import ImapAutomation
+from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher, SKIPPED_LABEL_IDS
 from dataExtraction.gmail.message_ids import GmailMessageFetcher
+from dataExtraction.gmail.history_sync import GmailHistorySync
 
 from dotenv import load_dotenv
 import os
@@ -381,7 +383,64 @@ class AutomatedResponseMonitor:
             print(f"Error in email categorization: {e}")
             return ""
 
-    async def automated_emails_responses(self, user_email: str, num_prev_mins: int = 3 )  -> bool:
+    async def automated_responses_imap_messages(self, user_email: str, messages: List[Dict], imap_automation: ImapAutomation) -> bool:
+
+        # Manual-mode counterpart of the Gmail API loop, messages come from the IMAP extractor
+        try:
+            response_manager = AutomatedResponseManager()
+            categories_dict = response_manager.get_categories_with_descriptions(user_email)
+            response_dict = response_manager.get_categories_with_response_directive(user_email)
+
+            if not categories_dict:
+                print(f"Error: No categories found for {user_email}")
+                return False
+
+            for message in messages:
+
+                try:
+                    labels = set(message.get('labels', []))
+                    sender_email = imap_automation.sender_address(message)
+
+                    # Drafts, sent mail and the user's own messages are never answered
+                    if SKIPPED_LABEL_IDS & labels or '\\Draft' in labels or sender_email.lower() == user_email.lower():
+                        print(f"Skipping message {message.get('message_id')} with labels {sorted(labels)}")
+                        continue
+
+                    message_subject = message.get('subject', '')
+                    message_body = message.get('body', '')
+
+                    # Format email content
+                    email_content = f"""Subject: {message_subject}
+
+                        Body:
+                        {message_body}"""
+
+                    # Determine category
+                    matching_category = await self._determine_email_category(
+                        categories_dict,
+                        email_content
+                    )
+
+                    matching_category = matching_category.strip()
+
+                    if matching_category in categories_dict:
+
+                        response_format = response_dict[matching_category]
+                        email_body = await self._generate_email_response(response_format, message_subject, message_body)
+                        result = imap_automation.draft_reply(message, email_body)
+                        print(f"\n\nresult: {result}\n\n")
+
+                except Exception as e:
+                    print(f"Error processing message {message.get('message_id')}: {e}")
+                    pass
+
+            return True
+
+        except Exception as e:
+            print(f"Error in automated response monitoring: {e}")
+            return False
+
+    async def automated_emails_responses(self, user_email: str, num_prev_mins: int = 3, sync_mode: str = "history")  -> bool:
 
         try:
             # Get User Details
@@ -401,11 +460,18 @@ class AutomatedResponseMonitor:
                 details_fetcher = GmailMessageDetailsFetcher(user_email)
                 response_manager = AutomatedResponseManager()
                 
-                # Fetch recent message IDs
-                message_ids = message_fetcher.fetch_message_ids_by_prev_mins(num_prev_mins)
-                print(f"\n\nMessage IDs from the past 3 mins: {message_ids}\n\n")
+                # Fetch new message IDs, either the history deltas since the last run or a time window
+                if sync_mode == "history":
+                    history_sync = GmailHistorySync(user_email, consumer="automated_response")
+                    message_ids = history_sync.fetch_new_message_ids()
+                else:
+                    history_sync = None
+                    message_ids = message_fetcher.fetch_message_ids_by_prev_mins(num_prev_mins)
+                print(f"\n\nNew message IDs: {message_ids}\n\n")
 
                 if not message_ids:
+                    if history_sync:
+                        history_sync.commit()
                     return True
                 
                 # Get categories
@@ -424,6 +490,11 @@ class AutomatedResponseMonitor:
                         
                         # Fetch message details
                         message_details = details_fetcher.fetch_message_details_condensed(message_id)
+
+                        # One masked get returns labels and body together, history sync already drops drafts and sent mail
+                        if SKIPPED_LABEL_IDS & set(message_details['label_ids']):
+                            print(f"Skipping message {message_id} with labels {message_details['label_ids']}")
+                            continue
                         message_subject = message_details['subject']
                         message_body = message_details['body'].get('plain_text', '') or message_details['body'].get('html_text', '')
                         
@@ -455,10 +526,18 @@ class AutomatedResponseMonitor:
                             gmail_automation = GmailAutomation(user_email, refresh_token, access_token)
                             result = gmail_automation.draft_reply(message_id, email_body)
                             print(f"\n\nresult: {result}\n\n")
+                            if result['status'] != 'success' and history_sync:
+                                history_sync.mark_failed(message_id)
                             
                     except Exception as e:
                         print(f"Error processing message {message_id}: {e}")
-                        pass
+                        # Retried on the next run rather than lost behind the checkpoint
+                        if history_sync:
+                            history_sync.mark_failed(message_id)
+                
+                # Advance the checkpoint once every message was handled or queued for a retry
+                if history_sync:
+                    history_sync.commit()
                 
                 return True
                 
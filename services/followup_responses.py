@@ -241,13 +241,11 @@ class FollowUpEmailMonitor:
             if not gmail_automation:
                 raise FollowUpError("Failed to setup Gmail automation")
 
+            # Threads are streamed, so extraction stops as soon as a follow-up is drafted
             extractor = GmailDataExtractor(user_email)
-            json_file_path = extractor.fetch_email_threads(
+            threads = extractor.iter_email_threads(
                 num_prev_days or self.config.num_prev_days
             )
-
-            with open(json_file_path, 'r', encoding='utf-8') as file:
-                threads = json.load(file)
                 
             for thread in threads:
                 if self._process_single_thread(thread, gmail_automation):
@@ -2,7 +2,7 @@ import os
 import sys
 import asyncio
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List, Dict
 
 # Environment and third-party imports
 from dotenv import load_dotenv
@@ -15,9 +15,11 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))
 # Custom imports
 from aws.automated_priority_response import ImportantEmailManager
 from aws.utils import fetch_tokens
-from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher
+from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher, SKIPPED_LABEL_IDS
 from dataExtraction.gmail.message_ids import GmailMessageFetcher
+from dataExtraction.gmail.history_sync import GmailHistorySync
 from email_operations.gmail import GmailAutomation
+from email_operations.imap import ImapAutomation
 from services.send_email import EmailGenerator, EmailID_Extractor
 
 class ContactOutput(BaseModel):
@@ -151,7 +153,77 @@ class EmailImportanceAnalyzer:
         else:
             return await self.perform_ai_analysis(email_subject, email_body_text)
 
-    async def automated_priority_response_emails(self, user_email: str, num_prev_mins: int = 3) -> bool:
+    @staticmethod
+    def priority_reply_prompt(message_subject: str, sender_email: str, message_body: str) -> str:
+
+        return f"""Generate a priority response for this email:
+                            
+                            Subject: {message_subject}
+                            From: {sender_email}
+                            
+                            Original Message:
+                            {message_body}
+                            
+                            Instructions:
+                            - Acknowledge the urgency/importance
+                            - Provide a professional and prompt response
+                            - Keep it concise but comprehensive
+                            - Include relevant details from the original email
+                            """
+
+    async def priority_response_imap_messages(self, user_email: str, messages: List[Dict], imap_automation: ImapAutomation) -> bool:
+
+        # Manual-mode counterpart of the Gmail API loop, messages come from the IMAP extractor
+        try:
+            label_name = "Priority"
+            namespace = user_email.split('@')[0]
+            email_generator = EmailGenerator()
+
+            for message in messages:
+                try:
+                    labels = set(message.get('labels', []))
+                    sender_email = imap_automation.sender_address(message)
+
+                    # Drafts, sent mail and the user's own messages never get a priority reply
+                    if SKIPPED_LABEL_IDS & labels or '\\Draft' in labels or sender_email.lower() == user_email.lower():
+                        print(f"Skipping message {message.get('message_id')} with labels {sorted(labels)}")
+                        continue
+
+                    message_subject = message.get('subject', '')
+                    message_body = message.get('body', '')
+
+                    is_important = await self.analyze_email_importance(
+                        sender_email,
+                        message_subject,
+                        message_body,
+                        user_email
+                    )
+
+                    if is_important:
+                        print(f"\n\nIMPORTANT EMAIL : {message.get('message_id')}\n\n")
+
+                        imap_automation.add_label_to_message(message, label_name)
+
+                        ai_input_text = self.priority_reply_prompt(message_subject, sender_email, message_body)
+                        email_body = email_generator.generate_body(ai_input_text, namespace)
+
+                        if not email_body:
+                            print("Error: Could not generate email body")
+                            continue
+
+                        imap_automation.draft_reply(message, email_body)
+
+                except Exception as e:
+                    print(f"Error in priority email response monitoring: {e}\n\n{message.get('message_id')}")
+                    continue
+
+            return True
+
+        except Exception as e:
+            print(f"Error in priority email response monitoring: {e}")
+            return False
+
+    async def automated_priority_response_emails(self, user_email: str, num_prev_mins: int = 3, sync_mode: str = "history") -> bool:
         
         try:
             label_name = "Priority"
@@ -171,15 +243,28 @@ class EmailImportanceAnalyzer:
                 gmail_automation = GmailAutomation(user_email, refresh_token, access_token)
                 email_generator = EmailGenerator()
                 
-                message_ids = message_fetcher.fetch_message_ids_by_prev_mins(num_prev_mins)
-                print(f"\n\nMessage IDs from the past 3 mins: {message_ids}\n\n")
+                # Fetch new message IDs, either the history deltas since the last run or a time window
+                if sync_mode == "history":
+                    history_sync = GmailHistorySync(user_email, consumer="priority_response")
+                    message_ids = history_sync.fetch_new_message_ids()
+                else:
+                    history_sync = None
+                    message_ids = message_fetcher.fetch_message_ids_by_prev_mins(num_prev_mins)
+                print(f"\n\nNew message IDs: {message_ids}\n\n")
 
                 if not message_ids:
+                    if history_sync:
+                        history_sync.commit()
                     return True
                 
                 for message_id in message_ids:
                     try:
                         message_details = details_fetcher.fetch_message_essentials(message_id)
+
+                        # One masked get returns labels and body together, history sync already drops drafts and sent mail
+                        if SKIPPED_LABEL_IDS & set(message_details['label_ids']):
+                            print(f"Skipping message {message_id} with labels {message_details['label_ids']}")
+                            continue
                         
                         message_subject = message_details['subject']
                         message_body = message_details['body'].get('plain_text', '') or message_details['body'].get('html_text', '')
@@ -187,7 +272,11 @@ class EmailImportanceAnalyzer:
 
                         print(f"\n\nImportant message_subject: {message_subject}\n\nImportant message_body: {message_body}\n\nsender_email: {sender_email}\n\n")
                         
-                        is_important = await self.analyze_email_importance(
+                        # A retried message skips the steps an earlier attempt already got through
+                        completed_steps = history_sync.completed_steps(message_id) if history_sync else set()
+
+                        # Only important messages were ever labelled
+                        is_important = 'labelled' in completed_steps or await self.analyze_email_importance(
                             sender_email, 
                             message_subject, 
                             message_body, 
@@ -197,36 +286,42 @@ class EmailImportanceAnalyzer:
                         if is_important:
                             print(f"\n\nIMPORTANT EMAIL : {message_id}\n\n")
 
-                            gmail_automation.create_label(label_name)
-                            gmail_automation.add_label_to_message(message_id, label_name)
+                            if 'labelled' not in completed_steps:
+                                gmail_automation.create_label(label_name)
+                                label_result = gmail_automation.add_label_to_message(message_id, label_name)
+                                if label_result['status'] != 'success':
+                                    print(f"Error labelling message {message_id}: {label_result['message']}")
+                                    if history_sync:
+                                        history_sync.mark_failed(message_id)
+                                    continue
+                                if history_sync:
+                                    history_sync.mark_step(message_id, 'labelled')
 
-                            ai_input_text = f"""Generate a priority response for this email:
-                            
-                            Subject: {message_subject}
-                            From: {sender_email}
-                            
-                            Original Message:
-                            {message_body}
-                            
-                            Instructions:
-                            - Acknowledge the urgency/importance
-                            - Provide a professional and prompt response
-                            - Keep it concise but comprehensive
-                            - Include relevant details from the original email
-                            """
+                            ai_input_text = self.priority_reply_prompt(message_subject, sender_email, message_body)
 
                             email_body = email_generator.generate_body(ai_input_text, namespace)
                             print(f"email_body: {email_body}")
                             
                             if not email_body:
                                 print("Error: Could not generate email body")
-                                return False
+                                if history_sync:
+                                    history_sync.mark_failed(message_id)
+                                continue
                             
-                            gmail_automation.draft_reply(message_id, email_body)
+                            result = gmail_automation.draft_reply(message_id, email_body)
+                            if result['status'] != 'success' and history_sync:
+                                history_sync.mark_failed(message_id)
 
                     except Exception as e:
                         print(f"Error in priority email response monitoring: {e}\n\n{message_id}")
+                        # Retried on the next run rather than lost behind the checkpoint
+                        if history_sync:
+                            history_sync.mark_failed(message_id)
                         continue
+                
+                # Advance the checkpoint once every message was handled or queued for a retry
+                if history_sync:
+                    history_sync.commit()
                     
                 return True
                 
@@ -104,15 +104,16 @@ class GenerateSummarization:
 
                 # Method 1 : More Reliable but Time Consuming
 
+                # Threads flow from Gmail to Pinecone without intermediate files
                 gmailDataExtractor = GmailDataExtractor(user_email)
-                json_file_path = gmailDataExtractor.fetch_email_threads()
+                threads = gmailDataExtractor.iter_email_threads()
 
-                dataPreprocessor = DataPreprocessor(json_file_path)
-                txt_file_path = dataPreprocessor.convert()
+                dataPreprocessor = DataPreprocessor()
+                formatted_text = dataPreprocessor.iter_formatted_text(threads)
 
                 chatbot = Chatbot()
                 namespace_summary = f"{user_email.split('@')[0]}_summarization"
-                chatbot.upload_file(txt_file_path, namespace_summary)
+                chatbot.upload_stream(formatted_text, namespace_summary, source=f"{user_email}.txt")
 
                 # Generate Summarize
                 summary = self._generate_summary(user_input_text, namespace_summary)
@@ -120,10 +121,6 @@ class GenerateSummarization:
                 # Delete the Namespace
                 chatbot.delete_namespace(namespace_summary)
 
-                # Delete the Files
-                os.remove(json_file_path)
-                os.remove(txt_file_path)
-
                 # # Method 2 : Less Reliable but Faster
 
                 # namespace = user_email.split('@')[0]
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules import each other from the repository root, the same way main.py runs them
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,199 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from userManagement import gmail_backfill
+from userManagement.gmail_backfill import GmailBackfillJob
+from vectorDatabase.pinecone_chatbot_handler import Chatbot
+
+EMAIL = 'user@example.com'
+
+def http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'{}')
+
+class FakeJobManager:
+
+    def __init__(self, jobs=None):
+        self.jobs = dict(jobs or {})
+        self.saved = []
+
+    def get_job(self, email_id, job_name):
+        job = self.jobs.get((email_id, job_name))
+        return dict(job) if job else None
+
+    def save_job(self, job):
+        self.saved.append(dict(job))
+        self.jobs[(job['email_id'], job['job_name'])] = dict(job)
+
+class FakeThreadFetcher:
+    """Serves pages of thread IDs, failing with the given errors for the page tokens they are keyed by."""
+
+    def __init__(self, pages, errors=None):
+        self.pages = pages
+        self.errors = dict(errors or {})
+        self.next_page_token = None
+        self.listed_from = []
+
+    def iter_thread_id_pages(self, num_prev_days, page_token, query):
+        self.listed_from.append(page_token)
+        if page_token in self.errors:
+            raise self.errors.pop(page_token)
+
+        index = int(page_token) if page_token else 0
+        for index in range(index, len(self.pages)):
+            self.next_page_token = str(index + 1) if index + 1 < len(self.pages) else None
+            yield self.pages[index]
+
+class FakeExtractor:
+
+    def __init__(self, thread_fetcher):
+        self.thread_fetcher = thread_fetcher
+
+    def fetch_transformed_threads(self, thread_ids):
+        return [{'thread_id': thread_id} for thread_id in thread_ids]
+
+class FakeChatbot:
+
+    def __init__(self):
+        self.uploaded = []
+
+    def upload_documents(self, documents, namespace, source):
+        documents = list(documents)
+        self.uploaded.extend(document_id for document_id, _ in documents)
+        return len(documents)
+
+class FakePreprocessor:
+
+    def iter_thread_documents(self, threads):
+        for thread in threads:
+            yield thread['thread_id'], thread['thread_id']
+
+@pytest.fixture
+def make_job(monkeypatch):
+
+    def make(job_manager, thread_fetcher, **kwargs):
+        monkeypatch.setattr(gmail_backfill, 'GmailBackfillJobManager', lambda: job_manager)
+        monkeypatch.setattr(gmail_backfill, 'GmailDataExtractor', lambda email_id, filters=None: FakeExtractor(thread_fetcher))
+        monkeypatch.setattr(gmail_backfill, 'DataPreprocessor', FakePreprocessor)
+        monkeypatch.setattr(gmail_backfill, 'Chatbot', FakeChatbot)
+        return GmailBackfillJob(EMAIL, job_name='history', **kwargs)
+
+    return make
+
+def stored_job(**fields):
+    job = {
+        'email_id': EMAIL,
+        'job_name': 'history',
+        'status': 'failed',
+        'query': 'before:2024/01/01',
+        'page_token': '1',
+        'pages_completed': 1,
+        'threads_completed': 2,
+        'threads_failed': 0,
+        'failed_thread_ids': [],
+        'chunks_uploaded': 2
+    }
+    job.update(fields)
+    return job
+
+def test_interrupted_job_resumes_with_its_own_query(make_job):
+    job_manager = FakeJobManager({(EMAIL, 'history'): stored_job()})
+    job = make_job(job_manager, FakeThreadFetcher([]), query='before:2025/01/01')
+
+    job._load_or_create()
+
+    assert job.job['status'] == 'running'
+    assert job.job['page_token'] == '1'
+    assert job.job['threads_skipped'] == 0
+    assert job.job['completed_thread_ids'] == []
+    assert job.query == 'before:2024/01/01'
+
+def test_completed_job_starts_over(make_job):
+    job_manager = FakeJobManager({(EMAIL, 'history'): stored_job(status='completed')})
+    job = make_job(job_manager, FakeThreadFetcher([]), query='before:2025/01/01')
+
+    job._load_or_create()
+
+    assert job.job['page_token'] is None
+    assert job.job['pages_completed'] == 0
+    assert job.job['query'] == 'before:2025/01/01'
+
+def test_threads_recorded_by_the_skip_job_are_not_refetched(make_job):
+    job_manager = FakeJobManager({(EMAIL, 'recent'): {'completed_thread_ids': ['a']}})
+    job = make_job(job_manager, FakeThreadFetcher([['a', 'b']]), skip_job_name='recent')
+
+    progress = job.run()
+
+    assert job.chatbot.uploaded == ['b']
+    assert progress['threads_skipped'] == 1
+    assert progress['status'] == 'completed'
+
+def test_expired_page_token_restarts_the_listing(make_job):
+    job_manager = FakeJobManager({(EMAIL, 'history'): stored_job()})
+    thread_fetcher = FakeThreadFetcher([['a', 'b'], ['c']], errors={'1': http_error(400)})
+    job = make_job(job_manager, thread_fetcher)
+
+    progress = job.run()
+
+    assert thread_fetcher.listed_from == ['1', None]
+    assert job.chatbot.uploaded == ['a', 'b', 'c']
+    assert progress['pages_completed'] == 2
+    assert progress['threads_completed'] == 3
+    assert job_manager.jobs[(EMAIL, 'history')]['status'] == 'completed'
+
+def test_other_errors_mark_the_job_failed(make_job):
+    job_manager = FakeJobManager({(EMAIL, 'history'): stored_job()})
+    job = make_job(job_manager, FakeThreadFetcher([['a'], ['b']], errors={'1': http_error(500)}))
+
+    with pytest.raises(HttpError):
+        job.run()
+
+    assert job_manager.jobs[(EMAIL, 'history')]['status'] == 'failed'
+    assert job_manager.jobs[(EMAIL, 'history')]['page_token'] == '1'
+
+class FakeIndex:
+
+    def __init__(self, vector_ids=()):
+        self.vector_ids = set(vector_ids)
+
+    def list(self, prefix, namespace):
+        yield sorted(vector_id for vector_id in self.vector_ids if vector_id.startswith(prefix))
+
+    def delete(self, ids, namespace):
+        self.vector_ids -= set(ids)
+
+    def upsert(self, vectors, namespace):
+        self.vector_ids |= {vector['id'] for vector in vectors}
+
+class FakeEncoding:
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+def test_reuploading_a_shorter_document_drops_its_stale_chunks():
+    chatbot = Chatbot.__new__(Chatbot)
+    chatbot.index = FakeIndex({'src_t1_0', 'src_t1_1', 'src_t1_2', 'src_t10_0'})
+    chatbot._iter_chunks = lambda segments, chunk_size: iter(segments)
+    chatbot.create_embeddings = lambda texts, token_count: [[0.0] for _ in texts]
+    chatbot.encoding = FakeEncoding()
+
+    assert chatbot.upload_documents([('t1', 'short')], 'namespace', source='src') == 1
+    assert chatbot.index.vector_ids == {'src_t1_0', 'src_t10_0'}
+
+def test_shutdown_stops_at_a_page_boundary_and_leaves_the_job_resumable(make_job, monkeypatch):
+    monkeypatch.setattr(gmail_backfill, '_backfill_stop', gmail_backfill.threading.Event())
+    job_manager = FakeJobManager()
+    job = make_job(job_manager, FakeThreadFetcher([['a'], ['b']]))
+    upload_documents = job.chatbot.upload_documents
+
+    def upload_then_shut_down(documents, namespace, source):
+        gmail_backfill._backfill_stop.set()
+        return upload_documents(documents, namespace, source)
+
+    job.chatbot.upload_documents = upload_then_shut_down
+
+    progress = job.run()
+
+    assert progress['pages_completed'] == 1
+    assert job_manager.jobs[(EMAIL, 'history')]['status'] == 'running'
+    assert job_manager.jobs[(EMAIL, 'history')]['page_token'] == '1'
@@ -0,0 +1,44 @@
+from dataExtraction.gmail.data_extraction import GmailDataExtractor
+
+def make_message(message_id, internal_date=None, date_header='', thread_id='t1'):
+    return {
+        'message_id': message_id,
+        'thread_id': thread_id,
+        'internal_date': internal_date,
+        'timestamp': date_header,
+        'from': {'email': 'a@example.com'},
+        'to': {'email': 'b@example.com'},
+        'subject': 'Hi',
+        'body': {'plain_text': 'hello'}
+    }
+
+def transform(threads):
+    return GmailDataExtractor.__new__(GmailDataExtractor)._transform_threads(threads)
+
+def test_messages_are_ordered_by_internal_date():
+    thread = transform([[make_message('m2', 1700000060000), make_message('m1', 1700000000000)]])[0]
+
+    assert [msg['message_id'] for msg in thread['messages']] == ['m1', 'm2']
+    assert thread['messages'][0]['datetime'] == '2023-11-14 22:13:20 UTC'
+    assert thread['messages'][0]['timestamp'] == 1700000000.0
+    assert thread['reply_to_message_id'] == 'm2'
+
+def test_date_header_is_the_fallback():
+    thread = transform([[make_message('m1', date_header='Tue, 14 Nov 2023 23:13:20 +0100')]])[0]
+
+    assert thread['messages'][0]['datetime'] == '2023-11-14 22:13:20 UTC'
+    assert thread['messages'][0]['timestamp'] == 1700000000.0
+
+def test_unparseable_date_is_not_indexed_as_the_epoch():
+    thread = transform([[
+        make_message('m2', 1700000000000),
+        make_message('m1', date_header='not a date'),
+        make_message('m0')
+    ]])[0]
+
+    messages = {msg['message_id']: msg for msg in thread['messages']}
+    assert messages['m1']['datetime'] == 'not a date'
+    assert messages['m1']['timestamp'] is None
+    assert messages['m0']['datetime'] == ''
+    assert messages['m0']['timestamp'] is None
+    assert thread['reply_to_message_id'] == 'm2'
@@ -0,0 +1,187 @@
+import asyncio
+import threading
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from dataExtraction.gmail.history_sync import GmailHistorySync, MAX_MESSAGE_ATTEMPTS, history_sync_lock
+
+class FakeRequest:
+
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+class FakeGmailService:
+    """Just enough of users() for the history sync: getProfile, history().list and messages().list."""
+
+    def __init__(self, history_id='500', history_pages=None, listed_message_ids=()):
+        self.history_id = history_id
+        self.history_pages = history_pages or []
+        self.listed_message_ids = list(listed_message_ids)
+        self.history_calls = []
+
+    def users(self):
+        return self
+
+    def getProfile(self, userId):
+        return FakeRequest({'historyId': self.history_id})
+
+    def history(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, userId, pageToken=None, **params):
+        if 'startHistoryId' in params:
+            self.history_calls.append((params['startHistoryId'], pageToken))
+            page = self.history_pages[len(self.history_calls) - 1]
+            return FakeRequest(page)
+        return FakeRequest({'messages': [{'id': message_id} for message_id in self.listed_message_ids]})
+
+class FakeCheckpointManager:
+
+    def __init__(self, checkpoint=None):
+        self.checkpoint = checkpoint
+        self.saved = []
+
+    def get_checkpoint(self, email_id, consumer):
+        return self.checkpoint
+
+    def set_history_id(self, email_id, consumer, history_id, retry_message_ids=None):
+        self.saved.append((history_id, retry_message_ids))
+        return True
+
+def make_sync(service, checkpoint=None):
+
+    sync = GmailHistorySync('user@example.com', consumer='priority_response')
+    sync.checkpoint_manager = FakeCheckpointManager(checkpoint)
+    sync._service = service
+    return sync
+
+def added(message_id, *label_ids):
+    return {'messagesAdded': [{'message': {'id': message_id, 'labelIds': list(label_ids)}}]}
+
+def not_found():
+    return HttpError(httplib2.Response({'status': 404}), b'history too old')
+
+def test_first_run_only_seeds_the_checkpoint():
+
+    service = FakeGmailService(history_id='900', listed_message_ids=['old-1', 'old-2'])
+    sync = make_sync(service)
+
+    assert sync.fetch_new_message_ids() == []
+    assert sync.commit()
+    assert sync.checkpoint_manager.saved == [('900', {})]
+
+def test_history_pages_skip_own_mail_and_take_the_last_history_id():
+
+    service = FakeGmailService(history_pages=[
+        {'history': [added('m1', 'INBOX'), added('d1', 'DRAFT')], 'nextPageToken': 'p2', 'historyId': '610'},
+        {'history': [added('m2', 'INBOX'), added('m1', 'INBOX'), added('s1', 'SENT')], 'historyId': '620'},
+    ])
+    sync = make_sync(service, {'history_id': '600', 'retry_message_ids': {}})
+
+    assert sync.fetch_new_message_ids() == ['m1', 'm2']
+    assert service.history_calls == [('600', None), ('600', 'p2')]
+
+    sync.commit()
+    assert sync.checkpoint_manager.saved == [('620', {})]
+
+def test_expired_checkpoint_falls_back_to_a_recent_listing():
+
+    service = FakeGmailService(history_id='990', history_pages=[not_found()], listed_message_ids=['r1'])
+    sync = make_sync(service, {'history_id': '10', 'retry_message_ids': {}})
+
+    assert sync.fetch_new_message_ids() == ['r1']
+    sync.commit()
+    assert sync.checkpoint_manager.saved == [('990', {})]
+
+def test_failed_messages_are_retried_first_with_their_completed_steps():
+
+    service = FakeGmailService(history_pages=[{'history': [added('m2', 'INBOX')], 'historyId': '710'}])
+    sync = make_sync(service, {
+        'history_id': '700',
+        'retry_message_ids': {'m1': {'attempts': 1, 'steps': ['labelled']}}
+    })
+
+    assert sync.fetch_new_message_ids() == ['m1', 'm2']
+    assert sync.completed_steps('m1') == {'labelled'}
+    assert sync.completed_steps('m2') == set()
+
+    sync.mark_step('m2', 'labelled')
+    sync.mark_failed('m1')
+    sync.mark_failed('m2')
+    sync.commit()
+
+    history_id, retry_message_ids = sync.checkpoint_manager.saved[-1]
+    assert history_id == '710'
+    assert retry_message_ids == {
+        'm1': {'attempts': 2, 'steps': ['labelled']},
+        'm2': {'attempts': 1, 'steps': ['labelled']}
+    }
+
+def test_a_message_is_given_up_after_the_last_attempt():
+
+    service = FakeGmailService(history_pages=[{'history': [], 'historyId': '810'}])
+    sync = make_sync(service, {
+        'history_id': '800',
+        'retry_message_ids': {'m1': {'attempts': MAX_MESSAGE_ATTEMPTS - 1, 'steps': []}}
+    })
+
+    assert sync.fetch_new_message_ids() == ['m1']
+    sync.mark_failed('m1')
+    sync.commit()
+
+    assert sync.checkpoint_manager.saved == [('810', {})]
+
+def test_commit_without_a_fetch_saves_nothing():
+
+    sync = make_sync(FakeGmailService())
+    assert not sync.commit()
+    assert sync.checkpoint_manager.saved == []
+
+def test_history_sync_lock_serializes_runs_across_event_loops():
+
+    events = []
+
+    async def run(name):
+        async with history_sync_lock('lock@example.com', 'consumer'):
+            events.append(('start', name))
+            await asyncio.sleep(0.05)
+            events.append(('end', name))
+
+    threads = [threading.Thread(target=asyncio.run, args=(run(name),)) for name in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for position in range(0, len(events), 2):
+        assert events[position][0] == 'start'
+        assert events[position + 1] == ('end', events[position][1])
+
+def test_history_sync_lock_is_released_when_a_waiter_is_cancelled():
+
+    async def scenario():
+        async with history_sync_lock('cancel@example.com', 'consumer'):
+            waiter = asyncio.create_task(_hold('cancel@example.com'))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+        # Neither the cancelled waiter nor the first holder keeps the lock
+        await asyncio.wait_for(_hold('cancel@example.com'), timeout=1)
+
+    asyncio.run(scenario())
+
+async def _hold(email):
+    async with history_sync_lock(email, 'consumer'):
+        pass
@@ -0,0 +1,66 @@
+import httplib2
+import pytest
+import requests
+
+from dataExtraction.gmail.http_transport import PooledHttp
+
+def make_response(status, headers=None, content=b''):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = content
+    response.reason = 'reason'
+    return response
+
+class FakeSession:
+    """Replays canned responses and records what PooledHttp sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def request(self, method, uri, data=None, headers=None, timeout=None, allow_redirects=True):
+        assert allow_redirects is False
+        self.sent.append((method, uri, data, dict(headers or {})))
+        return self.responses.pop(0)
+
+def make_http(*responses):
+    http = PooledHttp()
+    http._session = FakeSession(*responses)
+    return http
+
+def test_resume_incomplete_is_returned_to_the_caller():
+    http = make_http(make_response(308, {'Range': 'bytes=0-99', 'Location': 'https://upload.example.com/next'}))
+
+    response, _ = http.request('https://upload.example.com/session', 'PUT', body=b'chunk')
+
+    assert response.status == 308
+    assert response['range'] == 'bytes=0-99'
+    assert len(http._session.sent) == 1
+
+def test_see_other_is_followed_with_get_and_keeps_auth_on_the_same_host():
+    http = make_http(
+        make_response(303, {'Location': '/done'}),
+        make_response(200, {'Content-Encoding': 'gzip'}, b'ok')
+    )
+
+    response, content = http.request('https://gmail.example.com/start', 'POST', body=b'x', headers={'Authorization': 'Bearer t'})
+
+    assert (response.status, content) == (200, b'ok')
+    assert 'content-encoding' not in response
+    assert http._session.sent[1] == ('GET', 'https://gmail.example.com/done', None, {'Authorization': 'Bearer t'})
+
+def test_redirect_to_another_host_drops_the_token():
+    http = make_http(make_response(307, {'Location': 'https://other.example.com/x'}), make_response(200))
+
+    http.request('https://gmail.example.com/start', 'POST', body=b'x', headers={'Authorization': 'Bearer t'})
+
+    assert http._session.sent[1] == ('POST', 'https://other.example.com/x', b'x', {})
+
+def test_redirect_limit():
+    http = make_http(*(make_response(302, {'Location': '/loop'}) for _ in range(3)))
+
+    with pytest.raises(httplib2.RedirectLimit):
+        http.request('https://gmail.example.com/loop', redirections=2)
+
+    assert len(http._session.sent) == 3
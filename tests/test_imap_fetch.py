@@ -0,0 +1,34 @@
+from dataExtraction.custom.data_extraction import build_message_sets, iter_fetch_response, parse_fetch_flags, parse_fetch_uid
+
+def test_runs_collapse_to_ranges():
+    assert build_message_sets([b'7', b'1', b'2', b'3', b'5', b'6', b'9']) == ['1:3,5:7,9']
+
+def test_chunks_are_bounded_by_message_count():
+    assert build_message_sets([str(num).encode() for num in range(1, 8)], chunk_size=3) == ['1:3', '4:6', '7']
+
+def test_no_messages_no_sets():
+    assert build_message_sets([]) == []
+
+def test_attributes_after_the_literal_are_joined():
+    fetch_data = [
+        (b'1 (UID 11 BODY[] {5}', b'first'),
+        b' FLAGS (\\Seen))',
+        (b'2 (UID 12 FLAGS (\\Flagged) BODY[] {6}', b'second'),
+        b')'
+    ]
+
+    responses = list(iter_fetch_response(fetch_data))
+
+    assert [(num, literal) for num, _, literal in responses] == [(b'1', b'first'), (b'2', b'second')]
+    assert parse_fetch_flags(responses[0][1]) == ['\\Seen']
+    assert parse_fetch_uid(responses[0][1]) == 11
+    assert parse_fetch_flags(responses[1][1]) == ['\\Flagged']
+
+def test_responses_without_a_literal():
+    fetch_data = [b'3 (UID 13 FLAGS (\\Seen))', b'4 (UID 14 FLAGS ())']
+
+    responses = list(iter_fetch_response(fetch_data))
+
+    assert [(num, literal) for num, _, literal in responses] == [(b'3', None), (b'4', None)]
+    assert parse_fetch_uid(responses[1][1]) == 14
+    assert parse_fetch_flags(responses[1][1]) == []
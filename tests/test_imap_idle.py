@@ -0,0 +1,37 @@
+from dataExtraction.custom.imap_idle import GMAIL_IMAP_SCOPE, build_idle_account
+
+EMAIL = 'user@example.com'
+
+def stored_record(**fields):
+    # What fetch_tokens returns for a ConvoiaUsers item once the {'S': ...} wrappers are removed
+    record = {
+        'email': EMAIL,
+        'mode': 'oauth',
+        'access_token': 'ya29.access',
+        'refresh_token': '1//refresh'
+    }
+    record.update(fields)
+    return record
+
+def test_oauth_grant_without_the_imap_scope_is_not_watched():
+    record = stored_record(scope='https://www.googleapis.com/auth/gmail.modify')
+
+    assert build_idle_account(record, token_provider=lambda: 'token') is None
+    assert build_idle_account(stored_record(), token_provider=lambda: 'token') is None
+
+def test_oauth_grant_with_the_imap_scope():
+    record = stored_record(scope=f'https://www.googleapis.com/auth/gmail.modify {GMAIL_IMAP_SCOPE}')
+
+    account = build_idle_account(record, token_provider=lambda: 'token')
+
+    assert account.email_address == EMAIL
+    assert account.mode == 'oauth'
+    assert account.token_provider() == 'token'
+    assert account.password is None
+
+def test_manual_record_needs_a_password():
+    assert build_idle_account(stored_record(mode='manual')) is None
+
+    account = build_idle_account(stored_record(mode='manual', app_password='app-password', imap_server='imap.example.com'))
+
+    assert (account.mode, account.password, account.imap_server) == ('manual', 'app-password', 'imap.example.com')
@@ -0,0 +1,91 @@
+import os
+import stat
+import time
+
+from dataExtraction.gmail.message_cache import GmailMessageCache
+from dataExtraction.gmail.thread_hydration import GmailThreadHydrator
+
+EMAIL = 'user@example.com'
+
+def make_message(message_id, thread_id='t1', history_id='10'):
+    return {
+        'id': message_id,
+        'threadId': thread_id,
+        'historyId': history_id,
+        'internalDate': '1700000000000',
+        'labelIds': ['INBOX'],
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [{'name': 'Subject', 'value': 'Hi'}, {'name': 'From', 'value': 'A <a@example.com>'}],
+            'body': {'data': 'aGVsbG8='}
+        }
+    }
+
+def make_thread(thread_id='t1', history_id='10', message_ids=('m1', 'm2')):
+    return {
+        'id': thread_id,
+        'historyId': history_id,
+        'messages': [make_message(message_id, thread_id, history_id) for message_id in message_ids]
+    }
+
+def test_cache_file_is_private(tmp_path):
+    db_path = tmp_path / 'cache' / 'messages.sqlite3'
+    GmailMessageCache(str(db_path))
+
+    assert stat.S_IMODE(os.stat(db_path).st_mode) == 0o600
+
+def test_thread_is_served_only_at_its_history_id(tmp_path):
+    cache = GmailMessageCache(str(tmp_path / 'messages.sqlite3'))
+    GmailThreadHydrator(EMAIL, cache).hydrate(make_thread())
+
+    hydrator = GmailThreadHydrator(EMAIL, cache)
+    assert hydrator.hydrate_from_cache({'t1': '11'}) == 0
+    assert hydrator.hydrate_from_cache({'t1': '10'}) == 1
+    assert hydrator.get_message_ids('t1') == ['m1', 'm2']
+    assert hydrator.get_message_details('m1')['body']['plain_text'] == 'hello'
+    assert hydrator.get_label_ids('m1') == ['INBOX']
+
+def test_partial_decode_is_not_served_to_readers_of_other_parts(tmp_path):
+    cache = GmailMessageCache(str(tmp_path / 'messages.sqlite3'))
+    GmailThreadHydrator(EMAIL, cache, body_parts=('plain_text',)).hydrate(make_thread())
+
+    full_hydrator = GmailThreadHydrator(EMAIL, cache)
+    assert full_hydrator.hydrate_from_cache({'t1': '10'}) == 0
+    assert full_hydrator.get_message_details('m1') is None
+
+    plain_hydrator = GmailThreadHydrator(EMAIL, cache, body_parts=('plain_text',))
+    assert plain_hydrator.hydrate_from_cache({'t1': '10'}) == 1
+
+def test_full_decode_serves_plain_text_readers(tmp_path):
+    cache = GmailMessageCache(str(tmp_path / 'messages.sqlite3'))
+    GmailThreadHydrator(EMAIL, cache).cache_message(make_message('m1'))
+
+    plain_hydrator = GmailThreadHydrator(EMAIL, cache, body_parts=('plain_text',))
+    assert plain_hydrator.get_message_details('m1')['subject'] == 'Hi'
+
+def test_thread_with_missing_message_is_refetched(tmp_path):
+    cache = GmailMessageCache(str(tmp_path / 'messages.sqlite3'))
+    GmailThreadHydrator(EMAIL, cache).hydrate(make_thread())
+    cache.evict(max_age_days=30, max_messages=1)
+
+    assert GmailThreadHydrator(EMAIL, cache).hydrate_from_cache({'t1': '10'}) == 0
+
+def test_evict_drops_stale_entries_and_their_threads(tmp_path):
+    cache = GmailMessageCache(str(tmp_path / 'messages.sqlite3'))
+    GmailThreadHydrator(EMAIL, cache).hydrate(make_thread())
+
+    with cache._connection:
+        cache._connection.execute('UPDATE messages SET cached_at = ?', (int(time.time()) - 31 * 24 * 60 * 60,))
+        cache._connection.execute('UPDATE threads SET cached_at = ?', (int(time.time()) - 31 * 24 * 60 * 60,))
+
+    assert cache.evict(max_age_days=30) == 2
+    assert cache.get_thread(EMAIL, 't1', '10') is None
+
+def test_delete_user_keeps_other_users(tmp_path):
+    cache = GmailMessageCache(str(tmp_path / 'messages.sqlite3'))
+    GmailThreadHydrator(EMAIL, cache).hydrate(make_thread())
+    GmailThreadHydrator('other@example.com', cache).hydrate(make_thread())
+
+    cache.delete_user(EMAIL)
+
+    assert cache.get_email_ids() == ['other@example.com']
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import pytest
+
+from dataExtraction.gmail import quota_accounting
+from dataExtraction.gmail.quota_accounting import GmailQuotaLedger, charge, quota_job
+from rate_limiting import TokenBucket
+
+EMAIL = 'user@example.com'
+
+@pytest.fixture
+def bucket(monkeypatch):
+    bucket = TokenBucket(rate=10, capacity=10)
+    monkeypatch.setattr(quota_accounting, 'get_user_token_bucket', lambda email: bucket)
+    monkeypatch.setattr(quota_accounting, '_quota_ledger', GmailQuotaLedger())
+    return bucket
+
+def test_charge_on_the_event_loop_does_not_sleep(bucket):
+
+    async def charge_twice():
+        with quota_job('priority_response'):
+            started = time.monotonic()
+            charge(EMAIL, 'gmail.users.messages.get')
+            charge(EMAIL, 'gmail.users.messages.send')
+            return time.monotonic() - started
+
+    assert asyncio.run(charge_twice()) < 0.5
+    assert quota_accounting.get_quota_ledger().usage()[EMAIL]['priority_response']['units'] == 5 + 100
+
+def test_debt_from_the_event_loop_is_waited_off_by_worker_threads(bucket):
+    bucket.debit(10)
+    bucket.debit(2)
+
+    started = time.monotonic()
+    charge(EMAIL, 'gmail.users.labels.list')
+    assert time.monotonic() - started >= 0.25
+
+def test_drain_reports_and_clears_the_usage():
+    ledger = GmailQuotaLedger()
+    ledger.record(EMAIL, 'backfill_history', 'gmail.users.threads.get', 10)
+    ledger.record(EMAIL, 'backfill_history', 'gmail.users.threads.get', 10)
+
+    report = ledger.drain()
+
+    assert report[EMAIL]['backfill_history']['calls'] == 2
+    assert report[EMAIL]['backfill_history']['methods']['gmail.users.threads.get']['units'] == 20
+    assert ledger.usage() == {}
+    assert ledger.drain() == {}
@@ -0,0 +1,26 @@
+import time
+
+from rate_limiting import AdaptiveConcurrencyLimiter, TokenBucket
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate=20, capacity=2)
+    bucket.acquire(2)
+
+    started = time.monotonic()
+    bucket.acquire(2)
+    assert time.monotonic() - started >= 0.08
+
+def test_limiter_halves_on_rate_limit_and_grows_back():
+    limiter = AdaptiveConcurrencyLimiter(max_workers=8, increase_after=2)
+
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    assert limiter.limit == 2
+
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.limit == 4
+
+    for _ in range(10):
+        limiter.on_rate_limited()
+    assert limiter.limit == limiter.min_workers
@@ -0,0 +1,50 @@
+import time
+import threading
+
+from dataExtraction.gmail.session_broker import GmailSessionBroker, GmailSession
+
+class FakeCredentials:
+
+    def __init__(self, refresh_token="refresh"):
+        self.valid = True
+        self.refresh_token = refresh_token
+
+def make_broker(build_seconds):
+
+    broker = GmailSessionBroker()
+    builds = []
+
+    def create_session(email, tokens):
+        builds.append(email)
+        time.sleep(build_seconds.get(email, 0))
+        return GmailSession(email, FakeCredentials(), service=object())
+
+    broker._create_session = create_session
+    return broker, builds
+
+def test_cold_start_does_not_block_other_users():
+
+    broker, _ = make_broker({'slow@example.com': 1.0})
+    broker.get_session('fast@example.com')
+
+    slow = threading.Thread(target=broker.get_session, args=('slow@example.com',))
+    slow.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    broker.get_session('fast@example.com')
+    assert time.monotonic() - started < 0.5
+
+    slow.join()
+
+def test_concurrent_requests_for_one_user_build_once():
+
+    broker, builds = make_broker({'user@example.com': 0.2})
+
+    threads = [threading.Thread(target=broker.get_session, args=('user@example.com',)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert builds == ['user@example.com']
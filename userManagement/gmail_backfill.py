@@ -0,0 +1,280 @@
+import sys
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+# Google API imports
+from googleapiclient.errors import HttpError
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.gmail_backfill_jobs import GmailBackfillJobManager
+from dataExtraction.gmail.data_extraction import GmailDataExtractor
+from dataExtraction.gmail.extraction_filters import GmailExtractionFilter, DEFAULT_EXTRACTION_FILTER
+from vectorDatabase.data_preprocessing import DataPreprocessor
+from vectorDatabase.pinecone_chatbot_handler import Chatbot
+from dataExtraction.gmail.quota_accounting import quota_job
+
+# Failed thread IDs kept for the final retry, the counter keeps the full total
+MAX_TRACKED_FAILED_THREADS = 1000
+
+# Completed thread IDs kept for a later job to skip, bounded by the DynamoDB item size
+MAX_RECORDED_THREAD_IDS = 5000
+
+# Background backfills run one at a time, so they never crowd out the interactive tiers
+_backfill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gmail-backfill')
+_scheduled_backfills = set()
+_scheduled_backfills_lock = threading.Lock()
+
+# Set on shutdown, a running job stops at its next page boundary
+_backfill_stop = threading.Event()
+
+class GmailBackfillInterrupted(Exception):
+    pass
+
+class GmailBackfillJob:
+
+    def __init__(
+        self,
+        email_id: str,
+        job_name: str = "full",
+        num_prev_days: Optional[int] = None,
+        query: Optional[str] = None,
+        filters: Optional[GmailExtractionFilter] = None,
+        record_thread_ids: bool = False,
+        skip_job_name: Optional[str] = None
+    ):
+
+        self.email_id = email_id
+        self.job_name = job_name
+        self.num_prev_days = num_prev_days
+        self.query = query
+        self.record_thread_ids = record_thread_ids
+        self.skip_job_name = skip_job_name
+        self.skip_thread_ids = set()
+        self.namespace = email_id.split('@')[0]
+        self.source = f"{email_id}.txt"
+
+        self.job_manager = GmailBackfillJobManager()
+        # Backfills index the mailbox without bulk mail unless told otherwise
+        self.extractor = GmailDataExtractor(email_id, filters=filters or DEFAULT_EXTRACTION_FILTER)
+        self.preprocessor = DataPreprocessor()
+        self.chatbot = Chatbot()
+        self.job: Optional[Dict[str, Any]] = None
+
+    def _new_job(self) -> Dict[str, Any]:
+
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            'email_id': self.email_id,
+            'job_name': self.job_name,
+            'status': 'running',
+            'query': self.query,
+            'page_token': None,
+            'pages_completed': 0,
+            'threads_completed': 0,
+            'threads_failed': 0,
+            'threads_skipped': 0,
+            'failed_thread_ids': [],
+            'completed_thread_ids': [],
+            'chunks_uploaded': 0,
+            'started_at': now,
+            'updated_at': now
+        }
+
+    def _save(self) -> None:
+
+        self.job['updated_at'] = datetime.now(timezone.utc).isoformat()
+        self.job_manager.save_job(self.job)
+
+    def _load_or_create(self) -> None:
+
+        job = self.job_manager.get_job(self.email_id, self.job_name)
+
+        # Only an interrupted job is resumed, a finished one starts over
+        if job and job.get('status') in ('running', 'failed'):
+            job.setdefault('page_token', None)
+            job.setdefault('threads_skipped', 0)
+            job.setdefault('completed_thread_ids', [])
+            job['status'] = 'running'
+
+            # Page tokens belong to the listing they came from, so a resumed job keeps its original query
+            self.query = job.get('query')
+            print(f"Resuming backfill '{self.job_name}' for {self.email_id} after {job['pages_completed']} pages")
+            self.job = job
+        else:
+            self.job = self._new_job()
+
+        # Threads another job already indexed, e.g. the recent tier for the history tier
+        if self.skip_job_name:
+            skip_job = self.job_manager.get_job(self.email_id, self.skip_job_name) or {}
+            self.skip_thread_ids = set(skip_job.get('completed_thread_ids', []))
+
+        self._save()
+
+    def _process_threads(self, thread_ids: List[str]) -> List[str]:
+
+        # A date query matches a thread if any of its messages does, so threads that span the
+        # boundary between two jobs are listed by both
+        if self.skip_thread_ids:
+            listed_count = len(thread_ids)
+            thread_ids = [thread_id for thread_id in thread_ids if thread_id not in self.skip_thread_ids]
+            self.job['threads_skipped'] += listed_count - len(thread_ids)
+
+        if not thread_ids:
+            return []
+
+        threads = self.extractor.fetch_transformed_threads(thread_ids)
+
+        # Vector IDs come from the thread ID, so a thread redone by a crashed page, a retry or a
+        # restarted listing replaces its own vectors
+        if threads:
+            self.job['chunks_uploaded'] += self.chatbot.upload_documents(
+                self.preprocessor.iter_thread_documents(threads),
+                self.namespace,
+                source=self.source
+            )
+
+        completed_thread_ids = {thread['thread_id'] for thread in threads}
+        self.job['threads_completed'] += len(completed_thread_ids)
+
+        if self.record_thread_ids:
+            room = MAX_RECORDED_THREAD_IDS - len(self.job['completed_thread_ids'])
+            self.job['completed_thread_ids'].extend(sorted(completed_thread_ids)[:max(room, 0)])
+
+        return [thread_id for thread_id in thread_ids if thread_id not in completed_thread_ids]
+
+    def _record_failures(self, failed_thread_ids: List[str]) -> None:
+
+        self.job['threads_failed'] += len(failed_thread_ids)
+
+        room = MAX_TRACKED_FAILED_THREADS - len(self.job['failed_thread_ids'])
+        self.job['failed_thread_ids'].extend(failed_thread_ids[:max(room, 0)])
+
+    def _run_pages(self) -> None:
+
+        thread_fetcher = self.extractor.thread_fetcher
+
+        for thread_ids in thread_fetcher.iter_thread_id_pages(self.num_prev_days, self.job['page_token'], self.query):
+
+            if _backfill_stop.is_set():
+                raise GmailBackfillInterrupted()
+
+            failed_thread_ids = self._process_threads(thread_ids)
+            self._record_failures(failed_thread_ids)
+
+            # Checkpoint only once the page is in Pinecone, a crash before this redoes the page
+            self.job['page_token'] = thread_fetcher.next_page_token
+            self.job['pages_completed'] += 1
+            self._save()
+
+            print(f"Backfill '{self.job_name}' for {self.email_id}: {self.progress()}")
+
+    def _retry_failed_threads(self) -> None:
+
+        failed_thread_ids = list(self.job['failed_thread_ids'])
+        if not failed_thread_ids:
+            return
+
+        print(f"Retrying {len(failed_thread_ids)} failed threads for {self.email_id}")
+
+        still_failed = self._process_threads(failed_thread_ids)
+        self.job['threads_failed'] -= len(failed_thread_ids) - len(still_failed)
+        self.job['failed_thread_ids'] = still_failed
+        self._save()
+
+    def progress(self) -> Dict[str, Any]:
+
+        if not self.job:
+            return {}
+
+        return {
+            'status': self.job['status'],
+            'query': self.job.get('query'),
+            'pages_completed': self.job['pages_completed'],
+            'threads_completed': self.job['threads_completed'],
+            'threads_failed': self.job['threads_failed'],
+            'threads_skipped': self.job.get('threads_skipped', 0),
+            'chunks_uploaded': self.job['chunks_uploaded']
+        }
+
+    def run(self) -> Dict[str, Any]:
+
+        with quota_job(f"backfill_{self.job_name}"):
+            return self._run()
+
+    def _run(self) -> Dict[str, Any]:
+
+        self._load_or_create()
+
+        try:
+            try:
+                self._run_pages()
+            except HttpError as e:
+                # Saved page tokens do not live forever, start the listing over (threads already indexed overwrite their own vectors)
+                if e.resp.status != 400 or not self.job['page_token']:
+                    raise
+                print(f"Saved page token for {self.email_id} is no longer valid, restarting the listing")
+                self.job = self._new_job()
+                self._save()
+                self._run_pages()
+
+            self._retry_failed_threads()
+
+            self.job['status'] = 'completed'
+            self._save()
+
+            print(f"Backfill '{self.job_name}' for {self.email_id} completed: {self.progress()}")
+            return self.progress()
+
+        except GmailBackfillInterrupted:
+            # Left as running, the next start resumes from the last saved page
+            print(f"Backfill '{self.job_name}' for {self.email_id} stopped for shutdown: {self.progress()}")
+            return self.progress()
+
+        except Exception:
+            self.job['status'] = 'failed'
+            self._save()
+            raise
+
+def _run_scheduled_backfill(
+    email_id: str,
+    job_name: str,
+    query: Optional[str],
+    filters: Optional[GmailExtractionFilter],
+    skip_job_name: Optional[str]
+) -> Optional[Dict[str, Any]]:
+
+    try:
+        return GmailBackfillJob(email_id, job_name=job_name, query=query, filters=filters, skip_job_name=skip_job_name).run()
+    except Exception as e:
+        print(f"Background backfill '{job_name}' for {email_id} failed: {e}")
+        return None
+    finally:
+        with _scheduled_backfills_lock:
+            _scheduled_backfills.discard((email_id, job_name))
+
+def schedule_backfill(
+    email_id: str,
+    job_name: str,
+    query: Optional[str] = None,
+    filters: Optional[GmailExtractionFilter] = None,
+    skip_job_name: Optional[str] = None
+) -> Optional[Future]:
+
+    # A job already queued or running in this process is not scheduled twice
+    with _scheduled_backfills_lock:
+        if (email_id, job_name) in _scheduled_backfills:
+            return None
+        _scheduled_backfills.add((email_id, job_name))
+
+    print(f"Scheduled background backfill '{job_name}' for {email_id}")
+    return _backfill_executor.submit(_run_scheduled_backfill, email_id, job_name, query, filters, skip_job_name)
+
+def shutdown_backfills() -> None:
+
+    # Queued jobs are dropped and the running one stops after its current page, both resume on the next start
+    _backfill_stop.set()
+    _backfill_executor.shutdown(wait=False, cancel_futures=True)
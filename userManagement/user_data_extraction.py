@@ -1,37 +1,47 @@
 import os
 import sys
 from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Optional
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from dataExtraction.gmail.data_extraction import GmailDataExtractor
 from vectorDatabase.data_preprocessing import DataPreprocessor
 from vectorDatabase.pinecone_chatbot_handler import Chatbot
+from userManagement.gmail_backfill import GmailBackfillJob, schedule_backfill
+from aws.gmail_backfill_jobs import GmailBackfillJobManager
+from dataExtraction.gmail.extraction_filters import GmailExtractionFilter, DEFAULT_EXTRACTION_FILTER
+
+# Onboarding tiers, newest first: the recent tier is indexed before initialization returns
+RECENT_TIER_DAYS = 7
+ONBOARDING_TIERS = ("recent", "history")
 
 class UserDataExtractor:
 
     def __init__(self):
         pass
 
-    def new_user_data_extraction(self, email_id, mode):
+    def new_user_data_extraction(self, email_id, mode, filters: Optional[GmailExtractionFilter] = None):
 
         try:
+            # Onboarding skips bulk mail unless told otherwise
+            filters = filters or DEFAULT_EXTRACTION_FILTER
 
-            gmailDataExtractor = GmailDataExtractor(email_id)
-
+            # Checkpointed page by page, a rerun after a crash resumes where the last run stopped
             if mode == "oauth": 
-                json_file_path = gmailDataExtractor.fetch_email_threads()
-            elif mode == "manual":
-                pass
-
-            dataPreprocessor = DataPreprocessor(json_file_path)
-            txt_file_path = dataPreprocessor.convert()
+                # One boundary for both tiers. A thread with messages on both sides of it is listed by
+                # both, so the history tier skips the threads the recent tier recorded
+                boundary = int((datetime.now() - timedelta(days=RECENT_TIER_DAYS)).timestamp())
 
-            chatbot = Chatbot()
-            namespace = email_id.split('@')[0]
-            chatbot.upload_file(txt_file_path, namespace)
+                # The last week is queryable as soon as this returns, older mail follows in the background
+                recent_job = GmailBackfillJob(email_id, job_name="recent", query=f"after:{boundary}", filters=filters, record_thread_ids=True)
+                recent_job.run()
 
-            os.remove(json_file_path)
-            os.remove(txt_file_path)
+                # A resumed recent tier keeps the boundary it started with, the history tier has to match it
+                boundary = recent_job.query.split(':', 1)[1]
+                schedule_backfill(email_id, "history", query=f"before:{boundary}", filters=filters, skip_job_name="recent")
+            elif mode == "manual":
+                pass
 
             return True
         
@@ -39,29 +49,58 @@ class UserDataExtractor:
             print(e)
             return False
     
-    def existing_user_data_extraction(self, email_id, mode):
+    def existing_user_data_extraction(self, email_id, mode, filters: Optional[GmailExtractionFilter] = None):
 
         try:
+            # The daily sync skips bulk mail unless told otherwise
+            filters = filters or DEFAULT_EXTRACTION_FILTER
 
-            gmailDataExtractor = GmailDataExtractor(email_id)
+            # Pick up a history backfill that a restart or an error left unfinished
+            if mode == "oauth":
+                history_job = GmailBackfillJobManager().get_job(email_id, "history")
+                if history_job and history_job.get('status') in ('running', 'failed'):
+                    schedule_backfill(email_id, "history", filters=filters, skip_job_name="recent")
 
+            gmailDataExtractor = GmailDataExtractor(email_id, filters=filters)
+
+            # Threads flow from Gmail to Pinecone without intermediate files
             if mode == "oauth": 
-                json_file_path = gmailDataExtractor.fetch_email_threads(1)
+                threads = gmailDataExtractor.iter_email_threads(1)
             elif mode == "manual":
                 pass
 
-            dataPreprocessor = DataPreprocessor(json_file_path)
-            txt_file_path = dataPreprocessor.convert()
+            # Keyed by thread like the backfill, so a thread both of them see keeps one set of vectors
+            dataPreprocessor = DataPreprocessor()
+            documents = dataPreprocessor.iter_thread_documents(threads)
 
             chatbot = Chatbot()
             namespace = email_id.split('@')[0]
-            chatbot.upload_file(txt_file_path, namespace)
-
-            os.remove(json_file_path)
-            os.remove(txt_file_path)
+            chatbot.upload_documents(documents, namespace, source=f"{email_id}.txt")
 
             return True
         
         except Exception as e:
             print(e)
             return False
+
+    def get_onboarding_status(self, email_id):
+
+        job_manager = GmailBackfillJobManager()
+        tiers = []
+
+        for tier in ONBOARDING_TIERS:
+            job = job_manager.get_job(email_id, tier) or {}
+            tiers.append({
+                "tier": tier,
+                "status": job.get('status', 'pending'),
+                "query": job.get('query'),
+                "pages_completed": job.get('pages_completed', 0),
+                "threads_completed": job.get('threads_completed', 0),
+                "threads_failed": job.get('threads_failed', 0),
+                "threads_skipped": job.get('threads_skipped', 0),
+                "chunks_uploaded": job.get('chunks_uploaded', 0),
+                "started_at": job.get('started_at'),
+                "updated_at": job.get('updated_at')
+            })
+
+        return tiers
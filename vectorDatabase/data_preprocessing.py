@@ -1,11 +1,12 @@
 import json
 import os
+from typing import Dict, Tuple, Iterable, Iterator, Optional
 
 class DataPreprocessor:
     
-    def __init__(self, input_path):
+    def __init__(self, input_path: Optional[str] = None):
         self.input_path = input_path
-        self.output_path = os.path.splitext(input_path)[0] + '.txt'
+        self.output_path = os.path.splitext(input_path)[0] + '.txt' if input_path else None
         self.email_data = None
     
     def format_message(self, message, message_number):
@@ -83,3 +84,18 @@ class DataPreprocessor:
             raise FileNotFoundError(f"Input file not found: {self.input_path}")
         except Exception as e:
             raise RuntimeError(f"Error during conversion: {str(e)}")
+
+    def iter_formatted_text(self, threads: Iterable[Dict]) -> Iterator[str]:
+
+        # Yields the same text convert() writes, one thread at a time
+        for thread in threads:
+            yield self.format_thread(thread) + "\n"
+        
+        # Add final separator
+        yield "=" * 58
+
+    def iter_thread_documents(self, threads: Iterable[Dict]) -> Iterator[Tuple[str, str]]:
+
+        # One (thread ID, text) document per thread, for uploads keyed by thread
+        for thread in threads:
+            yield thread['thread_id'], self.format_thread(thread)
@@ -1,13 +1,38 @@
 import os
+import time
 import uuid
-from typing import List
-from openai import OpenAI
+import random
+import tiktoken
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Iterable, Iterator, Optional
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
+# Custom imports
+from rate_limiting import TokenBucket, AdaptiveConcurrencyLimiter
+
 # Load environment variables
 load_dotenv()
 
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Limits of one embeddings request, the API allows 2048 inputs and 300k tokens in total
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+EMBEDDING_BATCH_MAX_TOKENS = 100000
+
+# Account-wide tokens per minute for the embedding model
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_EMBEDDING_TPM', '1000000'))
+
+EMBEDDING_MAX_WORKERS = 4
+EMBEDDING_MAX_RETRIES = 5
+
+RETRYABLE_EMBEDDING_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Shared by every Chatbot in the process, since the OpenAI limit is per account
+_embedding_token_bucket = TokenBucket(rate=EMBEDDING_TOKENS_PER_MINUTE / 60, capacity=EMBEDDING_TOKENS_PER_MINUTE)
+
 class Chatbot:
     def __init__(self):
         try:
@@ -20,6 +45,8 @@ class Chatbot:
             self.pc = Pinecone(api_key=self.pinecone_api_key)
             self.openai_client = OpenAI(api_key=self.openai_api_key)
             self.index = self.pc.Index("convoia")
+            self.encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+            self.concurrency_limiter = AdaptiveConcurrencyLimiter(EMBEDDING_MAX_WORKERS)
             
         except Exception as e:
             print(f"Error initializing Chatbot: {str(e)}")
@@ -29,36 +56,171 @@ class Chatbot:
         try:
             response = self.openai_client.embeddings.create(
                 input=text,
-                model="text-embedding-ada-002"
+                model=EMBEDDING_MODEL
             )
             return response.data[0].embedding
         except Exception as e:
             print(f"Error creating embedding: {str(e)}")
             raise
+
+    def create_embeddings(self, texts: List[str], token_count: int) -> List[List[float]]:
+
+        attempt = 0
+
+        while True:
+            # Wait for the token budget before the request is sent
+            _embedding_token_bucket.acquire(token_count)
+            self.concurrency_limiter.acquire()
+            try:
+                # Retries are handled here, per batch, rather than by the client
+                response = self.openai_client.with_options(max_retries=0).embeddings.create(
+                    input=texts,
+                    model=EMBEDDING_MODEL
+                )
+                self.concurrency_limiter.on_success()
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+            except RETRYABLE_EMBEDDING_ERRORS as e:
+                if attempt >= EMBEDDING_MAX_RETRIES:
+                    print(f"Error creating embeddings for {len(texts)} chunks: {str(e)}")
+                    raise
+                if isinstance(e, RateLimitError):
+                    self.concurrency_limiter.on_rate_limited()
+
+            finally:
+                self.concurrency_limiter.release()
+
+            # Only this batch is retried, the others carry on
+            attempt += 1
+            delay = 2 ** (attempt - 1) + random.uniform(0, 1)
+            print(f"Embedding batch of {len(texts)} chunks failed, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _iter_embedding_batches(self, chunks: Iterable[Tuple[str, int, str]]) -> Iterator[Tuple[List[Tuple[str, int, str]], int]]:
+
+        # Group (vector ID, chunk number, text) items into requests bounded by input count and token count
+        batch = []
+        batch_tokens = 0
+        for chunk in chunks:
+            tokens = len(self.encoding.encode(chunk[2], disallowed_special=()))
+            if batch and (len(batch) >= EMBEDDING_BATCH_MAX_INPUTS or batch_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS):
+                yield batch, batch_tokens
+                batch = []
+                batch_tokens = 0
+            batch.append(chunk)
+            batch_tokens += tokens
+
+        if batch:
+            yield batch, batch_tokens
     
-    def upload_file(self, file_path: str, namespace: str, chunk_size: int = 1000) -> None:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
+    def _iter_chunks(self, segments: Iterable[str], chunk_size: int) -> Iterator[str]:
 
-            chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-            vectors = []
-            
-            for i, chunk in enumerate(chunks):
-                embedding = self.create_embedding(chunk)
+        # Fixed size chunks across segment boundaries, same as slicing the concatenated text
+        buffer = ""
+        for segment in segments:
+            buffer += segment
+            start = 0
+            while len(buffer) - start >= chunk_size:
+                yield buffer[start:start + chunk_size]
+                start += chunk_size
+            buffer = buffer[start:]
+        
+        if buffer:
+            yield buffer
+
+    def _upload_chunks(self, chunks: Iterable[Tuple[str, int, str]], namespace: str, source: str, upsert_batch_size: int) -> int:
+
+        vectors = []
+        uploaded = 0
+
+        def collect(batch: List[Tuple[str, int, str]], embeddings: List[List[float]]) -> None:
+            nonlocal uploaded, vectors
+            for (vector_id, chunk_number, chunk), embedding in zip(batch, embeddings):
                 vector = {
-                    'id': f"{os.path.basename(file_path)}_{str(uuid.uuid4())}",
+                    'id': vector_id,
                     'values': embedding,
                     'metadata': {
                         'text': chunk,
-                        'source': os.path.basename(file_path),
-                        'chunk_number': i
+                        'source': source,
+                        'chunk_number': chunk_number
                     }
                 }
                 vectors.append(vector)
 
+                # Upsert as we go so memory stays bounded by one batch
+                if len(vectors) >= upsert_batch_size:
+                    self.index.upsert(vectors=vectors, namespace=namespace)
+                    uploaded += len(vectors)
+                    vectors = []
+
+        # Several embedding requests in flight, results are collected in chunk order
+        with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS) as executor:
+            pending = deque()
+            for batch, token_count in self._iter_embedding_batches(chunks):
+                texts = [chunk for _, _, chunk in batch]
+                pending.append((batch, executor.submit(self.create_embeddings, texts, token_count)))
+                # Keep the read-ahead bounded so large streams do not pile up in memory
+                while len(pending) > EMBEDDING_MAX_WORKERS * 2:
+                    batch, future = pending.popleft()
+                    collect(batch, future.result())
+
+            while pending:
+                batch, future = pending.popleft()
+                collect(batch, future.result())
+
+        if vectors:
             self.index.upsert(vectors=vectors, namespace=namespace)
-            print(f"Uploaded {len(vectors)} chunks to namespace '{namespace}'")
+            uploaded += len(vectors)
+
+        print(f"Uploaded {uploaded} chunks to namespace '{namespace}'")
+        return uploaded
+
+    def upload_stream(self, segments: Iterable[str], namespace: str, source: str, chunk_size: int = 1000, upsert_batch_size: int = 100, id_prefix: Optional[str] = None) -> int:
+        try:
+            # Stable IDs make a repeated upload overwrite its earlier vectors instead of duplicating them
+            chunks = (
+                (f"{source}_{id_prefix}_{i}" if id_prefix else f"{source}_{str(uuid.uuid4())}", i, chunk)
+                for i, chunk in enumerate(self._iter_chunks(segments, chunk_size))
+            )
+            return self._upload_chunks(chunks, namespace, source, upsert_batch_size)
+            
+        except Exception as e:
+            print(f"Error uploading stream: {str(e)}")
+            raise
+
+    def _delete_stale_vectors(self, id_prefix: str, keep_ids: Iterable[str], namespace: str) -> None:
+        # A document that shrank leaves its higher-numbered chunks behind, list them by prefix and drop them
+        keep_ids = set(keep_ids)
+        for ids in self.index.list(prefix=id_prefix, namespace=namespace):
+            stale_ids = [vector_id for vector_id in ids if vector_id not in keep_ids]
+            if stale_ids:
+                self.index.delete(ids=stale_ids, namespace=namespace)
+
+    def _iter_document_chunks(self, documents: Iterable[Tuple[str, str]], namespace: str, source: str, chunk_size: int) -> Iterator[Tuple[str, int, str]]:
+        for document_id, text in documents:
+            id_prefix = f"{source}_{document_id}_"
+            chunks = [(f"{id_prefix}{i}", i, chunk) for i, chunk in enumerate(self._iter_chunks([text], chunk_size))]
+
+            self._delete_stale_vectors(id_prefix, (vector_id for vector_id, _, _ in chunks), namespace)
+            yield from chunks
+
+    def upload_documents(self, documents: Iterable[Tuple[str, str]], namespace: str, source: str, chunk_size: int = 1000, upsert_batch_size: int = 100) -> int:
+        try:
+            # Each (document ID, text) pair is chunked on its own and keyed by its ID, so uploading
+            # the same document again replaces its vectors, whichever job or page it comes from
+            chunks = self._iter_document_chunks(documents, namespace, source, chunk_size)
+            return self._upload_chunks(chunks, namespace, source, upsert_batch_size)
+            
+        except Exception as e:
+            print(f"Error uploading documents: {str(e)}")
+            raise
+
+    def upload_file(self, file_path: str, namespace: str, chunk_size: int = 1000) -> None:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                text = file.read()
+
+            self.upload_stream([text], namespace, os.path.basename(file_path), chunk_size)
             
         except Exception as e:
             print(f"Error uploading file: {str(e)}")